@@ -6,3 +6,6 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from . import sqlite_maintenance  # noqa: F401  (connects its signal handler)
@@ -0,0 +1,228 @@
+# sherlock-python/inventory/bulk_labels.py
+"""
+Queuing every label of a section or space at once.
+
+The labels are added to the print queue as references in a few bulk
+writes. The request then returns straight away, and the labels that are
+not in the label cache yet are pre-rendered in the background, so the
+print page later finds them all cached.
+
+The background work is driven by a thread in the web process. The thread
+splits the labels into RENDER_CHUNK_SIZE chunks in a fixed order (section,
+spaces by code, then items by code) and hands them to a ProcessPoolExecutor.
+Rendering therefore uses every core without holding a request thread or
+the GIL of the process serving requests. Progress is written to a
+LabelRenderJob row after each chunk, so any process can report it.
+
+With LABEL_RENDER_WORKERS = 0 the chunks are rendered by the background
+thread itself, for hosts where processes cannot be spawned.
+
+Each worker process only counts its own writes against LABEL_CACHE_MAX_BYTES,
+so the disk tier is recounted and trimmed once a job is done, and a job
+whose labels would not all fit says so. A job that stops making progress
+for LABEL_RENDER_JOB_TIMEOUT seconds, because the process running it went
+away, is marked failed the next time its progress is asked for.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Item, PrintQueue, PrintQueueItem, LabelRenderJob
+from .label_cache import label_cache
+from .write_queue import write_queue
+from . import labels, render_worker
+
+RENDER_CHUNK_SIZE = 50
+
+# Queue entries bumped or created per statement.
+WRITE_BATCH_SIZE = 500
+
+Kind = PrintQueueItem.Kind
+
+
+def section_labels(section, item_kind):
+    """The labels of `section`, its spaces and all their items, in a fixed order."""
+    spaces = list(section.spaces.order_by('space_code'))
+    for space in spaces:
+        space.section = section
+    items = Item.objects.filter(space__section=section).order_by('space__space_code', 'item_code')
+    return (
+        [(Kind.SECTION, section)]
+        + [(Kind.SPACE, space) for space in spaces]
+        + [(item_kind, item) for item in items]
+    )
+
+
+def space_labels(space, item_kind):
+    """The labels of `space` and its items, in a fixed order."""
+    return [(Kind.SPACE, space)] + [(item_kind, item) for item in space.items.order_by('item_code')]
+
+
+def _enqueue_labels(user, entries):
+    """
+    Adds one copy of each label in `entries`, (kind, object, name, payload
+    hash) tuples, to the user's print queue: labels already queued have
+    their quantity bumped, the rest are bulk-created.
+    """
+    print_queue, _ = PrintQueue.objects.get_or_create(user=user)
+    queued = {
+        (content_type_id, object_id, kind): entry_id
+        for entry_id, content_type_id, object_id, kind in print_queue.items.values_list(
+            'id', 'content_type_id', 'object_id', 'label_kind'
+        )
+    }
+    bumped, created = [], []
+    for kind, obj, name, payload_hash in entries:
+        content_type = ContentType.objects.get_for_model(obj)
+        entry_id = queued.get((content_type.id, obj.pk, kind))
+        if entry_id is not None:
+            bumped.append(entry_id)
+        else:
+            created.append(PrintQueueItem(
+                print_queue=print_queue, content_type=content_type, object_id=obj.pk,
+                label_kind=kind, name=name, quantity=1, payload_hash=payload_hash,
+            ))
+    for start in range(0, len(bumped), WRITE_BATCH_SIZE):
+        PrintQueueItem.objects.filter(id__in=bumped[start:start + WRITE_BATCH_SIZE]).update(quantity=F('quantity') + 1)
+    PrintQueueItem.objects.bulk_create(created, batch_size=WRITE_BATCH_SIZE)
+
+
+def _record_progress(job_id, count):
+    LabelRenderJob.objects.filter(id=job_id).update(rendered=F('rendered') + count, progressed_at=timezone.now())
+
+
+def _finish(job_id, state, error=''):
+    LabelRenderJob.objects.filter(id=job_id).update(state=state, error=error, finished_at=timezone.now())
+
+
+def _fail_stalled(job_id, progressed_at):
+    # Only if nothing has moved it on since it was read.
+    LabelRenderJob.objects.filter(id=job_id, state=LabelRenderJob.State.RUNNING, progressed_at=progressed_at).update(
+        state=LabelRenderJob.State.FAILED,
+        error="Preparing the labels stopped; the server may have restarted.",
+        finished_at=timezone.now(),
+    )
+
+
+def fail_if_stalled(job):
+    """
+    Marks `job` failed if it is still running but has not progressed for
+    LABEL_RENDER_JOB_TIMEOUT seconds, as nothing is left to finish it.
+    Returns the job, up to date.
+    """
+    timeout = timedelta(seconds=getattr(settings, 'LABEL_RENDER_JOB_TIMEOUT', 300))
+    if (
+        job.state == LabelRenderJob.State.RUNNING
+        and timezone.now() - (job.progressed_at or job.created_at) > timeout
+    ):
+        write_queue.run(_fail_stalled, job.id, job.progressed_at)
+        job.refresh_from_db()
+    return job
+
+
+class LabelRenderer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_cache_dir = None
+
+    @property
+    def workers(self):
+        """How many render processes to use, 0 for none (LABEL_RENDER_WORKERS)."""
+        return getattr(settings, 'LABEL_RENDER_WORKERS', os.cpu_count() or 1)
+
+    @property
+    def niceness(self):
+        """How far the render processes lower their priority (LABEL_RENDER_NICENESS)."""
+        return getattr(settings, 'LABEL_RENDER_NICENESS', 10)
+
+    def queue_all(self, user, description, targets):
+        """
+        Queues the labels in `targets`, (kind, object) pairs, for `user` and
+        starts pre-rendering those not yet cached; returns the LabelRenderJob.
+        """
+        entries = [(kind, obj, labels.label_title(kind, obj), labels.label_key(kind, obj)) for kind, obj in targets]
+        write_queue.run(_enqueue_labels, user, entries)
+
+        pending = [(kind, obj) for kind, obj in targets if not labels.is_rendered(kind, obj)]
+        job = write_queue.run(
+            LabelRenderJob.objects.create,
+            user=user,
+            description=description,
+            queued=len(targets),
+            total=len(pending),
+            state=LabelRenderJob.State.RUNNING if pending else LabelRenderJob.State.DONE,
+            progressed_at=timezone.now(),
+            finished_at=None if pending else timezone.now(),
+        )
+        if pending:
+            threading.Thread(target=self._run, args=(job.id, pending), name=f'label-job-{job.id}', daemon=True).start()
+        return job
+
+    def _pool(self, cache_dir):
+        """
+        The process pool shared by every job of this process, started on
+        first use. Its workers write to `cache_dir`; a pool started for
+        another directory is retired once its chunks are done.
+        """
+        with self._lock:
+            if self._executor is not None and self._executor_cache_dir != cache_dir:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=render_worker.start,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'sherlock.settings'), self.niceness, cache_dir),
+                )
+                self._executor_cache_dir = cache_dir
+            return self._executor
+
+    def _discard_pool(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id, pending):
+        chunks = [pending[start:start + RENDER_CHUNK_SIZE] for start in range(0, len(pending), RENDER_CHUNK_SIZE)]
+        cache_dir = str(label_cache.directory)
+        try:
+            if self.workers:
+                # map() yields results in submission order, so progress
+                # advances chunk by chunk whatever order they finish in.
+                counts = self._pool(cache_dir).map(render_worker.render_labels, chunks)
+            else:
+                counts = (render_worker.render_labels(chunk) for chunk in chunks)
+            rendered_bytes = 0
+            for count, size in counts:
+                write_queue.run(_record_progress, job_id, count)
+                rendered_bytes += size
+            label_cache.trim()
+            note = ''
+            if rendered_bytes > label_cache.disk_limit:
+                note = (
+                    f"These labels take {rendered_bytes / 2 ** 20:.1f} MB, more than the label cache keeps "
+                    f"({label_cache.disk_limit / 2 ** 20:.1f} MB); the oldest will be prepared again when printed."
+                )
+            write_queue.run(_finish, job_id, LabelRenderJob.State.DONE, note)
+        except Exception as exc:
+            if isinstance(exc, BrokenProcessPool):
+                self._discard_pool()
+            write_queue.run(_finish, job_id, LabelRenderJob.State.FAILED, str(exc) or exc.__class__.__name__)
+        finally:
+            connection.close()
+
+
+label_renderer = LabelRenderer()
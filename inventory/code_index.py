@@ -0,0 +1,229 @@
+# sherlock-python/inventory/code_index.py
+"""
+A process-local index that resolves scanned codes without touching the
+database.
+
+It maps EAN-13 item barcodes, the SHERLOCK;SECTIONCODE:…;SPACECODE:… QR
+payloads and the 12-digit section/space/item codes typed at the checkout
+terminal to primary keys and canonical URLs. The index is built lazily from
+three narrow queries and carries a version stamp: saves and deletes of
+Sections, Spaces and Items that change anything the index holds bump the
+version (see signals at the bottom), and the next lookup rebuilds it.
+Because other server processes cannot see those signals, a built index is
+also considered stale after CODE_INDEX_MAX_AGE seconds, and a code the
+index does not know is checked against the database before it is reported
+as not found: if the row exists, the index is rebuilt once and asked again.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.urls import reverse
+
+from .models import Section, Space, Item
+
+CodeMatch = namedtuple('CodeMatch', ['kind', 'pk', 'name', 'url'])
+
+
+class _Snapshot:
+    """One immutable build of the index; lookups never see a half-built one."""
+
+    def __init__(self):
+        self.sections, self.spaces, self.items = {}, {}, {}
+        self.by_section_code, self.by_space_code = {}, {}
+        self.by_item_code, self.by_barcode = {}, {}
+
+    @classmethod
+    def build(cls):
+        # The three queries run in autocommit rather than one transaction,
+        # which would take the write lock (transactions BEGIN IMMEDIATE).
+        # Rows created between them may miss their parent; they are left
+        # out, and the save that created them invalidates this build.
+        snapshot = cls()
+        for pk, name, section_code in Section.objects.values_list('id', 'name', 'section_code'):
+            snapshot.sections[pk] = (name, section_code)
+            snapshot.by_section_code[section_code] = pk
+
+        original_space_codes = []
+        for pk, name, space_code, section_id, original_section_code in Space.objects.values_list(
+            'id', 'name', 'space_code', 'section_id', 'original_section_code'
+        ):
+            if section_id not in snapshot.sections:
+                continue
+            section_code = snapshot.sections[section_id][1]
+            snapshot.spaces[pk] = (name, space_code, section_id, section_code)
+            snapshot.by_space_code[(section_code, space_code)] = pk
+            original_space_codes.append(((original_section_code, space_code), pk))
+        # Space QR codes print the permanent original section code, so a
+        # space that has since moved is still found by its label.
+        for key, pk in original_space_codes:
+            snapshot.by_space_code.setdefault(key, pk)
+
+        for pk, name, item_code, barcode, space_id in Item.objects.values_list(
+            'id', 'name', 'item_code', 'barcode', 'space_id'
+        ):
+            if space_id not in snapshot.spaces:
+                continue
+            _, space_code, _, section_code = snapshot.spaces[space_id]
+            snapshot.items[pk] = (name, item_code, barcode, space_id, section_code, space_code)
+            snapshot.by_item_code[(section_code, space_code, item_code)] = pk
+            if barcode:
+                snapshot.by_barcode[barcode] = pk
+        return snapshot
+
+    def section_match(self, pk):
+        if pk is None:
+            return None
+        name, section_code = self.sections[pk]
+        url = reverse('inventory:section_detail', kwargs={'section_code': section_code})
+        return CodeMatch('section', pk, name, url)
+
+    def space_match(self, pk):
+        if pk is None:
+            return None
+        name, space_code, _, section_code = self.spaces[pk]
+        url = reverse('inventory:space_detail', kwargs={'section_code': section_code, 'space_code': space_code})
+        return CodeMatch('space', pk, name, url)
+
+    def item_match(self, pk):
+        if pk is None:
+            return None
+        name, item_code, _, _, section_code, space_code = self.items[pk]
+        url = reverse('inventory:item_detail', kwargs={
+            'section_code': section_code, 'space_code': space_code, 'item_code': item_code,
+        })
+        return CodeMatch('item', pk, name, url)
+
+    def is_current(self, instance):
+        """Returns True if this build already reflects `instance` exactly."""
+        if isinstance(instance, Item):
+            held = self.items.get(instance.pk)
+            return held is not None and held[:4] == (instance.name, instance.item_code, instance.barcode, instance.space_id)
+        if isinstance(instance, Space):
+            held = self.spaces.get(instance.pk)
+            return held is not None and held[:3] == (instance.name, instance.space_code, instance.section_id)
+        if isinstance(instance, Section):
+            held = self.sections.get(instance.pk)
+            return held is not None and held == (instance.name, instance.section_code)
+        return False
+
+
+class CodeIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._snapshot = None
+        self._built_version = None
+        self._built_at = 0.0
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'CODE_INDEX_MAX_AGE', 60)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def _current(self, rebuild=False):
+        """Returns an up-to-date snapshot, rebuilding it if asked or if the version or age requires."""
+        with self._lock:
+            fresh = (
+                self._snapshot is not None
+                and self._built_version == self.version
+                and time.monotonic() - self._built_at < self.max_age
+            )
+            if fresh and not rebuild:
+                return self._snapshot
+            version = self.version
+        # Built outside the lock, so lookups are not held up behind the
+        # queries. A build that raced an invalidation is installed but
+        # stamped with the older version, so the next lookup rebuilds.
+        snapshot = _Snapshot.build()
+        with self._lock:
+            if self._built_version is None or version >= self._built_version:
+                self._snapshot = snapshot
+                self._built_version = version
+                self._built_at = time.monotonic()
+        return snapshot
+
+    def _resolve(self, kind, table, key, in_database):
+        """
+        Looks `key` up in one of the snapshot's `table`s. On a miss,
+        `in_database` asks the database whether the row exists after all (it
+        may have been created by another process), and if so the index is
+        rebuilt once before answering.
+        """
+        snapshot = self._current()
+        pk = getattr(snapshot, table).get(key)
+        if pk is None and in_database():
+            snapshot = self._current(rebuild=True)
+            pk = getattr(snapshot, table).get(key)
+        return getattr(snapshot, f'{kind}_match')(pk)
+
+    def resolve(self, code):
+        """Returns the CodeMatch for a scanned barcode or QR payload, or None."""
+        code = code.strip()
+        if code.isdigit() and len(code) == 13:
+            return self.resolve_barcode(code)
+
+        if code.startswith('SHERLOCK;'):
+            parts = code.split(';')
+            section_code_str = next((p.split(':')[1] for p in parts if p.startswith('SECTIONCODE:')), None)
+            space_code_str = next((p.split(':')[1] for p in parts if p.startswith('SPACECODE:')), None)
+            try:
+                if section_code_str and space_code_str:
+                    return self.resolve_space(int(section_code_str), int(space_code_str))
+                if section_code_str:
+                    return self.resolve_section(int(section_code_str))
+            except ValueError:
+                return None
+        return None
+
+    def resolve_barcode(self, barcode):
+        return self._resolve('item', 'by_barcode', barcode, Item.objects.filter(barcode=barcode).exists)
+
+    def resolve_section(self, section_code):
+        return self._resolve('section', 'by_section_code', section_code, Section.objects.filter(section_code=section_code).exists)
+
+    def resolve_space(self, section_code, space_code):
+        spaces = Space.objects.filter(
+            Q(section__section_code=section_code) | Q(original_section_code=section_code), space_code=space_code,
+        )
+        return self._resolve('space', 'by_space_code', (section_code, space_code), spaces.exists)
+
+    def resolve_item(self, section_code, space_code, item_code):
+        items = Item.objects.filter(
+            space__section__section_code=section_code, space__space_code=space_code, item_code=item_code,
+        )
+        return self._resolve('item', 'by_item_code', (section_code, space_code, item_code), items.exists)
+
+    def is_current(self, instance):
+        snapshot = self._snapshot
+        return snapshot is not None and snapshot.is_current(instance)
+
+
+code_index = CodeIndex()
+
+
+def _invalidate_on_save(sender, instance, **kwargs):
+    # Stock adjustments and other saves that leave codes and names alone
+    # keep the current build. Invalidating again on commit stops a rebuild
+    # that raced the open transaction from keeping pre-commit data.
+    if not code_index.is_current(instance):
+        code_index.invalidate()
+        transaction.on_commit(code_index.invalidate)
+
+
+def _invalidate_on_delete(sender, instance, **kwargs):
+    code_index.invalidate()
+    transaction.on_commit(code_index.invalidate)
+
+
+for _model in (Section, Space, Item):
+    post_save.connect(_invalidate_on_save, sender=_model, dispatch_uid=f'code_index_save_{_model.__name__}')
+    post_delete.connect(_invalidate_on_delete, sender=_model, dispatch_uid=f'code_index_delete_{_model.__name__}')
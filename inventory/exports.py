@@ -0,0 +1,163 @@
+# sherlock-python/inventory/exports.py
+"""
+Streaming exports of the loan, return and stock ledgers.
+
+Each ledger is read as flat tuples with values_list(), so the joins to
+items, spaces, sections, students and users happen in the one SQL query
+and no model instances are built. Rows are fetched with
+iterator(chunk_size=EXPORT_CHUNK_SIZE) and written out a chunk at a time,
+so memory stays flat however many rows an export covers.
+
+Exports are plain reads in autocommit mode: no transaction is opened, so
+no write lock is taken, and with the WAL journal writers carry on while an
+export streams.
+"""
+
+import csv
+import io
+import json
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import CheckoutLog, CheckInLog, ItemLog
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+# `columns` pairs each output header with the field path it is read from.
+# `section_path` and `student_path` are the lookups the filters apply to;
+# a ledger without a student (the stock ledger) has student_path None.
+Ledger = namedtuple('Ledger', ['label', 'model', 'date_field', 'section_path', 'student_path', 'columns'])
+
+LEDGERS = {
+    'loans': Ledger(
+        'Loans', CheckoutLog, 'checkout_date',
+        'item__space__section__section_code', 'student__admission_number',
+        (
+            ('id', 'id'),
+            ('checkout_date', 'checkout_date'),
+            ('due_date', 'due_date'),
+            ('return_date', 'return_date'),
+            ('quantity', 'quantity'),
+            ('returned_quantity', 'returned_quantity'),
+            ('item_barcode', 'item__barcode'),
+            ('item_name', 'item__name'),
+            ('section', 'item__space__section__name'),
+            ('space', 'item__space__name'),
+            ('admission_number', 'student__admission_number'),
+            ('student_name', 'student__name'),
+            ('notes', 'notes'),
+        ),
+    ),
+    'returns': Ledger(
+        'Returns', CheckInLog, 'return_date',
+        'checkout_log__item__space__section__section_code', 'checkout_log__student__admission_number',
+        (
+            ('id', 'id'),
+            ('return_date', 'return_date'),
+            ('checkout_id', 'checkout_log_id'),
+            ('quantity_returned', 'quantity_returned'),
+            ('condition', 'condition'),
+            ('item_barcode', 'checkout_log__item__barcode'),
+            ('item_name', 'checkout_log__item__name'),
+            ('section', 'checkout_log__item__space__section__name'),
+            ('space', 'checkout_log__item__space__name'),
+            ('admission_number', 'checkout_log__student__admission_number'),
+            ('student_name', 'checkout_log__student__name'),
+        ),
+    ),
+    'stock': Ledger(
+        'Stock ledger', ItemLog, 'timestamp',
+        'item__space__section__section_code', None,
+        (
+            ('id', 'id'),
+            ('timestamp', 'timestamp'),
+            ('action', 'action'),
+            ('quantity_change', 'quantity_change'),
+            ('item_barcode', 'item__barcode'),
+            ('item_name', 'item__name'),
+            ('section', 'item__space__section__name'),
+            ('space', 'item__space__name'),
+            ('user', 'user__username'),
+            ('notes', 'notes'),
+        ),
+    ),
+}
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def ledger_rows(name, start_date=None, end_date=None, section_code=None, admission_number=None):
+    """
+    Returns the rows of ledger `name` as a values_list queryset in id order.
+    Dates are inclusive calendar days in the local time zone.
+    """
+    ledger = LEDGERS[name]
+    if admission_number and ledger.student_path is None:
+        raise ValueError(f"The {ledger.label.lower()} cannot be filtered by student.")
+
+    filters = {}
+    # Compare against datetimes rather than using __date, so the filter
+    # stays a plain range on the column.
+    if start_date:
+        filters[f'{ledger.date_field}__gte'] = _day_start(start_date)
+    if end_date:
+        filters[f'{ledger.date_field}__lt'] = _day_start(end_date + timedelta(days=1))
+    if section_code is not None:
+        filters[ledger.section_path] = section_code
+    if admission_number:
+        filters[ledger.student_path] = admission_number.strip().upper()
+
+    fields = [path for _, path in ledger.columns]
+    return ledger.model.objects.filter(**filters).order_by('id').values_list(*fields)
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def stream_csv(name, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the CSV text of `rows`, a header line first, about `chunk_size` rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in LEDGERS[name].columns])
+    for count, row in enumerate(rows.iterator(chunk_size=chunk_size), start=1):
+        writer.writerow([_plain(value) for value in row])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(name, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields `rows` as JSON Lines, one object per row, about `chunk_size` rows at a time."""
+    headers = [header for header, _ in LEDGERS[name].columns]
+    lines = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        lines.append(json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder))
+        if len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream(name, fmt, rows):
+    return stream_jsonl(name, rows) if fmt == 'jsonl' else stream_csv(name, rows)
+
+
+def filename(name, fmt):
+    return f"sherlock-{name}-{timezone.localdate():%Y%m%d}.{FORMATS[fmt][1]}"
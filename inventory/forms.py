@@ -6,6 +6,8 @@ from .models import Space
 from .models import Item
 from .models import Student
 from .models import UserProfile
+from .exports import LEDGERS
+from .sheets import paper_choices, default_paper
 from django.contrib.auth.models import User
 
 class SectionForm(forms.ModelForm):
@@ -63,6 +65,29 @@ class StudentForm(forms.ModelForm):
             'student_class': 'Class',
         }
 
+class StudentImportForm(forms.Form):
+    roster = forms.FileField(
+        label="Roster CSV",
+        help_text="A UTF-8 CSV file with the columns admission_number, name, class and section. "
+                  "Existing students are matched by admission number and updated.",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,text/csv'}),
+    )
+
+class InventoryImportForm(forms.Form):
+    inventory = forms.FileField(
+        label="Inventory CSV",
+        help_text="A UTF-8 CSV file with one row per item: section_code, section_name, section_description, "
+                  "space_code, space_name, space_description, item_code, item_name, item_description, "
+                  "quantity and buffer_quantity. Rows without an item_code only create the section and space.",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,text/csv'}),
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        label="Dry run",
+        help_text="Show what would change without saving anything.",
+    )
+
 class StockAdjustmentForm(forms.Form):
     quantity = forms.IntegerField(
         min_value=1,
@@ -85,4 +110,47 @@ class UserRoleForm(forms.ModelForm):
     """Form for Admins to update a user's role."""
     class Meta:
         model = UserProfile
-        fields = ['role']
\ No newline at end of file
+        fields = ['role']
+
+class LedgerExportForm(forms.Form):
+    """Selects a ledger, a format and optional filters for a streamed export."""
+    ledger = forms.ChoiceField(choices=[(name, ledger.label) for name, ledger in LEDGERS.items()])
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], initial='csv')
+    start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    section = forms.ModelChoiceField(
+        queryset=Section.objects.order_by('name'),
+        to_field_name='section_code',
+        required=False,
+        empty_label="All sections",
+    )
+    student = forms.CharField(
+        max_length=50,
+        required=False,
+        label="Student admission number",
+        help_text="Not available for the stock ledger.",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise forms.ValidationError("The end date must not be before the start date.")
+        ledger = cleaned_data.get('ledger')
+        if ledger and cleaned_data.get('student') and LEDGERS[ledger].student_path is None:
+            self.add_error('student', f"The {LEDGERS[ledger].label.lower()} cannot be filtered by student.")
+        return cleaned_data
+
+    def filters(self):
+        """Returns the cleaned filters as keyword arguments for exports.ledger_rows()."""
+        section = self.cleaned_data['section']
+        return {
+            'start_date': self.cleaned_data['start_date'],
+            'end_date': self.cleaned_data['end_date'],
+            'section_code': section.section_code if section else None,
+            'admission_number': self.cleaned_data['student'],
+        }
+
+class PrintSheetForm(forms.Form):
+    """Selects the paper the print queue is laid out on."""
+    paper = forms.ChoiceField(choices=paper_choices, initial=default_paper)
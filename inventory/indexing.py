@@ -0,0 +1,132 @@
+# sherlock-python/inventory/indexing.py
+"""
+Keeps SearchEntry in step with Sections, Spaces and Items.
+
+Indexed models snapshot the fields that feed their search entry when they
+are loaded, so a save that leaves those fields untouched (a stock
+adjustment, say) only refreshes the updated_at copied into the entry, in
+one UPDATE that loads nothing. Changed objects are queued with the
+transaction and written in one bulk upsert when it commits (immediately,
+in autocommit mode); work queued by a rolled-back transaction is dropped
+with it. When a Section or Space changes code or parent, the entries of
+everything beneath it are rebuilt too, because their URLs embed the
+hierarchy.
+"""
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+
+class _Pending:
+    """
+    Index work queued by one save, run when its transaction commits. The
+    first to run writes the work of every other still waiting on the
+    connection as well, so a transaction costs one bulk upsert. Work queued
+    inside a transaction or savepoint that rolled back was dropped from the
+    connection with it, so it is never written by a later commit.
+    """
+
+    def __init__(self, reindex=None, touched=None):
+        # (model, pk) -> whether the entries beneath it are rebuilt too.
+        self.reindex = reindex or {}
+        # model -> pks whose entries only need their updated_at refreshed.
+        self.touched = touched or {}
+        self.done = False
+
+    def __call__(self):
+        if self.done:
+            return
+        waiting = [callback for _, callback, _ in transaction.get_connection().run_on_commit if isinstance(callback, _Pending)]
+        reindex, touched = {}, {}
+        for pending in [self] + waiting:
+            if pending.done:
+                continue
+            pending.done = True
+            for key, include_descendants in pending.reindex.items():
+                reindex[key] = reindex.get(key, False) or include_descendants
+            for model, ids in pending.touched.items():
+                touched.setdefault(model, set()).update(ids)
+        _flush(reindex, touched)
+
+
+def schedule(instance, include_descendants=False):
+    """Queues `instance` for reindexing when the current transaction commits."""
+    transaction.on_commit(_Pending(reindex={(type(instance), instance.pk): include_descendants}))
+
+
+def touch(model, ids):
+    """
+    Queues a refresh of the updated_at held by the entries of `ids`, for
+    saves that changed nothing else the index holds.
+    """
+    ids = set(ids)
+    if ids:
+        transaction.on_commit(_Pending(touched={model: ids}))
+
+
+def _flush(queued, touched):
+    """Writes the queued search entries in a single bulk upsert, then refreshes the touched ones."""
+    from .models import Section, Space, Item, SearchEntry
+
+    ids = {Section: set(), Space: set(), Item: set()}
+    sections_moved, spaces_moved = set(), set()
+    for (model, pk), include_descendants in queued.items():
+        ids[model].add(pk)
+        if include_descendants and model is Section:
+            sections_moved.add(pk)
+        elif include_descendants and model is Space:
+            spaces_moved.add(pk)
+
+    if sections_moved:
+        ids[Space].update(Space.objects.filter(section_id__in=sections_moved).values_list('id', flat=True))
+        ids[Item].update(Item.objects.filter(space__section_id__in=sections_moved).values_list('id', flat=True))
+    if spaces_moved:
+        ids[Item].update(Item.objects.filter(space_id__in=spaces_moved).values_list('id', flat=True))
+
+    objects = []
+    if ids[Section]:
+        objects.extend(Section.objects.filter(id__in=ids[Section]))
+    if ids[Space]:
+        objects.extend(Space.objects.filter(id__in=ids[Space]).select_related('section'))
+    if ids[Item]:
+        objects.extend(Item.objects.filter(id__in=ids[Item]).select_related('space__section'))
+    upsert_entries(objects)
+
+    for model, pks in touched.items():
+        pks = pks - ids[model]
+        if pks:
+            SearchEntry.objects.filter(
+                content_type=ContentType.objects.get_for_model(model), object_id__in=pks,
+            ).update(updated_at=Subquery(model.objects.filter(pk=OuterRef('object_id')).values('updated_at')[:1]))
+
+
+def build_entry(instance):
+    """Returns an unsaved SearchEntry describing `instance`."""
+    from .models import SearchEntry
+
+    return SearchEntry(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        name=instance.name,
+        description=instance.description,
+        url=instance.get_absolute_url(),
+        updated_at=instance.updated_at,
+    )
+
+
+def upsert_entries(objects, batch_size=500):
+    """Inserts or updates the search entries of `objects` in bulk."""
+    from .models import SearchEntry
+
+    entries = [build_entry(instance) for instance in objects]
+    if not entries:
+        return 0
+    SearchEntry.objects.bulk_create(
+        entries,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['content_type', 'object_id'],
+        update_fields=['name', 'description', 'url', 'updated_at'],
+    )
+    return len(entries)
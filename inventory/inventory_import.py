@@ -0,0 +1,273 @@
+# sherlock-python/inventory/inventory_import.py
+"""
+Bulk import of sections, spaces and items from one hierarchical CSV file.
+
+Every row names a section and a space by code and, optionally, an item
+within that space. Sections and spaces that already exist are used as
+they are; missing ones are created from the row's name and description
+columns. Items are only ever created: a row for an item that already
+exists is counted as unchanged, or listed in the diff if its details
+differ (stock changes go through Adjust Stock, so they are logged).
+
+The import is planned in memory first, loading the existing sections and
+spaces once and the items of each existing space the file touches, which
+is also how the dry run produces its diff without writing anything. Applying the plan bulk-creates the new rows,
+computing barcodes with item_barcode() rather than through python-barcode.
+Items are written in batches of IMPORT_BATCH_SIZE. The search index is
+then upserted in bulk, because bulk_create bypasses Model.save.
+
+The batches commit one at a time, so an import that fails part way leaves
+what it has written. Running it again finishes the job: rows that now
+exist count as unchanged, and any the file names that still have no search
+entry (their run stopped before indexing them) are indexed then.
+"""
+
+import csv
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError
+from django.utils.text import capfirst
+
+from .models import Section, Space, Item, SearchEntry, item_barcode
+from . import indexing
+from .code_index import code_index
+from .write_queue import write_queue
+
+IMPORT_BATCH_SIZE = 1000
+
+SECTION_COLUMNS = {'section_code': 'section_code', 'section_name': 'name', 'section_description': 'description'}
+SPACE_COLUMNS = {'space_code': 'space_code', 'space_name': 'name', 'space_description': 'description'}
+ITEM_COLUMNS = {
+    'item_code': 'item_code',
+    'item_name': 'name',
+    'item_description': 'description',
+    'quantity': 'quantity',
+    'buffer_quantity': 'buffer_quantity',
+}
+REQUIRED_COLUMNS = ('section_code', 'space_code')
+
+RowError = namedtuple('RowError', ['line', 'code', 'message'])
+ItemChange = namedtuple('ItemChange', ['line', 'code', 'differences'])
+
+
+class InventoryImportReport:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.sections = []
+        self.spaces = []
+        self.items = []
+        self.unchanged = 0
+        self.changed = []
+        self.errors = []
+        # Existing sections, spaces and items named by the file.
+        self.existing = []
+
+
+def _code_label(*codes):
+    return '-'.join(f"{code:04d}" for code in codes)
+
+
+def _clean(model, column_map, row, line, label, errors, skip_blank=()):
+    """Cleans the columns of `row` mapped to `model` fields; returns field values, or None on errors."""
+    values, messages = {}, []
+    for column, name in column_map.items():
+        raw = row.get(column, '').strip()
+        field = model._meta.get_field(name)
+        if raw == '' and (name in skip_blank or field.has_default()):
+            continue
+        try:
+            values[name] = field.clean(raw, None)
+        except ValidationError as exc:
+            messages.extend(f"{capfirst(column.replace('_', ' '))}: {message}" for message in exc.messages)
+    if messages:
+        errors.append(RowError(line, label, ' '.join(messages)))
+        return None
+    return values
+
+
+def plan_import(lines, dry_run=False):
+    """
+    Reads the CSV in `lines` and returns an InventoryImportReport of what
+    it would create, without writing anything. Raises ValueError if the
+    header lacks a required column or the file is not UTF-8.
+    """
+    report = InventoryImportReport(dry_run)
+    reader = csv.DictReader(lines, restval='')
+    header = [
+        (title or '').strip().lower().replace(' ', '_').replace('-', '_')
+        for title in (reader.fieldnames or [])
+    ]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"The file is missing the column(s): {', '.join(missing)}.")
+    reader.fieldnames = header
+
+    # Sections and spaces are few enough to load whole; items are loaded
+    # per existing space, the first time the file mentions it.
+    sections = {section.section_code: section for section in Section.objects.all()}
+    sections_by_id = {section.pk: section for section in sections.values()}
+    spaces = {}
+    for space in Space.objects.all():
+        space.section = sections_by_id[space.section_id]
+        spaces[(space.section.section_code, space.space_code)] = space
+    items = {}
+    existing = {}
+    loaded_spaces = set()
+    seen_items = {}
+    new_items = []
+
+    try:
+        for row in reader:
+            if not any(value.strip() for value in row.values() if isinstance(value, str)):
+                continue
+            line = reader.line_num
+
+            try:
+                section_code = Section._meta.get_field('section_code').clean(row['section_code'].strip(), None)
+                space_code = Space._meta.get_field('space_code').clean(row['space_code'].strip(), None)
+            except ValidationError:
+                report.errors.append(RowError(line, '', "Section and space codes must be whole numbers from 1 to 9999."))
+                continue
+
+            section = sections.get(section_code)
+            if section is None:
+                values = _clean(Section, SECTION_COLUMNS, row, line, _code_label(section_code), report.errors)
+                if values is None:
+                    continue
+                section = Section(**values)
+                sections[section_code] = section
+                report.sections.append(section)
+            else:
+                existing.setdefault((Section, section.pk), section)
+
+            space = spaces.get((section_code, space_code))
+            if space is None:
+                values = _clean(Space, SPACE_COLUMNS, row, line, _code_label(section_code, space_code), report.errors)
+                if values is None:
+                    continue
+                space = Space(section=section, original_section_code=section_code, **values)
+                spaces[(section_code, space_code)] = space
+                report.spaces.append(space)
+            elif space.pk is not None:
+                existing.setdefault((Space, space.pk), space)
+
+            if not row.get('item_code', '').strip():
+                continue
+
+            if space.pk is not None and space.pk not in loaded_spaces:
+                loaded_spaces.add(space.pk)
+                for item in Item.objects.filter(space=space):
+                    item.space = space
+                    items[(space.pk, item.item_code)] = item
+
+            values = _clean(Item, ITEM_COLUMNS, row, line, _code_label(section_code, space_code), report.errors)
+            if values is None:
+                continue
+            label = _code_label(section_code, space_code, values['item_code'])
+            key = (section_code, space_code, values['item_code'])
+            if key in seen_items:
+                report.errors.append(RowError(line, label, f"Duplicate item; already on line {seen_items[key]}."))
+                continue
+            seen_items[key] = line
+
+            current = items.get((space.pk, values['item_code'])) if space.pk is not None else None
+            if current is not None:
+                existing.setdefault((Item, current.pk), current)
+                differences = {
+                    name: (getattr(current, name), value)
+                    for name, value in values.items()
+                    if getattr(current, name) != value
+                }
+                if differences:
+                    report.changed.append(ItemChange(line, label, differences))
+                else:
+                    report.unchanged += 1
+                continue
+
+            item = Item(space=space, **values)
+            item.original_section_code = section.section_code
+            item.original_space_code = space.space_code
+            item.barcode = item_barcode(item.original_section_code, item.original_space_code, item.item_code)
+            new_items.append((line, item))
+    except UnicodeDecodeError:
+        raise ValueError(f"The file is not UTF-8 text (near line {reader.line_num + 1}); save it as 'CSV UTF-8' and try again.")
+
+    report.items = _without_taken_barcodes(new_items, report.errors)
+    report.existing = list(existing.values())
+    return report
+
+
+def _without_taken_barcodes(new_items, errors):
+    """
+    Drops new items whose barcode already belongs to another item, which can
+    happen once a space has moved, since barcodes keep the original codes.
+    """
+    barcodes = [item.barcode for _, item in new_items]
+    taken = set()
+    for start in range(0, len(barcodes), IMPORT_BATCH_SIZE):
+        taken.update(
+            Item.objects.filter(barcode__in=barcodes[start:start + IMPORT_BATCH_SIZE]).values_list('barcode', flat=True)
+        )
+    kept = []
+    for line, item in new_items:
+        if item.barcode in taken:
+            errors.append(RowError(line, item.barcode, "This barcode already belongs to an item that was moved; use another item code."))
+        else:
+            kept.append(item)
+    return kept
+
+
+def _create_containers(sections, spaces):
+    # bulk_create fills in section_id from the freshly created sections.
+    Section.objects.bulk_create(sections)
+    Space.objects.bulk_create(spaces)
+
+
+def _without_entries(objects):
+    """Returns the objects in `objects` that have no search entry."""
+    by_model = {}
+    for obj in objects:
+        by_model.setdefault(type(obj), []).append(obj)
+    missing = []
+    for model, group in by_model.items():
+        content_type = ContentType.objects.get_for_model(model)
+        for start in range(0, len(group), IMPORT_BATCH_SIZE):
+            chunk = group[start:start + IMPORT_BATCH_SIZE]
+            indexed = set(
+                SearchEntry.objects.filter(content_type=content_type, object_id__in=[obj.pk for obj in chunk])
+                .values_list('object_id', flat=True)
+            )
+            missing.extend(obj for obj in chunk if obj.pk not in indexed)
+    return missing
+
+
+def apply_import(report):
+    """
+    Writes the planned sections, spaces and items, then indexes them, and
+    any existing ones an earlier run left unindexed, for search.
+    """
+    try:
+        write_queue.run(_create_containers, report.sections, report.spaces)
+        for start in range(0, len(report.items), IMPORT_BATCH_SIZE):
+            write_queue.run(Item.objects.bulk_create, report.items[start:start + IMPORT_BATCH_SIZE])
+    finally:
+        code_index.invalidate()
+
+    created = [obj for obj in report.sections + report.spaces + report.items if obj.pk is not None]
+    unindexed = created + _without_entries(report.existing)
+    for start in range(0, len(unindexed), IMPORT_BATCH_SIZE):
+        write_queue.run(indexing.upsert_entries, unindexed[start:start + IMPORT_BATCH_SIZE])
+    return report
+
+
+def import_inventory(lines, dry_run=False):
+    """Plans the import in `lines` and, unless `dry_run`, applies it; returns the report."""
+    report = plan_import(lines, dry_run=dry_run)
+    if not dry_run:
+        try:
+            apply_import(report)
+        except DatabaseError as exc:
+            report.errors.append(RowError(0, '', f"The import stopped part way: {exc}. Run it again to finish."))
+    return report
@@ -0,0 +1,196 @@
+# sherlock-python/inventory/label_cache.py
+"""
+A content-addressed cache for rendered QR code and barcode SVGs.
+
+Rendered symbols depend only on the encoded payload and the writer options,
+so they are keyed by a hash of both. Lookups go through a small in-process
+LRU first, then an on-disk tier under LABEL_CACHE_DIR, and only render on a
+miss. The disk tier is bounded by LABEL_CACHE_MAX_BYTES; the oldest files
+are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+
+def cache_key(kind, payload, options=None):
+    """Returns the content hash for a symbol of `kind` encoding `payload`."""
+    material = json.dumps([kind, payload, options or {}], sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class LabelCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def directory(self):
+        """Where the disk tier lives (LABEL_CACHE_DIR)."""
+        return Path(getattr(settings, 'LABEL_CACHE_DIR', settings.BASE_DIR / 'label_cache'))
+
+    @property
+    def memory_limit(self):
+        """How many symbols the memory tier holds (LABEL_CACHE_MEMORY_ITEMS)."""
+        return getattr(settings, 'LABEL_CACHE_MEMORY_ITEMS', 256)
+
+    @property
+    def disk_limit(self):
+        """The most bytes the disk tier may hold (LABEL_CACHE_MAX_BYTES)."""
+        return getattr(settings, 'LABEL_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+    def get_or_render(self, kind, payload, render, options=None):
+        """
+        Returns the SVG for `payload`, calling `render()` only when neither
+        the memory nor the disk tier already holds it.
+        """
+        key = cache_key(kind, payload, options)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        svg = self._read_disk(key)
+        if svg is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, svg)
+            return svg
+
+        svg = render()
+        with self._lock:
+            self.misses += 1
+        self._remember(key, svg)
+        self._write_disk(key, svg)
+        return svg
+
+    def contains(self, kind, payload, options=None):
+        """Whether the symbol for `payload` is already cached, in memory or on disk."""
+        key = cache_key(kind, payload, options)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self._path_for(key).exists()
+
+    def trim(self):
+        """
+        Recounts the disk tier, which other processes may also have written
+        to, and evicts the oldest files if it is over its limit. Returns its
+        size in bytes.
+        """
+        with self._lock:
+            self._disk_bytes = sum(self._file_size(p) for p in self._disk_files())
+            if self._disk_bytes > self.disk_limit:
+                self._evict()
+            return self._disk_bytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+            }
+
+    def clear(self, disk=True):
+        """Empties the memory tier (and the disk tier unless disk=False) and resets counters."""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+            if disk:
+                for path in self._disk_files():
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                self._disk_bytes = 0
+
+    def _remember(self, key, svg):
+        with self._lock:
+            self._memory[key] = svg
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_limit:
+                self._memory.popitem(last=False)
+
+    def _path_for(self, key):
+        return self.directory / key[:2] / f"{key}.svg"
+
+    def _disk_files(self):
+        if not self.directory.exists():
+            return []
+        return list(self.directory.glob('*/*.svg'))
+
+    def _read_disk(self, key):
+        try:
+            return self._path_for(key).read_text(encoding='utf-8')
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _write_disk(self, key, svg):
+        path = self._path_for(key)
+        data = svg.encode('utf-8')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        except OSError:
+            # The disk tier is an optimisation only; a read-only or full disk
+            # must never break label rendering.
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(self._file_size(p) for p in self._disk_files())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_limit:
+                self._evict()
+
+    def _file_size(self, path):
+        try:
+            return path.stat().st_size
+        except OSError:
+            return 0
+
+    def _evict(self):
+        """Deletes the oldest files until the disk tier is back under 90% of its limit."""
+        entries = []
+        for path in self._disk_files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_limit * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+label_cache = LabelCache()
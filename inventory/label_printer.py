@@ -0,0 +1,249 @@
+# sherlock-python/inventory/label_printer.py
+"""
+Native output for thermal label printers: ZPL, and ESC/POS as a fallback.
+
+Instead of rasterising SVG through the browser, each queued label becomes
+a few printer commands that draw the same content natively: the section or
+space QR code from qr_code_payload(), or the item's EAN-13 from
+Item.barcode. Sizes are worked out in printer dots for the configured
+resolution, so labels come out the same size on every printer. ZPL prints
+copies with ^PQ, so a label queued 500 times is still sent once.
+
+A job can be downloaded as a file, or sent over raw TCP (port 9100 on most
+printers) to LABEL_PRINTER_HOST. StubPrinter listens like a printer and
+keeps what it receives, for tests and for trying the feature without one.
+"""
+
+import socket
+import socketserver
+import threading
+from collections import namedtuple
+
+import qrcode
+from django.conf import settings
+
+from .models import PrintQueueItem
+
+Kind = PrintQueueItem.Kind
+
+# Content type and file extension of each output language.
+FORMATS = {
+    'zpl': ('application/vnd.zebra-zpl', 'zpl'),
+    'escpos': ('application/octet-stream', 'bin'),
+}
+
+# Label sizes in millimetres, matching the SVG label templates.
+LABEL_SIZES = {
+    Kind.SECTION: (80, 80),
+    Kind.SPACE: (80, 80),
+    Kind.ITEM_SMALL: (45, 20),
+    Kind.ITEM_LARGE: (100, 20),
+}
+
+# What a label shows: a heading and code for sections and spaces, which
+# carry a QR code, or just the barcode for items.
+LabelContent = namedtuple('LabelContent', ['heading', 'code', 'qr_payload', 'barcode'])
+
+# EAN-13 bars are 95 modules wide; with the quiet zones either side, 117.
+EAN13_MODULES = 95 + 2 * 11
+
+
+class PrinterError(Exception):
+    """The label printer could not be reached or did not accept the job."""
+
+
+def printer_address():
+    """The (host, port) labels are sent to, or None if no printer is configured."""
+    host = getattr(settings, 'LABEL_PRINTER_HOST', '')
+    if not host:
+        return None
+    return host, getattr(settings, 'LABEL_PRINTER_PORT', 9100)
+
+
+def printer_format():
+    """The output language jobs are built in, 'zpl' or 'escpos' (LABEL_PRINTER_FORMAT)."""
+    return getattr(settings, 'LABEL_PRINTER_FORMAT', 'zpl')
+
+
+def _dots_per_mm():
+    """The printer's resolution (LABEL_PRINTER_DPI) in dots per millimetre."""
+    return getattr(settings, 'LABEL_PRINTER_DPI', 203) / 25.4
+
+
+def label_content(kind, obj):
+    """What the label of `kind` for `obj` shows, as a LabelContent."""
+    if kind == Kind.SECTION:
+        return LabelContent('SECTION', str(obj.section_code), obj.qr_code_payload(), None)
+    if kind == Kind.SPACE:
+        return LabelContent('SPACE', str(obj.space_code), obj.qr_code_payload(), None)
+    return LabelContent(None, None, None, obj.barcode)
+
+
+def _qr_modules(payload):
+    # The same error correction level as the SVG QR codes (qrcode's default, M).
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.modules_count
+
+
+def _zpl_field(text):
+    """A ^FD field with the characters ZPL treats as commands escaped through ^FH."""
+    escaped = text.replace('_', '_5F').replace('^', '_5E').replace('~', '_7E')
+    return f'^FH^FD{escaped}^FS'
+
+
+def zpl_label(kind, obj, copies=1):
+    """Returns the ZPL for `copies` copies of the label of `kind` for `obj`."""
+    dots = _dots_per_mm()
+    width, height = (round(size * dots) for size in LABEL_SIZES[kind])
+    content = label_content(kind, obj)
+    commands = ['^XA', '^CI28', f'^PW{width}', f'^LL{height}']
+
+    if content.barcode:
+        module = max(1, width // EAN13_MODULES)
+        left = (width - 95 * module) // 2
+        bar_height = round(height * 0.55)
+        commands += [
+            f'^BY{module}',
+            f'^FO{left},{round(height * 0.12)}^BEN,{bar_height},Y,N',
+            # ^BE takes the 12 data digits and prints its own check digit.
+            _zpl_field(content.barcode[:12]),
+        ]
+    else:
+        heading_size, code_size = round(8 * dots), round(20 * dots)
+        commands += [
+            f'^FO0,{round(4 * dots)}^A0N,{heading_size},{heading_size}^FB{width},1,0,C',
+            _zpl_field(content.heading),
+            f'^FO0,{round(14 * dots)}^A0N,{code_size},{code_size}^FB{width},1,0,C',
+            _zpl_field(content.code),
+        ]
+        # Scale the QR code's modules to about 40 mm, as on the SVG label.
+        modules = _qr_modules(content.qr_payload)
+        magnification = max(1, min(10, int(40 * dots // modules)))
+        commands += [
+            f'^FO{(width - modules * magnification) // 2},{round(38 * dots)}^BQN,2,{magnification}',
+            _zpl_field(f'MA,{content.qr_payload}'),
+        ]
+
+    commands += [f'^PQ{copies}', '^XZ']
+    return ''.join(commands) + '\n'
+
+
+def _gs_k(function, data=b''):
+    """A GS ( k command for the QR code symbol (cn=49)."""
+    length = len(data) + 2
+    return b'\x1d(k' + bytes([length % 256, length // 256, 49, function]) + data
+
+
+def escpos_label(kind, obj, copies=1):
+    """
+    Returns the ESC/POS bytes for `copies` copies of the label of `kind` for
+    `obj`, each followed by a partial cut. Receipt printers have no copy
+    count, so the commands are repeated.
+    """
+    content = label_content(kind, obj)
+    commands = [b'\x1b@', b'\x1ba\x01']
+
+    if content.barcode:
+        width = LABEL_SIZES[kind][0] * _dots_per_mm()
+        module = max(2, min(6, int(width // EAN13_MODULES)))
+        commands += [
+            b'\x1dh' + bytes([round(10 * _dots_per_mm())]),
+            b'\x1dw' + bytes([module]),
+            b'\x1dH\x02',
+            b'\x1dkC\x0c' + content.barcode[:12].encode('ascii'),
+        ]
+    else:
+        payload = content.qr_payload.encode('utf-8')
+        module = max(1, min(16, int(40 * _dots_per_mm() // _qr_modules(content.qr_payload))))
+        commands += [
+            b'\x1d!\x11' + content.heading.encode('ascii') + b'\n',
+            b'\x1d!\x33' + content.code.encode('ascii') + b'\n',
+            b'\x1d!\x00',
+            _gs_k(65, b'\x32\x00'),
+            _gs_k(67, bytes([module])),
+            _gs_k(69, b'\x31'),
+            _gs_k(80, b'\x30' + payload),
+            _gs_k(81, b'\x30'),
+        ]
+
+    commands += [b'\n\n\x1dVB\x00']
+    return b''.join(commands) * copies
+
+
+def build_job(labels, fmt='zpl'):
+    """Returns the print job for `labels`, (kind, object, copies) triples, as bytes."""
+    if fmt == 'escpos':
+        return b''.join(escpos_label(kind, obj, copies) for kind, obj, copies in labels)
+    return ''.join(zpl_label(kind, obj, copies) for kind, obj, copies in labels).encode('utf-8')
+
+
+def send(data, address=None, timeout=None):
+    """Sends a job to the printer over raw TCP; raises PrinterError if it cannot be delivered."""
+    address = address or printer_address()
+    if address is None:
+        raise PrinterError("No label printer is configured.")
+    if timeout is None:
+        timeout = getattr(settings, 'LABEL_PRINTER_TIMEOUT', 10)
+    try:
+        with socket.create_connection(address, timeout=timeout) as connection:
+            connection.sendall(data)
+    except OSError as exc:
+        raise PrinterError(f"Could not send the labels to {address[0]}:{address[1]}: {exc}") from exc
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.stub.received(self.rfile.read())
+
+
+class StubPrinter:
+    """
+    A raw TCP listener that stands in for a label printer. Each connection
+    is one job; its bytes are kept in `jobs`. Use as a context manager.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_job=None):
+        self.jobs = []
+        self._on_job = on_job
+        self._condition = threading.Condition()
+        self._server = socketserver.ThreadingTCPServer((host, port), _JobHandler, bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def received(self, data):
+        with self._condition:
+            self.jobs.append(data)
+            self._condition.notify_all()
+        if self._on_job is not None:
+            self._on_job(data)
+
+    def wait_for_jobs(self, count, timeout=5):
+        """Blocks until `count` jobs have arrived; returns whether they did."""
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.jobs) >= count, timeout)
+
+    def start(self):
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-printer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,97 @@
+# sherlock-python/inventory/labels.py
+"""
+Printable section, space and item labels, rendered on demand.
+
+A print queue entry stores only which object the label is for and its
+kind. The label SVG is rendered when it is needed (on the print sheet or
+as a queue thumbnail) through the shared label cache, keyed by the kind,
+the data printed on the label and the template it is drawn with. Queuing
+the same label for many users, or printing it many times, renders it once.
+"""
+
+import base64
+import hashlib
+from collections import namedtuple
+from functools import lru_cache
+
+from django.template.loader import get_template, render_to_string
+
+from .label_cache import label_cache, cache_key
+from .models import PrintQueueItem
+
+Kind = PrintQueueItem.Kind
+
+# `title` is formatted with the object to name the queue entry; `payload`
+# returns everything the template prints, so it decides when to re-render.
+Label = namedtuple('Label', ['template', 'title', 'payload', 'context'])
+
+
+def _base64(svg):
+    return base64.b64encode(svg.encode('utf-8')).decode('utf-8')
+
+
+def _section_context(section):
+    return {'section': section, 'qr_code_base64': _base64(section.generate_qr_code_svg())}
+
+
+def _space_context(space):
+    return {'space': space, 'qr_code_base64': _base64(space.generate_qr_code_svg())}
+
+
+def _item_context(item):
+    return {'item': item, 'barcode_base64': _base64(item.generate_barcode_svg())}
+
+
+LABELS = {
+    Kind.SECTION: Label(
+        'inventory/section_label.svg', "Section Label for {0.name}",
+        lambda section: [section.section_code, section.qr_code_payload()], _section_context,
+    ),
+    Kind.SPACE: Label(
+        'inventory/space_label.svg', "Space Label for {0.name} of section {0.section.name}",
+        lambda space: [space.space_code, space.qr_code_payload()], _space_context,
+    ),
+    Kind.ITEM_SMALL: Label(
+        'inventory/item_label_small.svg', "Small Item Label for {0.name}",
+        lambda item: [item.barcode], _item_context,
+    ),
+    Kind.ITEM_LARGE: Label(
+        'inventory/item_label_large.svg', "Large Item Label for {0.name}",
+        lambda item: [item.barcode], _item_context,
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def _template_options(template_name):
+    # Part of the cache key, so editing a label template retires the
+    # labels rendered with the old one from the disk tier.
+    source = get_template(template_name).template.source
+    return {'template': hashlib.sha256(source.encode('utf-8')).hexdigest()}
+
+
+def label_title(kind, obj):
+    return LABELS[kind].title.format(obj)
+
+
+def label_key(kind, obj):
+    """Content hash of the label of `kind` for `obj`; changes whenever its printed data does."""
+    label = LABELS[kind]
+    return cache_key(f'{kind}_label', label.payload(obj), _template_options(label.template))
+
+
+def render_label(kind, obj):
+    """Returns the label SVG of `kind` for `obj`, rendering it only on a cache miss."""
+    label = LABELS[kind]
+    return label_cache.get_or_render(
+        f'{kind}_label',
+        label.payload(obj),
+        lambda: render_to_string(label.template, label.context(obj)),
+        _template_options(label.template),
+    )
+
+
+def is_rendered(kind, obj):
+    """Whether the label of `kind` for `obj` is already in the label cache."""
+    label = LABELS[kind]
+    return label_cache.contains(f'{kind}_label', label.payload(obj), _template_options(label.template))
@@ -0,0 +1,119 @@
+# sherlock-python/inventory/management/commands/benchmark_sqlite.py
+
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# The configuration Sherlock shipped with before SQLITE_PRAGMAS: rollback
+# journal, full sync, deferred transactions and the driver's default timeout.
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures reader and writer throughput on a scratch SQLite database, "
+        "first with the stock configuration and then with SQLITE_PRAGMAS. "
+        "The application database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run (default: 5).")
+        parser.add_argument('--readers', type=int, default=4, help="Concurrent reader threads (default: 4).")
+        parser.add_argument('--writers', type=int, default=2, help="Concurrent writer threads (default: 2).")
+        parser.add_argument('--rows', type=int, default=5000, help="Items in the scratch database (default: 5000).")
+
+    def handle(self, *args, **options):
+        runs = [
+            ('baseline', BASELINE_PRAGMAS, 'DEFERRED'),
+            ('tuned', settings.SQLITE_PRAGMAS, 'IMMEDIATE'),
+        ]
+        self.stdout.write(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}{'locked':>10}")
+        for label, pragmas, begin in runs:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self._populate(path, options['rows'])
+                reads, writes, locked = self._run(path, pragmas, begin, options)
+            seconds = options['seconds']
+            self.stdout.write(f"{label:<10}{reads / seconds:>12.0f}{writes / seconds:>12.0f}{locked:>10}")
+
+    def _connect(self, path, pragmas):
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _populate(self, path, rows):
+        conn = self._connect(path, {})
+        conn.executescript(
+            "CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT, quantity INTEGER, on_loan INTEGER);"
+            "CREATE TABLE log (id INTEGER PRIMARY KEY, item_id INTEGER, quantity INTEGER, ts REAL);"
+            "CREATE INDEX log_item ON log (item_id);"
+        )
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO item (name, quantity, on_loan) VALUES (?, 100, 0)',
+            ((f'Item {n}',) for n in range(rows)),
+        )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def _run(self, path, pragmas, begin, options):
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        counts_lock = threading.Lock()
+        rows = options['rows']
+
+        def reader():
+            conn = self._connect(path, pragmas)
+            done = 0
+            while not stop.is_set():
+                item_id = random.randint(1, rows)
+                try:
+                    conn.execute(
+                        'SELECT i.name, i.quantity - i.on_loan, COUNT(l.id) FROM item i '
+                        'LEFT JOIN log l ON l.item_id = i.id WHERE i.id = ? GROUP BY i.id',
+                        (item_id,),
+                    ).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    with counts_lock:
+                        counts['locked'] += 1
+            conn.close()
+            with counts_lock:
+                counts['reads'] += done
+
+        def writer():
+            conn = self._connect(path, pragmas)
+            done = 0
+            while not stop.is_set():
+                item_id = random.randint(1, rows)
+                try:
+                    conn.execute(f'BEGIN {begin}')
+                    conn.execute('UPDATE item SET on_loan = on_loan + 1 WHERE id = ?', (item_id,))
+                    conn.execute('INSERT INTO log (item_id, quantity, ts) VALUES (?, 1, ?)', (item_id, time.time()))
+                    conn.execute('COMMIT')
+                    done += 1
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    with counts_lock:
+                        counts['locked'] += 1
+            conn.close()
+            with counts_lock:
+                counts['writes'] += done
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts['reads'], counts['writes'], counts['locked']
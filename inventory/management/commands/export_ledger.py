@@ -0,0 +1,55 @@
+# sherlock-python/inventory/management/commands/export_ledger.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.exports import LEDGERS, FORMATS, EXPORT_CHUNK_SIZE, ledger_rows, stream_csv, stream_jsonl
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"'{value}' is not a date in YYYY-MM-DD form.")
+
+
+class Command(BaseCommand):
+    help = "Streams the loan, return or stock ledger as CSV or JSON Lines to stdout or a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ledger', choices=list(LEDGERS), help="Which ledger to export.")
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help="Output format (default: csv).")
+        parser.add_argument('--start-date', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--end-date', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--section', type=int, help="Only rows for items in the section with this code.")
+        parser.add_argument('--student', help="Only rows for the student with this admission number.")
+        parser.add_argument('--output', help="Write to this file instead of stdout.")
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f"Rows fetched from the database at a time (default: {EXPORT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rows = ledger_rows(
+                options['ledger'],
+                start_date=_date(options['start_date']) if options['start_date'] else None,
+                end_date=_date(options['end_date']) if options['end_date'] else None,
+                section_code=options['section'],
+                admission_number=options['student'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        stream = stream_jsonl if options['format'] == 'jsonl' else stream_csv
+        chunks = stream(options['ledger'], rows, chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
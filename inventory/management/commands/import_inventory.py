@@ -0,0 +1,42 @@
+# sherlock-python/inventory/management/commands/import_inventory.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.inventory_import import import_inventory
+
+
+class Command(BaseCommand):
+    help = "Creates sections, spaces and items from a hierarchical CSV file; existing items are never changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with one row per item (see the Import Inventory page for the columns).")
+        parser.add_argument('--dry-run', action='store_true', help="Print what would change without saving anything.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as inventory:
+                report = import_inventory(inventory, dry_run=options['dry_run'])
+        except OSError as exc:
+            raise CommandError(f"Could not read '{options['path']}': {exc.strerror}.")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        verbose = options['verbosity'] > 1 or options['dry_run']
+        if verbose:
+            for section in report.sections:
+                self.stdout.write(f"+ section {section.section_code:04d} {section.name}")
+            for space in report.spaces:
+                self.stdout.write(f"+ space {space.section.section_code:04d}-{space.space_code:04d} {space.name}")
+            for item in report.items:
+                self.stdout.write(f"+ item {item.barcode} {item.name} (qty {item.quantity})")
+        for change in report.changed:
+            differences = '; '.join(f"{field}: {old!r} -> {new!r}" for field, (old, new) in change.differences.items())
+            self.stdout.write(f"~ item {change.code} (line {change.line}, not changed): {differences}")
+        for error in report.errors:
+            self.stderr.write(f"Line {error.line} ({error.code or 'no code'}): {error.message}")
+
+        verb = "Would create" if report.dry_run else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(report.sections)} sections, {len(report.spaces)} spaces and {len(report.items)} items; "
+            f"{report.unchanged} unchanged, {len(report.changed)} differing, {len(report.errors)} rows rejected."
+        ))
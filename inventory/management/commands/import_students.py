@@ -0,0 +1,34 @@
+# sherlock-python/inventory/management/commands/import_students.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.student_import import import_students, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Creates or updates students from a roster CSV, matching existing students by admission number."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with admission_number, name, class and section columns.")
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help=f"Students written per transaction (default: {IMPORT_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as roster:
+                report = import_students(roster, batch_size=options['batch_size'])
+        except OSError as exc:
+            raise CommandError(f"Could not read '{options['path']}': {exc.strerror}.")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error.line} ({error.admission_number or 'no admission number'}): {error.message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.imported} students ({report.created} new, {report.updated} updated); "
+            f"{len(report.errors)} rows rejected."
+        ))
@@ -0,0 +1,57 @@
+# sherlock-python/inventory/management/commands/rebuild_on_loan_counts.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from inventory.models import Item, CheckoutLog, CheckInLog
+
+
+def expected_on_loan_quantities():
+    """
+    Recomputes the on-loan quantity of every item from the log tables:
+    the units of all open checkouts minus what has already been returned.
+    """
+    on_loan = {}
+    open_logs = CheckoutLog.objects.filter(return_date__isnull=True)
+    for row in open_logs.values('item_id').annotate(total=Sum('quantity')):
+        on_loan[row['item_id']] = row['total']
+
+    returns = CheckInLog.objects.filter(checkout_log__return_date__isnull=True)
+    for row in returns.values('checkout_log__item_id').annotate(total=Sum('quantity_returned')):
+        on_loan[row['checkout_log__item_id']] -= row['total']
+    return on_loan
+
+
+class Command(BaseCommand):
+    help = "Rebuilds (or, with --check, verifies) the on-loan counter stored on every item from the checkout and check-in logs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report items whose counter is out of sync; do not write anything.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = expected_on_loan_quantities()
+            mismatches = []
+            for item_id, name, stored in Item.objects.values_list('id', 'name', 'on_loan_quantity').iterator():
+                actual = max(expected.get(item_id, 0), 0)
+                if stored != actual:
+                    mismatches.append((item_id, name, stored, actual))
+
+            for item_id, name, stored, actual in mismatches:
+                self.stdout.write(f"Item #{item_id} '{name}': stored {stored}, expected {actual}")
+
+            if options['check']:
+                if mismatches:
+                    raise CommandError(f"{len(mismatches)} item(s) have an out-of-sync on-loan counter.")
+                self.stdout.write(self.style.SUCCESS("All on-loan counters are in sync."))
+                return
+
+            for item_id, name, stored, actual in mismatches:
+                Item.objects.filter(id=item_id).update(on_loan_quantity=actual)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt on-loan counters ({len(mismatches)} corrected)."))
@@ -0,0 +1,45 @@
+# sherlock-python/inventory/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory import indexing
+from inventory.models import Section, Space, Item, SearchEntry
+from inventory.search import live_entries
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search entries of every section, space and item in bulk and removes orphaned entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help="Number of objects read and upserted per batch (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        querysets = [
+            Section.objects.all(),
+            Space.objects.select_related('section'),
+            Item.objects.select_related('space__section'),
+        ]
+
+        total = 0
+        for queryset in querysets:
+            chunk = []
+            for instance in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+                chunk.append(instance)
+                if len(chunk) >= chunk_size:
+                    total += self._write(chunk)
+                    chunk = []
+            total += self._write(chunk)
+
+        orphaned, _ = SearchEntry.objects.exclude(pk__in=live_entries().values('pk')).delete()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} objects; removed {orphaned} orphaned entries."))
+
+    def _write(self, chunk):
+        with transaction.atomic():
+            return indexing.upsert_entries(chunk, batch_size=len(chunk) or 1)
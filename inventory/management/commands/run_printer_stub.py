@@ -0,0 +1,53 @@
+# sherlock-python/inventory/management/commands/run_printer_stub.py
+
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from inventory.label_printer import StubPrinter
+
+
+class Command(BaseCommand):
+    help = "Listens like a raw TCP label printer and keeps every job it receives, for trying label printing without one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help="Address to listen on (default: 127.0.0.1).",
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=9100,
+            help="Port to listen on (default: 9100, the usual raw printing port).",
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help="Directory to save each job in; by default jobs are only summarised.",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options['output']) if options['output'] else None
+        if output is not None:
+            output.mkdir(parents=True, exist_ok=True)
+
+        def on_job(data):
+            summary = f"Received a job of {len(data)} bytes"
+            if output is not None:
+                path = output / f"job-{datetime.now():%Y%m%d-%H%M%S-%f}.prn"
+                path.write_bytes(data)
+                summary += f", saved to {path}"
+            self.stdout.write(summary + ".")
+
+        with StubPrinter(options['host'], options['port'], on_job=on_job):
+            self.stdout.write(self.style.SUCCESS(
+                f"Stub label printer listening on {options['host']}:{options['port']}. Press Ctrl+C to stop."
+            ))
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
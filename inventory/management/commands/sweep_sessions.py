@@ -0,0 +1,27 @@
+# sherlock-python/inventory/management/commands/sweep_sessions.py
+
+from django.core.management.base import BaseCommand
+
+from inventory.user_sessions import sweep_expired_sessions, SWEEP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Deletes expired sessions, and their user-session mapping rows, in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SWEEP_BATCH_SIZE,
+            help=f"Number of sessions deleted per transaction (default: {SWEEP_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help="Stop after this many batches; by default the sweep runs until nothing is left.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_sessions(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
@@ -0,0 +1,34 @@
+# sherlock-python/inventory/management/commands/warm_label_cache.py
+
+from django.core.management.base import BaseCommand
+
+from inventory.label_cache import label_cache
+from inventory.models import Section, Space, Item
+
+
+class Command(BaseCommand):
+    help = "Pre-renders the QR codes and barcodes of every section, space and item into the label cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Empty the cache (memory and disk) before warming it.",
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            label_cache.clear()
+
+        for section in Section.objects.iterator():
+            section.generate_qr_code_svg()
+        for space in Space.objects.iterator():
+            space.generate_qr_code_svg()
+        for item in Item.objects.exclude(barcode__isnull=True).only('id', 'barcode').iterator():
+            item.generate_barcode_svg()
+
+        stats = label_cache.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Label cache warmed: {stats['misses']} rendered, "
+            f"{stats['memory_hits'] + stats['disk_hits']} already cached."
+        ))
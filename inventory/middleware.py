@@ -1,12 +1,20 @@
 # sherlock-python/inventory/middleware.py
 
-from django.utils import timezone
-from .models import UserProfile
+from django.contrib import messages
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.utils.http import url_has_allowed_host_and_scheme
+
+from .presence import presence
+from .write_queue import WriteQueueFull
 
 class UpdateLastSeenMiddleware:
     """
-    Custom middleware to update the 'last_seen' timestamp for an
-    authenticated user with every request they make.
+    Custom middleware to record the 'last_seen' timestamp for an
+    authenticated user with every request they make. The timestamp is held
+    in memory and written in batches by the presence tracker, so read-only
+    requests do not write to the database.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -15,6 +23,38 @@ class UpdateLastSeenMiddleware:
         response = self.get_response(request)
 
         if request.user.is_authenticated:
-            UserProfile.objects.filter(user=request.user).update(last_seen=timezone.now())
+            presence.touch(request.user.id)
         
-        return response
\ No newline at end of file
+        return response
+
+class WriteContentionMiddleware:
+    """
+    Turns a write that could not get through at a busy moment (the write
+    queue was full, or SQLite's lock wait timed out) into a "try again"
+    response instead of a server error. Nothing was written in either case,
+    so retrying is safe.
+    """
+    BUSY_MESSAGE = "Sherlock is very busy right now and could not save that change. Please try again."
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, OperationalError) and 'locked' not in str(exception):
+            return None
+        if not isinstance(exception, (WriteQueueFull, OperationalError)):
+            return None
+
+        if request.headers.get('HX-Request'):
+            response = HttpResponse(self.BUSY_MESSAGE, status=503, content_type='text/plain')
+            response['Retry-After'] = '2'
+            return response
+
+        messages.error(request, self.BUSY_MESSAGE)
+        referer = request.META.get('HTTP_REFERER')
+        if referer and url_has_allowed_host_and_scheme(referer, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+            return redirect(referer)
+        return redirect('inventory:dashboard')
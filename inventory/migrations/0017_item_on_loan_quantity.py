@@ -0,0 +1,35 @@
+"""Adds Item.on_loan_quantity and backfills it from the open checkouts."""
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_on_loan_quantity(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    CheckoutLog = apps.get_model('inventory', 'CheckoutLog')
+    CheckInLog = apps.get_model('inventory', 'CheckInLog')
+
+    on_loan = {}
+    for row in CheckoutLog.objects.filter(return_date__isnull=True).values('item_id').annotate(total=Sum('quantity')):
+        on_loan[row['item_id']] = row['total']
+    for row in CheckInLog.objects.filter(checkout_log__return_date__isnull=True).values('checkout_log__item_id').annotate(total=Sum('quantity_returned')):
+        on_loan[row['checkout_log__item_id']] -= row['total']
+
+    for item_id, quantity in on_loan.items():
+        Item.objects.filter(id=item_id).update(on_loan_quantity=max(quantity, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_alter_item_barcode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='on_loan_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Units currently on loan. Maintained by checkout and check-in; rebuild with 'rebuild_on_loan_counts'."),
+        ),
+        migrations.RunPython(backfill_on_loan_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+"""Adds CheckoutLog.returned_quantity and backfills it from the check-in logs."""
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_returned_quantity(apps, schema_editor):
+    CheckoutLog = apps.get_model('inventory', 'CheckoutLog')
+    CheckInLog = apps.get_model('inventory', 'CheckInLog')
+
+    totals = CheckInLog.objects.values('checkout_log_id').annotate(total=Sum('quantity_returned'))
+    for row in totals.iterator():
+        CheckoutLog.objects.filter(id=row['checkout_log_id']).update(returned_quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_item_on_loan_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutlog',
+            name='returned_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Total units returned so far. Maintained by CheckInLog so reports never aggregate per row.'),
+        ),
+        migrations.RunPython(backfill_returned_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+"""Adds SearchEntry.description and the FTS5 index that mirrors the search entries."""
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+
+FTS_TABLE = 'inventory_searchentry_fts'
+
+CREATE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, description,
+        content='inventory_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER inventory_searchentry_fts_ai AFTER INSERT ON inventory_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER inventory_searchentry_fts_ad AFTER DELETE ON inventory_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER inventory_searchentry_fts_au AFTER UPDATE OF name, description ON inventory_searchentry BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS inventory_searchentry_fts_ai",
+    "DROP TRIGGER IF EXISTS inventory_searchentry_fts_ad",
+    "DROP TRIGGER IF EXISTS inventory_searchentry_fts_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def backfill_descriptions(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    try:
+        item_type = ContentType.objects.get(app_label='inventory', model='item')
+    except ContentType.DoesNotExist:
+        return
+    for item_id, description in Item.objects.values_list('id', 'description').iterator():
+        SearchEntry.objects.filter(content_type=item_type, object_id=item_id).update(description=description)
+
+
+def create_fts_index(apps, schema_editor):
+    """Creates the FTS5 mirror on SQLite builds that support it; otherwise search falls back to LIKE."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+        except OperationalError:
+            return
+        for statement in CREATE_FTS_SQL:
+            cursor.execute(statement)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_FTS_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0018_checkoutlog_returned_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchentry',
+            name='description',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_descriptions, migrations.RunPython.noop),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
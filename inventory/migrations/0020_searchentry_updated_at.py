@@ -0,0 +1,34 @@
+"""Adds SearchEntry.updated_at and copies it from the indexed sections, spaces and items."""
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    for model_name in ('section', 'space', 'item'):
+        try:
+            content_type = ContentType.objects.get(app_label='inventory', model=model_name)
+        except ContentType.DoesNotExist:
+            continue
+        model = apps.get_model('inventory', model_name)
+        for object_id, updated_at in model.objects.values_list('id', 'updated_at').iterator():
+            SearchEntry.objects.filter(content_type=content_type, object_id=object_id).update(updated_at=updated_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0019_searchentry_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchentry',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, help_text='Copied from the indexed object so results never need to load it.', null=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+"""Adds StudentTrigram and indexes the existing students for fuzzy search."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from inventory.trigrams import trigrams
+
+
+def index_existing_students(apps, schema_editor):
+    Student = apps.get_model('inventory', 'Student')
+    StudentTrigram = apps.get_model('inventory', 'StudentTrigram')
+
+    rows = []
+    for student_id, name, admission_number in Student.objects.values_list('id', 'name', 'admission_number').iterator():
+        grams = trigrams(name) | trigrams(admission_number)
+        rows.extend(StudentTrigram(student_id=student_id, trigram=gram) for gram in grams)
+    StudentTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_searchentry_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='inventory.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'student'], name='inventory_s_trigram_a29f28_idx')],
+                'unique_together': {('student', 'trigram')},
+            },
+        ),
+        migrations.RunPython(index_existing_students, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+"""Adds UserSession and maps the sessions that are already signed in to their users."""
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def map_existing_sessions(apps, schema_editor):
+    # One last decode of every live session, so users who are already signed
+    # in can still be found after the upgrade.
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    UserSession = apps.get_model('inventory', 'UserSession')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    user_ids = set(User.objects.values_list('id', flat=True))
+    decoder = SessionStore()
+    rows = []
+    for session_key, session_data in Session.objects.filter(expire_date__gte=timezone.now()).values_list('session_key', 'session_data').iterator():
+        user_id = decoder.decode(session_data).get('_auth_user_id')
+        if user_id and user_id.isdigit() and int(user_id) in user_ids:
+            rows.append(UserSession(user_id=int(user_id), session_key=session_key))
+    UserSession.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_studenttrigram'),
+        ('sessions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(max_length=40, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(map_existing_sessions, migrations.RunPython.noop),
+    ]
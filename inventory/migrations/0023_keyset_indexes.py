@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_usersession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkoutlog',
+            index=models.Index(fields=['due_date', 'id'], name='inventory_c_due_dat_28de6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkoutlog',
+            index=models.Index(fields=['item', 'checkout_date', 'id'], name='inventory_c_item_id_aae19a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlog',
+            index=models.Index(fields=['item', 'timestamp', 'id'], name='inventory_i_item_id_404cec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name', 'id'], name='inventory_s_name_4025b1_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+"""Points print queue entries at the labelled object instead of its rendered SVG, emptying pending queues."""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_rendered_entries(apps, schema_editor):
+    """
+    Queued labels only kept their rendered SVG, which cannot be traced back
+    to a section, space or item reliably, so pending queues start empty.
+    """
+    apps.get_model('inventory', 'PrintQueueItem').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0023_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_rendered_entries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='printqueueitem',
+            name='print_content',
+        ),
+        migrations.RemoveField(
+            model_name='printqueueitem',
+            name='item_hash',
+        ),
+        migrations.AddField(
+            model_name='printqueueitem',
+            name='label_kind',
+            field=models.CharField(choices=[('section', 'Section label'), ('space', 'Space label'), ('item_small', 'Small item label'), ('item_large', 'Large item label')], default='section', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='printqueueitem',
+            name='content_type',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='printqueueitem',
+            name='object_id',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='printqueueitem',
+            name='payload_hash',
+            field=models.CharField(default='', help_text='Render cache key of the label when it was queued.', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='printqueueitem',
+            unique_together={('print_queue', 'content_type', 'object_id', 'label_kind')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0024_printqueueitem_label_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=255)),
+                ('queued', models.PositiveIntegerField(default=0, help_text='Labels added to the print queue.')),
+                ('total', models.PositiveIntegerField(default=0, help_text='Labels that were not already in the label cache.')),
+                ('rendered', models.PositiveIntegerField(default=0)),
+                ('state', models.CharField(choices=[('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='RUNNING', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='label_render_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
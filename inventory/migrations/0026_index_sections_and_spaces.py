@@ -0,0 +1,54 @@
+"""Indexes the existing sections and spaces for search."""
+
+from django.db import migrations
+from django.urls import reverse
+
+
+def index_sections_and_spaces(apps, schema_editor):
+    """
+    Sections and spaces joined the search index with SearchIndexedModel, but
+    only get an entry when they are next saved; index the existing ones.
+    """
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Section = apps.get_model('inventory', 'Section')
+    Space = apps.get_model('inventory', 'Space')
+
+    entries = []
+    if Section.objects.exists():
+        content_type, _ = ContentType.objects.get_or_create(app_label='inventory', model='section')
+        for section in Section.objects.iterator():
+            url = reverse('inventory:section_detail', kwargs={'section_code': section.section_code})
+            entries.append(SearchEntry(
+                content_type=content_type, object_id=section.pk, name=section.name,
+                description=section.description, url=url, updated_at=section.updated_at,
+            ))
+    if Space.objects.exists():
+        content_type, _ = ContentType.objects.get_or_create(app_label='inventory', model='space')
+        for space in Space.objects.select_related('section').iterator():
+            url = reverse('inventory:space_detail', kwargs={
+                'section_code': space.section.section_code, 'space_code': space.space_code,
+            })
+            entries.append(SearchEntry(
+                content_type=content_type, object_id=space.pk, name=space.name,
+                description=space.description, url=url, updated_at=space.updated_at,
+            ))
+    SearchEntry.objects.bulk_create(
+        entries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['content_type', 'object_id'],
+        update_fields=['name', 'description', 'url', 'updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('inventory', '0025_labelrenderjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_sections_and_spaces, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0026_index_sections_and_spaces'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labelrenderjob',
+            name='progressed_at',
+            field=models.DateTimeField(blank=True, help_text='When the job started or last rendered a chunk.', null=True),
+        ),
+    ]
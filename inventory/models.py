@@ -1,14 +1,14 @@
 # sherlock-python/inventory/models.py
 
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Sum
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from datetime import timedelta
 
 import barcode
@@ -16,6 +16,39 @@ from barcode.writer import SVGWriter
 import qrcode
 import qrcode.image.svg
 
+from .label_cache import label_cache, cache_key
+from . import indexing
+from .trigrams import trigrams
+from .presence import presence
+from . import user_sessions
+
+QR_CODE_OPTIONS = {'image_factory': 'SvgPathImage'}
+BARCODE_OPTIONS = {'symbology': 'ean13', 'writer': 'SVGWriter'}
+
+def render_qr_code_svg(payload):
+    """Renders (or fetches from the label cache) the QR code SVG for a payload."""
+    def render():
+        img = qrcode.make(payload, image_factory=qrcode.image.svg.SvgPathImage)
+        return img.to_string(encoding='unicode')
+    return label_cache.get_or_render('qr', payload, render, QR_CODE_OPTIONS)
+
+def render_barcode_svg(code):
+    """Renders (or fetches from the label cache) the EAN-13 barcode SVG for a code."""
+    def render():
+        EAN = barcode.get_barcode_class('ean13')
+        ean_barcode = EAN(code, writer=SVGWriter())
+        return ean_barcode.render().decode('utf-8')
+    return label_cache.get_or_render('ean13', code, render, BARCODE_OPTIONS)
+
+def ean13(base_code):
+    """Returns the 12-digit `base_code` with its EAN-13 check digit appended."""
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(base_code))
+    return f"{base_code}{(10 - total % 10) % 10}"
+
+def item_barcode(section_code, space_code, item_code):
+    """Returns the EAN-13 barcode of an item from its original section and space codes."""
+    return ean13(f"{section_code:04d}{space_code:04d}{item_code:04d}")
+
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
@@ -23,7 +56,43 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True 
 
-class Section(TimeStampedModel):
+class SearchIndexedModel(TimeStampedModel):
+    """
+    Base for models that appear in the unified search. Tracks the fields that
+    feed the search entry and only reindexes when one of them changes.
+    """
+    indexed_fields = ('name', 'description')
+    hierarchy_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_state = instance._get_indexed_state()
+        return instance
+
+    def _get_indexed_state(self):
+        tracked = self.indexed_fields + self.hierarchy_fields
+        if self.get_deferred_fields() & set(tracked):
+            return None
+        return {field: getattr(self, field) for field in tracked}
+
+    def save(self, *args, **kwargs):
+        previous = getattr(self, '_indexed_state', None)
+        super().save(*args, **kwargs)
+        current = self._get_indexed_state()
+        if previous is None or previous != current:
+            moved = previous is not None and any(
+                previous[field] != current[field] for field in self.hierarchy_fields
+            )
+            indexing.schedule(self, include_descendants=moved)
+        else:
+            indexing.touch(type(self), [self.pk])
+        self._indexed_state = current
+
+class Section(SearchIndexedModel):
     section_code = models.PositiveIntegerField(
         unique=True,
         validators=[
@@ -36,6 +105,9 @@ class Section(TimeStampedModel):
     description = models.CharField(max_length=100)
     
     search_entry = GenericRelation('SearchEntry', object_id_field='object_id', content_type_field='content_type')
+    print_queue_items = GenericRelation('PrintQueueItem')
+
+    hierarchy_fields = ('section_code',)
 
     def __str__(self):
         return f"{self.name} (Section: {self.section_code})"
@@ -43,20 +115,25 @@ class Section(TimeStampedModel):
     def get_absolute_url(self):
         return reverse('inventory:section_detail', kwargs={'section_code': self.section_code})
 
-    def generate_qr_code_svg(self):
-        """Generates the QR code SVG content, replicating the Rails logic."""
+    def qr_code_payload(self):
+        """Returns the data encoded in this section's QR code, replicating the Rails logic."""
         padded_name = (self.name + '*' * 50)[:50]
         padded_desc = (self.description + '*' * 100)[:100]
         
-        qr_data = (
+        return (
             f"SHERLOCK;SECTIONCODE:{str(self.section_code).zfill(4)};;"
             f"RESTOREDATA;NAME:{padded_name};DESCRIPTION:{padded_desc};;"
         )
-        
-        img = qrcode.make(qr_data, image_factory=qrcode.image.svg.SvgPathImage)
-        return img.to_string(encoding='unicode')
 
-class Space(TimeStampedModel):
+    def generate_qr_code_svg(self):
+        """Generates the QR code SVG content, served from the label cache when possible."""
+        return render_qr_code_svg(self.qr_code_payload())
+
+    def qr_code_key(self):
+        """Content hash of the QR code; changes whenever the encoded data does."""
+        return cache_key('qr', self.qr_code_payload(), QR_CODE_OPTIONS)
+
+class Space(SearchIndexedModel):
     section = models.ForeignKey(Section, on_delete=models.CASCADE, related_name='spaces')
     space_code = models.PositiveIntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(9999)],
@@ -68,6 +145,9 @@ class Space(TimeStampedModel):
     original_section_code = models.PositiveIntegerField(editable=False, null=True)
     
     search_entry = GenericRelation('SearchEntry')
+    print_queue_items = GenericRelation('PrintQueueItem')
+
+    hierarchy_fields = ('section_id', 'space_code')
 
     class Meta:
         unique_together = ('section', 'space_code')
@@ -83,22 +163,38 @@ class Space(TimeStampedModel):
     def get_absolute_url(self):
         return reverse('inventory:space_detail', kwargs={'section_code': self.section.section_code, 'space_code': self.space_code})
 
-    def generate_qr_code_svg(self):
-        """Generates the QR code SVG content using the permanent original code."""
+    def qr_code_payload(self):
+        """Returns the data encoded in this space's QR code, using the permanent original code."""
         padded_name = (self.name + '*' * 50)[:50]
         padded_desc = (self.description + '*' * 100)[:100]
-        
 
-        qr_data = (
+        return (
             f"SHERLOCK;SECTIONCODE:{str(self.original_section_code).zfill(4)};"
             f"SPACECODE:{str(self.space_code).zfill(4)};;"
             f"RESTOREDATA;NAME:{padded_name};DESCRIPTION:{padded_desc};;"
         )
-        
-        img = qrcode.make(qr_data, image_factory=qrcode.image.svg.SvgPathImage)
-        return img.to_string(encoding='unicode')
 
-class Item(TimeStampedModel):
+    def generate_qr_code_svg(self):
+        """Generates the QR code SVG content, served from the label cache when possible."""
+        return render_qr_code_svg(self.qr_code_payload())
+
+    def qr_code_key(self):
+        """Content hash of the QR code; changes whenever the encoded data does."""
+        return cache_key('qr', self.qr_code_payload(), QR_CODE_OPTIONS)
+
+class ItemQuerySet(models.QuerySet):
+    def with_availability(self):
+        """
+        Annotates each item with its lending figures in the same SQL pass,
+        so listings never fall back to per-row property lookups.
+        """
+        return self.annotate(
+            checked_out_qty=F('on_loan_quantity'),
+            in_stock_qty=F('quantity') - F('on_loan_quantity'),
+            available_qty=F('quantity') - F('on_loan_quantity') - F('buffer_quantity'),
+        )
+
+class Item(SearchIndexedModel):
     space = models.ForeignKey(Space, on_delete=models.CASCADE, related_name='items')
     item_code = models.PositiveIntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(9999)],
@@ -115,9 +211,19 @@ class Item(TimeStampedModel):
         help_text="Minimum quantity to keep in stock. This amount cannot be checked out."
     )
     barcode = models.CharField(max_length=13, blank=True, editable=False, unique=True, null=True)
+    on_loan_quantity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Units currently on loan. Maintained by checkout and check-in; rebuild with 'rebuild_on_loan_counts'."
+    )
     original_section_code = models.PositiveIntegerField(editable=False, null=True)
     original_space_code = models.PositiveIntegerField(editable=False, null=True)
     search_entry = GenericRelation('SearchEntry', object_id_field='object_id', content_type_field='content_type')
+    print_queue_items = GenericRelation('PrintQueueItem')
+
+    objects = ItemQuerySet.as_manager()
+
+    hierarchy_fields = ('space_id', 'item_code')
 
     class Meta:
         unique_together = ('space', 'item_code')
@@ -130,25 +236,16 @@ class Item(TimeStampedModel):
             self.original_section_code = self.space.section.section_code
             self.original_space_code = self.space.space_code
         
-        base_code = (
-            f"{self.original_section_code:04d}"
-            f"{self.original_space_code:04d}"
-            f"{self.item_code:04d}"
-        )
-        
-        EAN = barcode.get_barcode_class('ean13')
-        ean_barcode = EAN(base_code)
-        
-        self.barcode = ean_barcode.get_fullcode()
+        self.barcode = item_barcode(self.original_section_code, self.original_space_code, self.item_code)
+
+        # The on-loan counter is only ever moved with F() updates, so an
+        # ordinary save must never write back the stale copy held in memory.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'on_loan_quantity'
+            ]
         super().save(*args, **kwargs)
-
-        search_entry, created = SearchEntry.objects.get_or_create(
-            content_type=ContentType.objects.get_for_model(self),
-            object_id=self.id
-        )
-        search_entry.name = self.name
-        search_entry.url = self.get_absolute_url()
-        search_entry.save()
     
     def get_absolute_url(self):
         return reverse('inventory:item_detail', kwargs={
@@ -159,19 +256,24 @@ class Item(TimeStampedModel):
 
     def generate_barcode_svg(self):
         """Generates the EAN-13 barcode SVG content using the permanent barcode field."""
-        EAN = barcode.get_barcode_class('ean13')
-        ean_barcode = EAN(self.barcode, writer=SVGWriter())
-        return ean_barcode.render().decode('utf-8')
+        return render_barcode_svg(self.barcode)
+
+    def barcode_key(self):
+        """Content hash of the barcode; changes whenever the encoded data does."""
+        return cache_key('ean13', self.barcode, BARCODE_OPTIONS)
     
     @property
     def checked_out_quantity(self):
-        """Calculates the total quantity of this item currently on loan."""
-        checked_out = self.checkout_logs.filter(return_date__isnull=True).aggregate(total=Sum('quantity'))['total']
-        return checked_out or 0
+        """Returns the total quantity of this item currently on loan."""
+        if hasattr(self, 'checked_out_qty'):
+            return self.checked_out_qty
+        return self.on_loan_quantity
     
     @property
     def available_quantity(self):
         """Calculates the quantity available for checkout (total - checked out - buffer)."""
+        if hasattr(self, 'available_qty'):
+            return self.available_qty
         return self.quantity - self.checked_out_quantity - self.buffer_quantity
     
 class PrintQueue(models.Model):
@@ -181,19 +283,65 @@ class PrintQueue(models.Model):
         return f"Print Queue for {self.user.username}"
 
 class PrintQueueItem(models.Model):
+    """
+    A label waiting to be printed. Only a reference to the section, space or
+    item is stored; the SVG is rendered at print time (see labels.py).
+    """
+    class Kind(models.TextChoices):
+        SECTION = 'section', 'Section label'
+        SPACE = 'space', 'Space label'
+        ITEM_SMALL = 'item_small', 'Small item label'
+        ITEM_LARGE = 'item_large', 'Large item label'
+
     print_queue = models.ForeignKey(PrintQueue, on_delete=models.CASCADE, related_name='items')
     name = models.CharField(max_length=255)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
-    
-    print_content = models.TextField()
-    item_hash = models.CharField(max_length=64)
+
+    label_kind = models.CharField(max_length=10, choices=Kind.choices)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    label_object = GenericForeignKey('content_type', 'object_id')
+    payload_hash = models.CharField(max_length=64, help_text="Render cache key of the label when it was queued.")
+
+    class Meta:
+        unique_together = ('print_queue', 'content_type', 'object_id', 'label_kind')
 
     def __str__(self):
         return f"{self.quantity}x {self.name} in {self.print_queue}"
 
+class LabelRenderJob(models.Model):
+    """
+    Progress of pre-rendering the labels queued for a whole section or space.
+    Kept in the database so any server process can report on it.
+    """
+    class State(models.TextChoices):
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='label_render_jobs')
+    description = models.CharField(max_length=255)
+    queued = models.PositiveIntegerField(default=0, help_text="Labels added to the print queue.")
+    total = models.PositiveIntegerField(default=0, help_text="Labels that were not already in the label cache.")
+    rendered = models.PositiveIntegerField(default=0)
+    state = models.CharField(max_length=10, choices=State.choices, default=State.RUNNING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    progressed_at = models.DateTimeField(null=True, blank=True, help_text="When the job started or last rendered a chunk.")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.description} ({self.get_state_display()})"
+
+    @property
+    def percent(self):
+        return 100 if not self.total else self.rendered * 100 // self.total
+
 class SearchEntry(models.Model):
     name = models.CharField(max_length=255)
+    description = models.CharField(max_length=255, blank=True)
     url = models.CharField(max_length=500) 
+    updated_at = models.DateTimeField(null=True, blank=True, help_text="Copied from the indexed object so results never need to load it.")
 
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
@@ -212,17 +360,74 @@ class Student(TimeStampedModel):
     student_class = models.CharField(max_length=50, verbose_name="Class")
     section = models.CharField(max_length=50)
 
+    class Meta:
+        # Sort key of the keyset-paginated student list.
+        indexes = [models.Index(fields=['name', 'id'])]
+
     def __str__(self):
         return f"{self.name} ({self.admission_number})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._indexed_trigram_source = instance._trigram_source()
+        return instance
+
+    def _trigram_source(self):
+        if self.get_deferred_fields() & {'name', 'admission_number'}:
+            return None
+        return (self.name, self.admission_number)
     
-    def save(self, *args, **kwargs):
+    def normalize(self):
+        """Uppercases the text fields, as every save does; bulk imports call it directly."""
         self.name = self.name.upper()
         self.admission_number = self.admission_number.upper()
         self.student_class = self.student_class.upper()
         self.section = self.section.upper()
+
+    def save(self, *args, **kwargs):
+        self.normalize()
         
         super().save(*args, **kwargs)
 
+        source = self._trigram_source()
+        if source != getattr(self, '_indexed_trigram_source', None):
+            self.rebuild_trigrams()
+            self._indexed_trigram_source = source
+
+    def rebuild_trigrams(self):
+        """Replaces this student's rows in the trigram index."""
+        Student.rebuild_trigrams_for([self])
+
+    @staticmethod
+    def rebuild_trigrams_for(students):
+        """Replaces the trigram index rows of several saved students at once."""
+        StudentTrigram.objects.filter(student_id__in=[student.pk for student in students]).delete()
+        # A student has a few dozen trigrams, so a roster import writes
+        # hundreds of thousands of rows; executemany skips building a model
+        # instance for each one.
+        rows = [
+            (student.pk, gram)
+            for student in students
+            for gram in trigrams(student.name) | trigrams(student.admission_number)
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {StudentTrigram._meta.db_table} (student_id, trigram) VALUES (%s, %s)', rows
+            )
+
+class StudentTrigram(models.Model):
+    """One trigram of a student's name or admission number, for fuzzy lookup."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('student', 'trigram')
+        indexes = [models.Index(fields=['trigram', 'student'])]
+
+    def __str__(self):
+        return f"'{self.trigram}' for student #{self.student_id}"
+
 class UserProfile(models.Model):
     """Extends the default Django User model to include a role and activity tracking."""
     class Role(models.TextChoices):
@@ -242,9 +447,19 @@ class UserProfile(models.Model):
         Determines if the user is 'online' based on their last seen time.
         A user is considered online if they were active in the last 5 minutes.
         """
-        if not self.last_seen:
+        last_seen = self.latest_activity
+        if not last_seen:
             return False
-        return timezone.now() < self.last_seen + timedelta(minutes=5)
+        return timezone.now() < last_seen + timedelta(minutes=5)
+
+    @property
+    def latest_activity(self):
+        """
+        The later of the stored 'last_seen' and any activity this process
+        has recorded but not yet written.
+        """
+        candidates = [when for when in (self.last_seen, presence.last_seen(self.user_id)) if when]
+        return max(candidates) if candidates else None
 
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -252,6 +467,19 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 post_save.connect(create_user_profile, sender=settings.AUTH_USER_MODEL)
 
+class UserSession(models.Model):
+    """
+    Maps a user to one of their session keys, so their sessions can be found
+    and ended without decoding every row of django_session. Maintained by
+    the login/logout signal handlers in inventory.user_sessions.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sessions')
+    session_key = models.CharField(max_length=40, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Session of user #{self.user_id}"
+
 class CheckoutLog(models.Model):
     """A record of an item being checked out by a student."""
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="checkout_logs")
@@ -262,16 +490,37 @@ class CheckoutLog(models.Model):
     notes = models.TextField(blank=True, help_text="Reason or notes for this checkout.")
     
     quantity = models.PositiveIntegerField(default=1, help_text="The number of items checked out in this transaction.")
+    returned_quantity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Total units returned so far. Maintained by CheckInLog so reports never aggregate per row."
+    )
+
+    class Meta:
+        # Sort keys of the keyset-paginated loan reports and item loan history.
+        indexes = [
+            models.Index(fields=['due_date', 'id']),
+            models.Index(fields=['item', 'checkout_date', 'id']),
+        ]
 
     def __str__(self):
         status = "Returned" if self.return_date else "On Loan"
         return f"{self.item.name} to {self.student.name} ({status})"
+
+    def save(self, *args, **kwargs):
+        # Like Item.on_loan_quantity, the returned counter is only moved with
+        # F() updates, so an ordinary save must not write back a stale copy.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'returned_quantity'
+            ]
+        super().save(*args, **kwargs)
     
     @property
     def quantity_returned_so_far(self):
-        """Calculates the total quantity returned for this specific checkout log."""
-        returned = self.check_in_logs.aggregate(total=Sum('quantity_returned'))['total']
-        return returned or 0
+        """Returns the total quantity returned for this specific checkout log."""
+        return self.returned_quantity
     
     @property
     def quantity_still_on_loan(self):
@@ -300,9 +549,25 @@ class CheckInLog(models.Model):
         help_text="The condition of the item upon return."
     )
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            CheckoutLog.objects.filter(pk=self.checkout_log_id).update(
+                returned_quantity=F('returned_quantity') + self.quantity_returned
+            )
+
     def __str__(self):
         return f"{self.quantity_returned} units of {self.checkout_log.item.name} returned on {self.return_date.strftime('%Y-%m-%d')} (Condition: {self.get_condition_display()})"
 
+def release_returned_quantity(sender, instance, **kwargs):
+    """Takes a deleted check-in back off its checkout's returned counter."""
+    CheckoutLog.objects.filter(pk=instance.checkout_log_id).update(
+        returned_quantity=F('returned_quantity') - instance.quantity_returned
+    )
+
+post_delete.connect(release_returned_quantity, sender=CheckInLog)
+
 class ItemLog(models.Model):
     """A permanent record of a change in an item's stock quantity."""
     class Action(models.TextChoices):
@@ -321,6 +586,9 @@ class ItemLog(models.Model):
     notes = models.TextField(blank=True, help_text="Reason for the stock change.")
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['item', 'timestamp', 'id'])]
+
     def __str__(self):
         sign = '+' if self.quantity_change > 0 else ''
         return f"{sign}{self.quantity_change} of {self.item.name}: {self.get_action_display()} by {self.user.username if self.user else 'Unknown'}"
\ No newline at end of file
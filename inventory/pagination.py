@@ -0,0 +1,149 @@
+# sherlock-python/inventory/pagination.py
+"""
+Keyset (cursor) pagination for long tables.
+
+Instead of OFFSET, a page is fetched with a WHERE clause that continues
+from the sort key of the last row shown, e.g. (due_date, id) > (d, 42).
+With an index on the key the cost of a page is the same on page 1 and
+page 1,000, and rows inserted meanwhile never shift a page. The key must
+end in a unique column (normally id) and its columns must not be NULL.
+
+Cursors are opaque, URL-safe strings carried in the query string as
+`<prefix>after` or `<prefix>before`, so one view can paginate several
+tables independently. A malformed cursor simply yields the first page.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def _resolve_field(model, path):
+    parts = path.split('__')
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(parts[-1])
+
+
+def _value(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Returns the key values in `cursor`, converted by `fields`; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("Cursor does not match the sort key.")
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValidationError) as exc:
+        raise ValueError("Malformed cursor.") from exc
+
+
+def _beyond(keys, values, backwards=False):
+    """Builds the filter for rows strictly after (or before) `values` in key order."""
+    condition = Q()
+    for position, (name, descending) in enumerate(keys):
+        lookup = 'lt' if descending != backwards else 'gt'
+        equal = {keys[earlier][0]: values[earlier] for earlier in range(position)}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[position]})
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, keys, params, prefix, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._keys = keys
+        self._params = params
+        self._prefix = prefix
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _query(self, direction, row):
+        params = self._params.copy()
+        for name in ('after', 'before'):
+            params.pop(f'{self._prefix}{name}', None)
+        params.pop('partial', None)
+        if row is not None:
+            params[f'{self._prefix}{direction}'] = encode_cursor([_value(row, name) for name, _ in self._keys])
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Query string for the page after this one."""
+        return self._query('after', self.object_list[-1] if self.object_list else None)
+
+    @property
+    def previous_query(self):
+        """Query string for the page before this one."""
+        return self._query('before', self.object_list[0] if self.object_list else None)
+
+    @property
+    def first_query(self):
+        """Query string for the first page, keeping any filters."""
+        return self._query('after', None)
+
+
+def paginate(request, queryset, ordering, prefix='', page_size=DEFAULT_PAGE_SIZE):
+    """
+    Returns the KeysetPage of `queryset`, sorted by `ordering` (field names,
+    '-' for descending, ending in a unique field), selected by the cursor in
+    the request's query string.
+    """
+    return _page(request.GET, queryset, ordering, prefix, page_size)
+
+
+def _page(params, queryset, ordering, prefix, page_size):
+    keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    fields = [_resolve_field(queryset.model, name) for name, _ in keys]
+
+    after = params.get(f'{prefix}after')
+    before = params.get(f'{prefix}before')
+    values, backwards = None, False
+    try:
+        if before:
+            values, backwards = decode_cursor(before, fields), True
+        elif after:
+            values = decode_cursor(after, fields)
+    except ValueError:
+        values, backwards = None, False
+
+    if backwards:
+        reverse_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+        rows = list(queryset.filter(_beyond(keys, values, backwards=True)).order_by(*reverse_ordering)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+        if not has_previous and len(rows) < page_size:
+            # Stepped back past the start: show a full first page instead.
+            params = params.copy()
+            params.pop(f'{prefix}before')
+            return _page(params, queryset, ordering, prefix, page_size)
+    else:
+        if values is not None:
+            queryset = queryset.filter(_beyond(keys, values))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = values is not None
+
+    return KeysetPage(rows, keys, params, prefix, has_next, has_previous)
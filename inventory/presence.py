@@ -0,0 +1,102 @@
+# sherlock-python/inventory/presence.py
+"""
+Tracks when users were last active without writing on every request.
+
+Activity is recorded in memory and the latest timestamp per user is kept
+until a background thread writes all pending timestamps in one UPDATE,
+every PRESENCE_FLUSH_INTERVAL seconds and once more at shutdown. However
+many requests a user makes within that window, they cost at most one
+write. Code in this process reads the in-memory view through last_seen(),
+so it is always current; other processes see the database value, which
+lags by at most one window.
+"""
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Case, When, Value, DateTimeField
+from django.utils import timezone
+
+from .write_queue import write_queue, WriteQueueFull
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 30)
+
+    def touch(self, user_id, when=None):
+        """Records activity by `user_id`; nothing is written until the next flush."""
+        when = when or timezone.now()
+        with self._lock:
+            self._seen[user_id] = when
+            self._pending[user_id] = when
+            if self._thread is None:
+                self._start()
+
+    def last_seen(self, user_id):
+        """Returns the latest activity of `user_id` seen by this process, or None."""
+        with self._lock:
+            return self._seen.get(user_id)
+
+    def flush(self):
+        """Writes every pending timestamp in a single UPDATE and returns how many."""
+        from .models import UserProfile
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            write_queue.run(
+                UserProfile.objects.filter(user_id__in=pending.keys()).update,
+                last_seen=Case(
+                    *[When(user_id=user_id, then=Value(when)) for user_id, when in pending.items()],
+                    output_field=DateTimeField(),
+                ),
+            )
+        except (DatabaseError, WriteQueueFull):
+            # Presence is advisory; keep the timestamps for the next attempt
+            # rather than letting a locked database break anything.
+            logger.warning("Could not write last_seen for %d user(s); will retry.", len(pending), exc_info=True)
+            with self._lock:
+                for user_id, when in pending.items():
+                    self._pending.setdefault(user_id, when)
+            return 0
+        return len(pending)
+
+    def stop(self):
+        """Stops the background thread and writes whatever is still pending."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self.flush()
+        finally:
+            connections.close_all()
+
+
+presence = PresenceTracker()
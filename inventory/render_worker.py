@@ -0,0 +1,40 @@
+# sherlock-python/inventory/render_worker.py
+"""
+Code that runs inside the label rendering worker processes.
+
+Workers are started with the 'spawn' method, as run.py starts the Waitress
+workers, so this module must be importable before Django is set up: it
+imports nothing from the app at module level. Each worker sets Django up
+once and lowers its own scheduling priority, so rendering gives way to
+request handling, then renders chunks of labels into the disk tier of the
+label cache, which every process shares.
+"""
+
+import os
+
+
+def start(settings_module, niceness, label_cache_dir):
+    """
+    Process pool initializer. Points the worker at the web process's label
+    cache directory once, before anything reads it, as that may differ from
+    the settings module's.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    from django.conf import settings
+
+    settings.LABEL_CACHE_DIR = label_cache_dir
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+
+def render_labels(chunk):
+    """
+    Renders each (kind, object) pair in `chunk` into the label cache; returns
+    how many, and their size in bytes.
+    """
+    from .labels import render_label
+
+    size = sum(len(render_label(kind, obj).encode('utf-8')) for kind, obj in chunk)
+    return len(chunk), size
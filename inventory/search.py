@@ -0,0 +1,130 @@
+# sherlock-python/inventory/search.py
+"""
+Full-text search over SearchEntry.
+
+On SQLite builds with FTS5, entries are mirrored into an external-content
+FTS5 table (created by migration 0019 and kept in sync by triggers), so a
+keystroke search is an index lookup ranked by BM25 instead of a LIKE scan.
+Other databases, or SQLite builds without FTS5, fall back to icontains.
+
+Students are found through a trigram index instead, which tolerates typos
+in names and ranks by how much of the query matched.
+"""
+
+import re
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q, Count
+
+from .models import Section, Space, Item, SearchEntry, Student, StudentTrigram
+from .trigrams import trigrams
+
+FTS_TABLE = 'inventory_searchentry_fts'
+
+SEARCH_RESULT_LIMIT = 50
+
+STUDENT_RESULT_LIMIT = 20
+
+# Fraction of the query's trigrams a student must share to be returned.
+STUDENT_MIN_SIMILARITY = 0.3
+
+# Column weights for bm25(): a match in the name counts far more than one
+# in the description.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_fts_available = {}
+
+
+def fts_available():
+    """Returns True if the FTS5 mirror table exists on the current database."""
+    alias = connection.alias
+    if alias not in _fts_available:
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE],
+                )
+                available = cursor.fetchone() is not None
+        _fts_available[alias] = available
+    return _fts_available[alias]
+
+
+def build_match_expression(query):
+    """
+    Turns free text into an FTS5 MATCH expression in which every word is a
+    quoted prefix term, e.g. 'usb cab' -> '"usb"* "cab"*'. Returns None if
+    the query contains no searchable words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def live_entries():
+    """
+    Returns the SearchEntry queryset restricted, in SQL, to entries whose
+    Section, Space or Item still exists, so dangling rows never reach a
+    template and results never need to dereference searchable_object.
+    """
+    target_exists = Q()
+    for model in (Section, Space, Item):
+        target_exists |= Q(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id__in=model.objects.values('id'),
+        )
+    return SearchEntry.objects.filter(target_exists).select_related('content_type')
+
+
+def search_entries(query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Returns up to `limit` SearchEntry objects matching `query`, best match
+    first.
+    """
+    expression = build_match_expression(query)
+    if expression is None or not fts_available():
+        return list(live_entries().filter(name__icontains=query).order_by('name')[:limit])
+
+    # Dangling entries are dropped before the LIMIT, as in the fallback
+    # above, so they never cost a live match its place.
+    live_sql, live_params = live_entries().values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({live_sql}) "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s",
+            [expression, *live_params, NAME_WEIGHT, DESCRIPTION_WEIGHT, limit],
+        )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    entries = live_entries().in_bulk(ranked_ids)
+    return [entries[entry_id] for entry_id in ranked_ids if entry_id in entries]
+
+
+def find_students(query, limit=STUDENT_RESULT_LIMIT):
+    """
+    Returns up to `limit` students matching `query`, most similar first.
+    An exact admission number short-circuits to that single student.
+    """
+    exact = Student.objects.filter(admission_number=query.upper()).first()
+    if exact is not None:
+        return [exact]
+
+    query_grams = trigrams(query)
+    if not query_grams:
+        return []
+    min_hits = max(1, round(len(query_grams) * STUDENT_MIN_SIMILARITY))
+
+    ranked = (
+        StudentTrigram.objects.filter(trigram__in=query_grams)
+        .values('student_id')
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits')[:limit]
+    )
+    hits = {row['student_id']: row['hits'] for row in ranked}
+    students = Student.objects.filter(id__in=hits.keys())
+    return sorted(students, key=lambda student: (-hits[student.id], student.name))
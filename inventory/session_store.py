@@ -0,0 +1,17 @@
+# sherlock-python/inventory/session_store.py
+"""
+The database session engine, extended to keep the UserSession mapping in
+step when a session key is rotated without a new login (for example when a
+user changes their own password).
+"""
+
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+
+from .user_sessions import remap_session_key
+
+
+class SessionStore(DatabaseSessionStore):
+    def cycle_key(self):
+        old_key = self.session_key
+        super().cycle_key()
+        remap_session_key(old_key, self.session_key)
@@ -0,0 +1,149 @@
+# sherlock-python/inventory/sheets.py
+"""
+Imposition of queued labels onto printable sheets.
+
+Each distinct label is written into the print page once, as an SVG
+<symbol>. Every printed copy is then a short <use> element referencing it,
+placed in millimetres on a page-sized SVG, so a label printed 200 times
+costs 200 small tags rather than 200 copies of its markup.
+
+Labels are laid out in queue order in rows: left to right while they fit
+the printable width, then down, then onto a new page. A label larger than
+the printable area is scaled down to fit. Pages are produced one at a time
+by a generator, so the print view can stream them.
+"""
+
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+# Written by the print page template where the pages go; the view splits
+# the rendered template on it and streams the pages in between.
+PAGES_MARKER = '<!-- pages -->'
+
+# Sizes, margins and gaps in millimetres.
+PaperSize = namedtuple('PaperSize', ['label', 'width', 'height', 'margin', 'gap'])
+
+PAPER_SIZES = {
+    'a4': PaperSize('A4', 210, 297, 10, 3),
+    'letter': PaperSize('US Letter', 215.9, 279.4, 10, 3),
+    'label-4x6': PaperSize('4 × 6 in label stock', 101.6, 152.4, 2, 2),
+    'label-62': PaperSize('62 mm roll, cut at 100 mm', 62, 100, 1, 2),
+}
+
+Symbol = namedtuple('Symbol', ['id', 'markup', 'width', 'height'])
+Placement = namedtuple('Placement', ['symbol', 'x', 'y', 'width', 'height'])
+
+_MILLIMETRES_PER_UNIT = {'mm': 1, 'cm': 10, 'in': 25.4, 'pt': 25.4 / 72, 'px': 25.4 / 96, '': 25.4 / 96}
+_LENGTH = re.compile(r'^\s*([\d.]+)\s*([a-z]*)\s*$')
+_ROOT = re.compile(r'<svg\b([^>]*)>(.*)</svg>\s*$', re.S)
+_ATTRIBUTE = re.compile(r'([\w:-]+)="([^"]*)"')
+# Rounding leeway when a row or column of labels exactly fills the page.
+_TOLERANCE = 1e-6
+
+
+def paper_sizes():
+    """The built-in paper sizes, plus any added or overridden in LABEL_SHEET_PAPER_SIZES."""
+    sizes = dict(PAPER_SIZES)
+    for name, values in getattr(settings, 'LABEL_SHEET_PAPER_SIZES', {}).items():
+        sizes[name] = PaperSize(*values)
+    return sizes
+
+
+def paper_choices():
+    return [(name, size.label) for name, size in paper_sizes().items()]
+
+
+def default_paper():
+    return getattr(settings, 'LABEL_SHEET_DEFAULT_PAPER', 'a4')
+
+
+def _millimetres(length):
+    match = _LENGTH.match(length)
+    if match is None or match.group(2) not in _MILLIMETRES_PER_UNIT:
+        raise ValueError(f"Unsupported SVG length: {length!r}")
+    return float(match.group(1)) * _MILLIMETRES_PER_UNIT[match.group(2)]
+
+
+def to_symbol(svg, symbol_id):
+    """Turns a standalone label SVG into a <symbol>; raises ValueError if it has no sized root."""
+    match = _ROOT.search(svg)
+    if match is None:
+        raise ValueError("Not an SVG document.")
+    attributes = dict(_ATTRIBUTE.findall(match.group(1)))
+    width = _millimetres(attributes.get('width', ''))
+    height = _millimetres(attributes.get('height', ''))
+    view_box = attributes.get('viewBox', f'0 0 {width:g} {height:g}')
+    markup = f'<symbol id="{symbol_id}" viewBox="{view_box}">{match.group(2)}</symbol>'
+    return Symbol(symbol_id, markup, width, height)
+
+
+def impose(symbols, paper):
+    """
+    Lays out `symbols` (one per printed copy, in print order) on pages of
+    `paper`; yields each page as a list of Placements.
+    """
+    usable_width = paper.width - 2 * paper.margin
+    usable_height = paper.height - 2 * paper.margin
+    page, x, y, row_height = [], 0, 0, 0
+    for symbol in symbols:
+        scale = min(1, usable_width / symbol.width, usable_height / symbol.height)
+        width, height = symbol.width * scale, symbol.height * scale
+        if x and x + width > usable_width + _TOLERANCE:
+            x, y, row_height = 0, y + row_height + paper.gap, 0
+        if y and y + height > usable_height + _TOLERANCE:
+            yield page
+            page, x, y, row_height = [], 0, 0, 0
+        page.append(Placement(symbol, paper.margin + x, paper.margin + y, width, height))
+        x += width + paper.gap
+        row_height = max(row_height, height)
+    if page:
+        yield page
+
+
+def _number(value):
+    return f'{round(value, 3):g}'
+
+
+def render_page(placements, paper, number):
+    uses = ''.join(
+        f'<use href="#{placement.symbol.id}" x="{_number(placement.x)}" y="{_number(placement.y)}" '
+        f'width="{_number(placement.width)}" height="{_number(placement.height)}"/>'
+        for placement in placements
+    )
+    return (
+        f'<svg class="sheet-page" xmlns="http://www.w3.org/2000/svg" role="img" aria-label="Page {number}" '
+        f'width="{_number(paper.width)}mm" height="{_number(paper.height)}mm" '
+        f'viewBox="0 0 {_number(paper.width)} {_number(paper.height)}">{uses}</svg>\n'
+    )
+
+
+class Sheet:
+    """The labels of one print run, imposed on `paper`."""
+
+    def __init__(self, labels, paper):
+        """`labels` are (label SVG, copies) pairs in print order."""
+        self.paper = paper
+        self.symbols = []
+        self._copies = []
+        by_svg = {}
+        for svg, copies in labels:
+            if svg not in by_svg:
+                by_svg[svg] = to_symbol(svg, f'label-{len(by_svg) + 1}')
+                self.symbols.append(by_svg[svg])
+            self._copies.append((by_svg[svg], copies))
+
+    @property
+    def label_count(self):
+        return sum(copies for _, copies in self._copies)
+
+    def _each_copy(self):
+        for symbol, copies in self._copies:
+            for _ in range(copies):
+                yield symbol
+
+    def pages(self):
+        """Yields the markup of each page in turn."""
+        for number, placements in enumerate(impose(self._each_copy(), self.paper), start=1):
+            yield render_page(placements, self.paper, number)
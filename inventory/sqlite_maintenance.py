@@ -0,0 +1,61 @@
+# sherlock-python/inventory/sqlite_maintenance.py
+"""
+Periodic upkeep for SQLite databases running in WAL mode.
+
+SQLite checkpoints the write-ahead log automatically, but only from the
+connection that happens to commit when it grows past its threshold, and
+it never truncates it. Every SQLITE_MAINTENANCE_INTERVAL seconds, after a
+request has finished, this runs a passive checkpoint and PRAGMA optimize
+(which refreshes query planner statistics only where they are stale) on
+each SQLite connection of the finishing thread.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_last_run = time.monotonic()
+
+
+def run_maintenance(using='default', checkpoint_mode='PASSIVE'):
+    """
+    Checkpoints the WAL of database `using` and runs PRAGMA optimize.
+    Returns the (busy, log frames, checkpointed frames) row of the
+    checkpoint, or None if the database is not SQLite or the connection is
+    inside a transaction (where neither could do its job).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({checkpoint_mode})')
+        result = cursor.fetchone()
+        cursor.execute('PRAGMA optimize')
+    return result
+
+
+def _maybe_run(sender, **kwargs):
+    global _last_run
+    interval = getattr(settings, 'SQLITE_MAINTENANCE_INTERVAL', 600)
+    if not interval:
+        return
+    with _lock:
+        if time.monotonic() - _last_run < interval:
+            return
+        _last_run = time.monotonic()
+
+    for alias in connections:
+        try:
+            run_maintenance(alias)
+        except DatabaseError:
+            logger.warning("SQLite maintenance failed on database %r.", alias, exc_info=True)
+
+
+request_finished.connect(_maybe_run, dispatch_uid='sqlite_maintenance')
@@ -0,0 +1,166 @@
+# sherlock-python/inventory/student_import.py
+"""
+Bulk import of the student roster from a CSV file.
+
+The file is read one row at a time. Each row is normalized the way
+Student.save does it and checked against the model's field rules, and
+valid rows are upserted on admission_number in batches of
+IMPORT_BATCH_SIZE with bulk_create(update_conflicts=True), so an existing
+student is updated rather than duplicated. Only new or renamed students
+have their trigram index rebuilt, in one pass per batch.
+
+Rows that fail validation are skipped and reported with their line
+number; they never stop the rest of the file from importing.
+"""
+
+import csv
+import io
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError
+from django.utils.text import capfirst
+
+from .models import Student
+from .write_queue import write_queue
+
+IMPORT_BATCH_SIZE = 500
+
+FIELDS = ('admission_number', 'name', 'student_class', 'section')
+
+# Accepted spellings of each column header, compared after lowercasing
+# and turning spaces and hyphens into underscores.
+HEADER_ALIASES = {
+    'admission_number': {'admission_number', 'admission_no', 'admission'},
+    'name': {'name', 'student_name'},
+    'student_class': {'student_class', 'class'},
+    'section': {'section'},
+}
+
+RowError = namedtuple('RowError', ['line', 'admission_number', 'message'])
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def open_upload(upload):
+    """Wraps an uploaded file so it can be read as text without loading it whole."""
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+
+
+def _column_positions(header):
+    positions = {}
+    for position, title in enumerate(header):
+        title = title.strip().lower().replace(' ', '_').replace('-', '_')
+        for field, aliases in HEADER_ALIASES.items():
+            if title in aliases:
+                positions.setdefault(field, position)
+    missing = [field for field in FIELDS if field not in positions]
+    if missing:
+        raise ValueError(f"The file is missing the column(s): {', '.join(missing)}.")
+    return positions
+
+
+def _validation_errors(student):
+    errors = []
+    for name in FIELDS:
+        field = Student._meta.get_field(name)
+        try:
+            field.clean(getattr(student, name), student)
+        except ValidationError as exc:
+            errors.extend(f"{capfirst(field.verbose_name)}: {message}" for message in exc.messages)
+    return errors
+
+
+def _upsert_batch(students):
+    """Inserts or updates one batch; returns the number of students that already existed."""
+    numbers = [student.admission_number for student in students]
+    existing_names = dict(
+        Student.objects.filter(admission_number__in=numbers).values_list('admission_number', 'name')
+    )
+    Student.objects.bulk_create(
+        students,
+        update_conflicts=True,
+        unique_fields=['admission_number'],
+        update_fields=['name', 'student_class', 'section', 'updated_at'],
+    )
+
+    reindex = [student for student in students if existing_names.get(student.admission_number) != student.name]
+    if reindex:
+        ids = dict(
+            Student.objects.filter(admission_number__in=[student.admission_number for student in reindex])
+            .values_list('admission_number', 'id')
+        )
+        for student in reindex:
+            student.pk = ids[student.admission_number]
+        Student.rebuild_trigrams_for(reindex)
+    return len(existing_names)
+
+
+def _save_batch(batch, report):
+    students = [student for _, student in batch]
+    try:
+        existed = write_queue.run(_upsert_batch, students)
+    except DatabaseError as exc:
+        report.errors.extend(
+            RowError(line, student.admission_number, f"Could not be saved: {exc}") for line, student in batch
+        )
+        return
+    report.created += len(students) - existed
+    report.updated += existed
+
+
+def import_students(lines, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports the roster in `lines` (an iterable of CSV text lines with a
+    header row) and returns an ImportReport. Raises ValueError if the
+    header lacks a required column.
+    """
+    report = ImportReport()
+    reader = csv.reader(lines)
+    try:
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("The file is empty.")
+        positions = _column_positions(header)
+
+        first_seen = {}
+        batch = []
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            line = reader.line_num
+            student = Student(**{
+                field: row[position].strip() if position < len(row) else ''
+                for field, position in positions.items()
+            })
+            student.normalize()
+
+            errors = _validation_errors(student)
+            if not errors and student.admission_number in first_seen:
+                errors = [f"Duplicate admission number; already on line {first_seen[student.admission_number]}."]
+            if errors:
+                report.errors.append(RowError(line, student.admission_number, ' '.join(errors)))
+                continue
+
+            first_seen[student.admission_number] = line
+            batch.append((line, student))
+            if len(batch) >= batch_size:
+                _save_batch(batch, report)
+                batch = []
+        if batch:
+            _save_batch(batch, report)
+    except UnicodeDecodeError:
+        # Rows before the bad bytes are already imported; say where it stopped.
+        report.errors.append(RowError(
+            reader.line_num + 1, '', "The file is not UTF-8 text from here on; save it as 'CSV UTF-8' and import the rest again.",
+        ))
+    return report
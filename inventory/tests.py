@@ -1,12 +1,55 @@
 # sherlock-python/inventory/tests.py
 
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction, DatabaseError
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.contrib.messages import get_messages
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.http import StreamingHttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+import csv
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import barcode
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+
+from .models import Section, Space, Item, Student, CheckoutLog, CheckInLog, ItemLog, SearchEntry, UserProfile, UserSession, PrintQueueItem, LabelRenderJob, ean13, item_barcode
+from .label_cache import label_cache
+from . import search, indexing, user_sessions, sqlite_maintenance, exports, labels, sheets, label_printer
+from .code_index import code_index, _Snapshot
+from .presence import PresenceTracker, presence
+from .write_queue import WriteCoordinator, WriteQueueFull
+from .bulk_labels import label_renderer
+from .student_import import import_students
+from .inventory_import import import_inventory
+from .middleware import WriteContentionMiddleware
+
+
+def setUpModule():
+    # Keep the presence tracker's background thread out of the test run;
+    # activity recorded by test requests is flushed explicitly instead.
+    presence.stop()
+
+
+def tearDownModule():
+    # Write the activity recorded by test requests while the test database
+    # still exists, rather than from the tracker's exit hook.
+    presence.flush()
 
-from .models import Section, Space, Item, Student, CheckoutLog, CheckInLog, ItemLog
 
 # ==============================================================================
 #  MODEL TESTS
@@ -35,10 +78,32 @@ class ModelTests(TestCase):
         self.assertEqual(self.item.checked_out_quantity, 0)
         self.assertEqual(self.item.available_quantity, 15) 
 
-        CheckoutLog.objects.create(item=self.item, student=self.student, quantity=8, due_date=timezone.now())
+        Item.objects.filter(id=self.item.id).update(on_loan_quantity=8)
+        self.item.refresh_from_db()
         self.assertEqual(self.item.checked_out_quantity, 8)
         self.assertEqual(self.item.available_quantity, 7)  
 
+    def test_with_availability_annotations(self):
+        """The annotated queryset exposes the same figures as the properties in one query."""
+        Item.objects.filter(id=self.item.id).update(on_loan_quantity=8)
+        with self.assertNumQueries(1):
+            item = Item.objects.with_availability().get(id=self.item.id)
+            self.assertEqual(item.checked_out_quantity, 8)
+            self.assertEqual(item.in_stock_qty, 12)
+            self.assertEqual(item.available_quantity, 7)
+
+    def test_item_save_does_not_overwrite_on_loan_counter(self):
+        """A regular save must not write back a stale on-loan counter."""
+        stale_item = Item.objects.get(id=self.item.id)
+        Item.objects.filter(id=self.item.id).update(on_loan_quantity=3)
+
+        stale_item.name = 'Renamed Item'
+        stale_item.save()
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.name, 'Renamed Item')
+        self.assertEqual(self.item.on_loan_quantity, 3)
+
     def test_checkout_log_is_overdue(self):
         """Test the is_overdue property of the CheckoutLog model."""
         future_log = CheckoutLog.objects.create(item=self.item, student=self.student, quantity=1, due_date=timezone.now() + timedelta(days=1))
@@ -62,6 +127,24 @@ class ModelTests(TestCase):
         self.assertEqual(log.quantity_returned_so_far, 4)
         self.assertEqual(log.quantity_still_on_loan, 6)
 
+    def test_returned_counter_survives_saves_and_follows_deletes(self):
+        """A stale checkout save keeps the returned counter; deleting a check-in takes it back off."""
+        log = CheckoutLog.objects.create(item=self.item, student=self.student, quantity=10, due_date=timezone.now())
+        first = CheckInLog.objects.create(checkout_log=log, quantity_returned=4)
+        CheckInLog.objects.create(checkout_log=log, quantity_returned=3)
+
+        log.notes = 'Edited after the returns'
+        log.save()
+        log.refresh_from_db()
+        self.assertEqual(log.returned_quantity, 7)
+
+        first.delete()
+        log.refresh_from_db()
+        self.assertEqual(log.returned_quantity, 3)
+        CheckInLog.objects.filter(checkout_log=log).delete()
+        log.refresh_from_db()
+        self.assertEqual(log.returned_quantity, 0)
+
 # ==============================================================================
 #  VIEW & WORKFLOW TESTS
 # ==============================================================================
@@ -101,6 +184,106 @@ class ViewAndWorkflowTests(TestCase):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 200, f"Failed to load page: {url}")
 
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_item_listings_use_constant_queries(self):
+        """Item listings and HTMX partials must not issue per-row queries."""
+        Item.objects.create(name='Test Widget', space=self.space, item_code=2, quantity=10)
+        session = self.client.session
+        session['checkout_items'] = {str(item.id): 1 for item in Item.objects.all()}
+        session.save()
+        urls = [
+            reverse('inventory:live_item_search', args=[self.student.id]) + '?query=Test',
+            reverse('inventory:checkout_session', args=[self.student.id]),
+            reverse('inventory:get_items', args=[self.space.id]),
+            reverse('inventory:low_stock_report'),
+        ]
+        baseline = [self._count_queries(url) for url in urls]
+
+        for code in range(3, 8):
+            Item.objects.create(name=f'Test Widget {code}', space=self.space, item_code=code, quantity=2)
+        session = self.client.session
+        session['checkout_items'] = {str(item.id): 1 for item in Item.objects.all()}
+        session.save()
+
+        for url, expected in zip(urls, baseline):
+            self.assertEqual(self._count_queries(url), expected, f"Query count grew with row count: {url}")
+
+    def test_loan_reports_use_constant_queries(self):
+        """Loan reports must not aggregate check-ins or load items once per row."""
+        def lend(item_code, returned):
+            item = Item.objects.create(name=f'Loan Item {item_code}', space=self.space, item_code=item_code, quantity=10)
+            log = CheckoutLog.objects.create(item=item, student=self.student, quantity=3, due_date=timezone.now() + timedelta(days=1))
+            CheckInLog.objects.create(checkout_log=log, quantity_returned=returned)
+            overdue_log = CheckoutLog.objects.create(item=item, student=self.student, quantity=2, due_date=timezone.now() - timedelta(days=1))
+            CheckInLog.objects.create(checkout_log=overdue_log, quantity_returned=1)
+
+        lend(2, 1)
+        urls = [
+            reverse('inventory:on_loan_dashboard'),
+            reverse('inventory:overdue_report'),
+            reverse('inventory:dashboard'),
+            reverse('inventory:student_detail', args=[self.student.id]),
+        ]
+        baseline = [self._count_queries(url) for url in urls]
+
+        for code in range(3, 7):
+            lend(code, 2)
+
+        for url, expected in zip(urls, baseline):
+            self.assertEqual(self._count_queries(url), expected, f"Query count grew with row count: {url}")
+
+        response = self.client.get(reverse('inventory:on_loan_dashboard'))
+        self.assertEqual(response.context['page'].object_list[0].quantity_still_on_loan, 1)
+
+    def _complete_checkout(self, quantities):
+        session = self.client.session
+        session['checkout_items'] = {str(item_id): quantity for item_id, quantity in quantities.items()}
+        session.save()
+        return self.client.post(reverse('inventory:checkout_session', args=[self.student.id]), {
+            'complete_checkout': 'true',
+            'due_date_option': 'days',
+            'days_to_return': '7',
+        })
+
+    def test_checkout_completion_uses_constant_queries(self):
+        """Completing a checkout costs the same number of queries for any cart size."""
+        items = [Item.objects.create(name=f'Kit {code}', space=self.space, item_code=code, quantity=5) for code in range(2, 12)]
+
+        with CaptureQueriesContext(connection) as one_line:
+            self._complete_checkout({items[0].id: 1})
+        with CaptureQueriesContext(connection) as many_lines:
+            self._complete_checkout({item.id: 2 for item in items[1:]})
+
+        self.assertEqual(len(many_lines.captured_queries), len(one_line.captured_queries))
+        self.assertEqual(CheckoutLog.objects.count(), 10)
+        self.assertEqual(Item.objects.get(id=items[5].id).on_loan_quantity, 2)
+
+    def test_checkout_conflict_writes_nothing(self):
+        """If any line is oversubscribed, no line is loaned and the failure is reported."""
+        other = Item.objects.create(name='Scarce Kit', space=self.space, item_code=2, quantity=3, buffer_quantity=1)
+        response = self._complete_checkout({self.item.id: 2, other.id: 3})
+
+        self.assertRedirects(response, reverse('inventory:checkout_session', args=[self.student.id]))
+        self.assertEqual(CheckoutLog.objects.count(), 0)
+        self.assertEqual(Item.objects.get(id=self.item.id).on_loan_quantity, 0)
+        errors = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn("Not enough stock for 'Scarce Kit': requested 3, available to lend 2.", errors)
+
+    def test_checkout_conflict_without_shortfall_is_reported(self):
+        """A reservation that misses a line fails the checkout even if the recheck finds enough stock."""
+        with mock.patch.object(QuerySet, 'update', return_value=0):
+            response = self._complete_checkout({self.item.id: 2})
+
+        self.assertRedirects(response, reverse('inventory:checkout_session', args=[self.student.id]))
+        self.assertEqual(CheckoutLog.objects.count(), 0)
+        errors = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertEqual(errors, ["Stock changed while checking out. Please try again."])
+
     def test_pages_redirect_if_not_logged_in(self):
         """Test that a protected page redirects to the login screen for an anonymous user."""
         self.client.logout()
@@ -108,6 +291,13 @@ class ViewAndWorkflowTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn(reverse('login'), response.url)
 
+    def test_health_check_needs_no_login(self):
+        """The load balancer's health probe answers without a session."""
+        self.client.logout()
+        response = self.client.get(reverse('inventory:health_check'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'ok')
+
     def test_receive_stock_workflow(self):
         """Test the end-to-end process of receiving new stock for an item."""
         self.assertEqual(Item.objects.get(id=self.item.id).quantity, 10)
@@ -147,6 +337,7 @@ class ViewAndWorkflowTests(TestCase):
         self.assertEqual(log.item, self.item)
         self.assertEqual(log.quantity, 2)
         self.assertIsNone(log.return_date)
+        self.assertEqual(Item.objects.get(id=self.item.id).on_loan_quantity, 2)
 
         # 3. Process a partial return
         check_in_url = reverse('inventory:process_check_in', args=[log.id])
@@ -157,6 +348,7 @@ class ViewAndWorkflowTests(TestCase):
         log.refresh_from_db()
         self.assertEqual(log.quantity_still_on_loan, 1)
         self.assertIsNone(log.return_date) # Should still be on loan
+        self.assertEqual(Item.objects.get(id=self.item.id).on_loan_quantity, 1)
 
         # 4. Process the final return
         response = self.client.post(check_in_url, {'quantity_returned': '1'})
@@ -165,4 +357,1225 @@ class ViewAndWorkflowTests(TestCase):
         # Verify the loan is now closed
         log.refresh_from_db()
         self.assertEqual(log.quantity_still_on_loan, 0)
-        self.assertIsNotNone(log.return_date)
\ No newline at end of file
+        self.assertIsNotNone(log.return_date)
+        self.assertEqual(Item.objects.get(id=self.item.id).on_loan_quantity, 0)
+
+    def _open_loans(self, count):
+        items = [Item.objects.create(name=f'Kit {code}', space=self.space, item_code=code, quantity=5) for code in range(2, 2 + count)]
+        self._complete_checkout({item.id: 2 for item in items})
+        return list(CheckoutLog.objects.order_by('id'))
+
+    def test_bulk_return_matches_single_returns(self):
+        """A student's bulk return records the same rows as returning each loan by hand."""
+        loans = self._open_loans(2)
+        response = self.client.post(reverse('inventory:student_bulk_check_in', args=[self.student.id]), {
+            f'return_{loans[0].id}': '2', f'condition_{loans[0].id}': 'OK',
+            f'return_{loans[1].id}': '1', f'condition_{loans[1].id}': 'DAMAGED',
+        })
+        self.assertRedirects(response, reverse('inventory:student_detail', args=[self.student.id]))
+
+        loans[0].refresh_from_db()
+        loans[1].refresh_from_db()
+        self.assertIsNotNone(loans[0].return_date)
+        self.assertIsNone(loans[1].return_date)
+        self.assertEqual(loans[1].quantity_still_on_loan, 1)
+        self.assertEqual(CheckInLog.objects.count(), 2)
+
+        damaged = Item.objects.get(id=loans[1].item_id)
+        self.assertEqual((damaged.quantity, damaged.on_loan_quantity), (4, 1))
+        self.assertEqual(Item.objects.get(id=loans[0].item_id).on_loan_quantity, 0)
+        log = ItemLog.objects.get(action='DAMAGED')
+        self.assertEqual((log.item_id, log.quantity_change, log.user), (damaged.id, -1, self.user))
+        self.assertEqual(log.notes, "Reported damaged during return by student TEST STUDENT.")
+
+    def test_bulk_return_uses_constant_queries(self):
+        """Returning many loans costs the same number of queries as returning one."""
+        loans = self._open_loans(10)
+        url = reverse('inventory:student_bulk_check_in', args=[self.student.id])
+
+        with CaptureQueriesContext(connection) as one_line:
+            self.client.post(url, {f'return_{loans[0].id}': '2', f'condition_{loans[0].id}': 'DAMAGED'})
+        with CaptureQueriesContext(connection) as many_lines:
+            self.client.post(url, {f'return_{log.id}': '2' for log in loans[1:]} | {f'condition_{log.id}': 'DAMAGED' for log in loans[1:]})
+
+        self.assertEqual(len(many_lines.captured_queries), len(one_line.captured_queries))
+        self.assertFalse(CheckoutLog.objects.filter(return_date__isnull=True).exists())
+        self.assertFalse(Item.objects.filter(on_loan_quantity__gt=0).exists())
+
+    def test_bulk_return_rejects_over_returns(self):
+        """One invalid line stops the whole batch."""
+        loans = self._open_loans(2)
+        response = self.client.post(reverse('inventory:bulk_check_in'), {
+            f'return_{loans[0].id}': '1', f'return_{loans[1].id}': '3',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CheckInLog.objects.count(), 0)
+        self.assertEqual(Item.objects.get(id=loans[0].item_id).on_loan_quantity, 2)
+
+    def test_bulk_check_in_prefills_scanned_barcodes(self):
+        """Each scan of a barcode prefills one unit against that item's loans."""
+        loans = self._open_loans(1)
+        barcode = loans[0].item.barcode
+        response = self.client.get(reverse('inventory:bulk_check_in'), {'codes': f'{barcode}\n{barcode}\n0000000000000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['quantity'] for line in response.context['lines']], [2])
+        self.assertEqual(response.context['unknown_codes'], ['0000000000000'])
+
+# ==============================================================================
+#  MANAGEMENT COMMAND TESTS
+# ==============================================================================
+
+class ManagementCommandTests(TestCase):
+    """Tests for the maintenance commands that rebuild denormalized data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(name='Test Student', admission_number='T001', student_class='X', section='A')
+        cls.section = Section.objects.create(name='Test Section', section_code=1)
+        cls.space = Space.objects.create(name='Test Space', section=cls.section, space_code=1)
+        cls.item = Item.objects.create(name='Test Item', space=cls.space, item_code=1, quantity=20)
+
+    def test_rebuild_on_loan_counts(self):
+        """The counter is rebuilt from open checkouts minus partial returns."""
+        log = CheckoutLog.objects.create(item=self.item, student=self.student, quantity=5, due_date=timezone.now())
+        CheckInLog.objects.create(checkout_log=log, quantity_returned=2)
+        CheckoutLog.objects.create(item=self.item, student=self.student, quantity=4, due_date=timezone.now(), return_date=timezone.now())
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_on_loan_counts', '--check', stdout=StringIO())
+
+        call_command('rebuild_on_loan_counts', stdout=StringIO())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.on_loan_quantity, 3)
+        call_command('rebuild_on_loan_counts', '--check', stdout=StringIO())
+
+    def test_sqlite_pragma_profile_and_maintenance(self):
+        """New connections get the pragma profile; maintenance and the benchmark run."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertIsNone(sqlite_maintenance.run_maintenance())  # skipped inside the test transaction
+
+        out = StringIO()
+        call_command('benchmark_sqlite', seconds=0.2, readers=1, writers=1, rows=50, stdout=out)
+        self.assertIn('baseline', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+# ==============================================================================
+#  LABEL CACHE TESTS
+# ==============================================================================
+
+def use_temporary_label_cache(test, **overrides):
+    """
+    Points the label cache at an empty temporary directory, with any extra
+    settings `overrides`, for the rest of `test`.
+    """
+    cache_dir = tempfile.TemporaryDirectory()
+    test.addCleanup(cache_dir.cleanup)
+    settings_override = override_settings(LABEL_CACHE_DIR=cache_dir.name, **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    label_cache.clear()
+    test.addCleanup(label_cache.clear, disk=False)
+
+class LabelCacheTests(TestCase):
+    """Tests for the memory and disk tiers of the label rendering cache."""
+
+    def setUp(self):
+        use_temporary_label_cache(self, LABEL_CACHE_MAX_BYTES=64 * 1024)
+
+        self.section = Section.objects.create(name='Test Section', description='Shelves', section_code=1)
+        self.space = Space.objects.create(name='Test Space', section=self.section, space_code=1)
+        self.item = Item.objects.create(name='Test Item', space=self.space, item_code=1)
+
+    def test_symbols_are_rendered_once(self):
+        """Repeat renders are served from memory, then from disk after a restart."""
+        first = self.section.generate_qr_code_svg()
+        self.assertEqual(self.section.generate_qr_code_svg(), first)
+        self.assertEqual(label_cache.stats()['misses'], 1)
+        self.assertEqual(label_cache.stats()['memory_hits'], 1)
+
+        label_cache.clear(disk=False)
+        self.assertEqual(self.section.generate_qr_code_svg(), first)
+        self.assertEqual(label_cache.stats()['disk_hits'], 1)
+        self.assertEqual(label_cache.stats()['misses'], 0)
+
+    def test_payload_changes_produce_new_symbols(self):
+        """Editing the encoded data must not serve the old symbol."""
+        before = self.space.generate_qr_code_svg()
+        self.space.name = 'Renamed Space'
+        self.assertNotEqual(self.space.generate_qr_code_svg(), before)
+
+    def test_disk_tier_is_size_bounded(self):
+        """The disk tier evicts old files once it grows past its byte limit."""
+        for code in range(2, 30):
+            item = Item.objects.create(name=f'Item {code}', space=self.space, item_code=code)
+            item.generate_barcode_svg()
+        self.assertLessEqual(label_cache.stats()['disk_bytes'], 64 * 1024)
+
+    def test_symbol_endpoints_support_conditional_requests(self):
+        """Symbols are served as cacheable images with strong ETags."""
+        User.objects.create_user(username='labeluser', password='password123')
+        self.client.login(username='labeluser', password='password123')
+        url = reverse('inventory:item_barcode_svg', args=[1, 1, 1])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(response['ETag'], f'"{self.item.barcode_key()}"')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{self.item.barcode_key()}"')
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, {'v': self.item.barcode_key()})
+        self.assertIn('immutable', response['Cache-Control'])
+
+        for url in [reverse('inventory:section_qr_svg', args=[1]), reverse('inventory:space_qr_svg', args=[1, 1])]:
+            self.assertContains(self.client.get(url), '<svg')
+
+    def test_warm_label_cache_command(self):
+        call_command('warm_label_cache', '--clear', stdout=StringIO())
+        self.assertEqual(label_cache.stats()['misses'], 3)
+        self.item.generate_barcode_svg()
+        self.assertEqual(label_cache.stats()['memory_hits'], 1)
+
+# ==============================================================================
+#  PRINT QUEUE TESTS
+# ==============================================================================
+
+class PrintQueueTests(TestCase):
+    """Tests for queuing label references and rendering them at print time."""
+
+    def setUp(self):
+        use_temporary_label_cache(self)
+
+        User.objects.create_user(username='printuser', password='password123')
+        self.client.login(username='printuser', password='password123')
+        self.section = Section.objects.create(name='Lab', description='Shelves', section_code=7)
+        self.space = Space.objects.create(name='Cupboard', description='Left', section=self.section, space_code=3)
+        self.item = Item.objects.create(name='Beaker', description='Glass', space=self.space, item_code=12)
+
+    def test_queue_stores_references_not_svg(self):
+        """Queuing a label twice keeps one entry pointing at the object."""
+        url = reverse('inventory:item_add_small_to_queue', args=[7, 3, 12])
+        self.client.post(url)
+        self.client.post(url)
+        self.client.post(reverse('inventory:section_add_to_queue', args=[7]))
+
+        entry = PrintQueueItem.objects.get(label_kind=PrintQueueItem.Kind.ITEM_SMALL)
+        self.assertEqual(entry.quantity, 2)
+        self.assertEqual(entry.label_object, self.item)
+        self.assertEqual(entry.name, 'Small Item Label for Beaker')
+        self.assertEqual(entry.payload_hash, labels.label_key(PrintQueueItem.Kind.ITEM_SMALL, self.item))
+        self.assertEqual(PrintQueueItem.objects.count(), 2)
+        self.assertEqual(label_cache.stats()['misses'], 0)
+
+        response = self.client.get(reverse('inventory:print_queue'))
+        self.assertNotContains(response, '<svg')
+        self.assertContains(response, f"{reverse('inventory:print_item_preview', args=[entry.id])}?v={entry.payload_hash}")
+
+    def test_labels_are_rendered_once_at_print_time(self):
+        self.client.post(reverse('inventory:space_add_to_queue', args=[7, 3]))
+        self.client.post(reverse('inventory:item_add_large_to_queue', args=[7, 3, 12]))
+        PrintQueueItem.objects.filter(label_kind=PrintQueueItem.Kind.SPACE).update(quantity=3)
+
+        content = b''.join(self.client.get(reverse('inventory:print_page')).streaming_content).decode()
+        self.assertEqual(content.count('<symbol id="label-'), 2)
+        self.assertEqual(content.count('<use href="#label-1"'), 3)
+        self.assertEqual(content.count('<use href="#label-2"'), 1)
+        rendered = label_cache.stats()['misses']
+
+        b''.join(self.client.get(reverse('inventory:print_page')).streaming_content)
+        self.assertEqual(label_cache.stats()['misses'], rendered)
+
+    def test_preview_is_a_cacheable_image(self):
+        self.client.post(reverse('inventory:section_add_to_queue', args=[7]))
+        entry = PrintQueueItem.objects.get()
+        response = self.client.get(reverse('inventory:print_item_preview', args=[entry.id]), {'v': entry.payload_hash})
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_label_key_follows_printed_data(self):
+        before = labels.label_key(PrintQueueItem.Kind.SPACE, self.space)
+        self.space.name = 'Drawer'
+        self.assertNotEqual(labels.label_key(PrintQueueItem.Kind.SPACE, self.space), before)
+
+    def test_deleting_an_object_drops_its_queued_labels(self):
+        self.client.post(reverse('inventory:item_add_small_to_queue', args=[7, 3, 12]))
+        self.client.post(reverse('inventory:space_add_to_queue', args=[7, 3]))
+        self.section.delete()
+        self.assertFalse(PrintQueueItem.objects.exists())
+
+class SheetLayoutTests(TestCase):
+    """Tests for imposing labels onto pages of symbols and references."""
+
+    def label(self, width, height):
+        return f'<?xml version="1.0"?><svg width="{width}" height="{height}" viewBox="0 0 10 10"><rect/></svg>'
+
+    def test_labels_fill_rows_then_pages(self):
+        paper = sheets.PaperSize('Test', 100, 100, 5, 0)
+        sheet = sheets.Sheet([(self.label('3cm', '45mm'), 7)], paper)
+        pages = list(sheet.pages())
+        # 3 across and 2 down fit in the 90 mm square printable area.
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(pages[0].count('<use'), 6)
+        self.assertIn('x="65" y="50" width="30" height="45"', pages[0])
+        self.assertEqual(pages[1].count('<use'), 1)
+
+    def test_oversized_labels_are_scaled_to_fit(self):
+        paper = sheets.PaperSize('Test', 62, 100, 1, 2)
+        placements = list(sheets.impose([sheets.to_symbol(self.label('8cm', '8cm'), 'a')], paper))[0]
+        self.assertAlmostEqual(placements[0].width, 60)
+        self.assertAlmostEqual(placements[0].height, 60)
+
+    def test_each_distinct_label_is_defined_once(self):
+        sheet = sheets.Sheet([(self.label('1cm', '1cm'), 2), (self.label('2cm', '1cm'), 1), (self.label('1cm', '1cm'), 3)], sheets.PAPER_SIZES['a4'])
+        self.assertEqual(len(sheet.symbols), 2)
+        self.assertEqual(sheet.label_count, 6)
+        self.assertEqual(sheet.symbols[0].markup, '<symbol id="label-1" viewBox="0 0 10 10"><rect/></symbol>')
+
+    def test_large_runs_stay_small(self):
+        """Thousands of copies of a label cost a short reference each, not a copy of the label."""
+        User.objects.create_user(username='sheetuser', password='password123')
+        self.client.login(username='sheetuser', password='password123')
+        section = Section.objects.create(name='Lab', description='Shelves', section_code=1)
+        space = Space.objects.create(name='Cupboard', description='Left', section=section, space_code=1)
+        Item.objects.create(name='Beaker', description='Glass', space=space, item_code=1)
+        self.client.post(reverse('inventory:item_add_small_to_queue', args=[1, 1, 1]))
+        PrintQueueItem.objects.update(quantity=2000)
+
+        response = self.client.get(reverse('inventory:print_page'), {'paper': 'letter'})
+        self.assertIsInstance(response, StreamingHttpResponse)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<use'), 2000)
+        self.assertEqual(content.count('<symbol'), 1)
+        self.assertIn('size: 215.9mm 279.4mm', content)
+        self.assertLess(len(content), 250 * 1024)
+
+class LabelPrinterTests(TestCase):
+    """Tests for the ZPL and ESC/POS output of the print queue."""
+
+    def setUp(self):
+        User.objects.create_user(username='zebrauser', password='password123')
+        self.client.login(username='zebrauser', password='password123')
+        self.section = Section.objects.create(name='Lab^One', description='Shelves', section_code=7)
+        self.space = Space.objects.create(name='Cupboard', description='Left', section=self.section, space_code=3)
+        self.item = Item.objects.create(name='Beaker', description='Glass', space=self.space, item_code=12)
+        self.client.post(reverse('inventory:section_add_to_queue', args=[7]))
+        self.client.post(reverse('inventory:item_add_large_to_queue', args=[7, 3, 12]))
+        PrintQueueItem.objects.filter(label_kind=PrintQueueItem.Kind.ITEM_LARGE).update(quantity=1000)
+
+    def test_zpl_uses_native_symbols_and_copy_counts(self):
+        response = self.client.get(reverse('inventory:print_labels_download'), {'format': 'zpl'})
+        self.assertIn('.zpl"', response['Content-Disposition'])
+        job = response.content.decode()
+        self.assertEqual(job.count('^XA'), 2)
+        self.assertIn('^BEN,', job)
+        self.assertIn(f'^FD{self.item.barcode[:12]}^FS^PQ1000^XZ', job)
+        self.assertIn('^FH^FDMA,SHERLOCK;SECTIONCODE:0007;;RESTOREDATA;NAME:Lab_5EOne', job)
+        # A thousand copies are one small job, not a thousand rendered images.
+        self.assertLess(len(job), 2048)
+
+    def test_escpos_repeats_each_copy(self):
+        PrintQueueItem.objects.filter(label_kind=PrintQueueItem.Kind.ITEM_LARGE).update(quantity=3)
+        response = self.client.get(reverse('inventory:print_labels_download'), {'format': 'escpos'})
+        self.assertEqual(response.content.count(b'\x1dVB\x00'), 4)
+        self.assertIn(b'\x1dkC\x0c' + self.item.barcode[:12].encode(), response.content)
+        self.assertEqual(self.client.get(reverse('inventory:print_labels_download'), {'format': 'pdf'}).status_code, 404)
+
+    def test_send_delivers_the_job_over_tcp(self):
+        with label_printer.StubPrinter() as printer:
+            host, port = printer.address
+            with override_settings(LABEL_PRINTER_HOST=host, LABEL_PRINTER_PORT=port):
+                response = self.client.post(reverse('inventory:print_labels_send'), follow=True)
+            self.assertTrue(printer.wait_for_jobs(1))
+        self.assertContains(response, 'sent to the label printer')
+        self.assertEqual(printer.jobs[0], self.client.get(reverse('inventory:print_labels_download')).content)
+
+    def test_unreachable_printer_is_reported(self):
+        printer = label_printer.StubPrinter().start()
+        address = printer.address
+        printer.stop()
+        with override_settings(LABEL_PRINTER_HOST=address[0], LABEL_PRINTER_PORT=address[1], LABEL_PRINTER_TIMEOUT=1):
+            response = self.client.post(reverse('inventory:print_labels_send'), follow=True)
+        self.assertContains(response, 'Could not send the labels')
+
+class QueueAllLabelsTests(TransactionTestCase):
+    """Tests for queuing a whole section or space with background pre-rendering (real threads)."""
+
+    def setUp(self):
+        use_temporary_label_cache(self, LABEL_RENDER_WORKERS=0)
+
+        self.user = User.objects.create_user(username='bulkuser', password='password123')
+        self.client.login(username='bulkuser', password='password123')
+        self.section = Section.objects.create(name='Lab', description='Shelves', section_code=1)
+        for space_code in (2, 1):
+            space = Space.objects.create(name=f'Space {space_code}', description='', section=self.section, space_code=space_code)
+            for item_code in (3, 1, 2):
+                Item.objects.create(name=f'Item {space_code}-{item_code}', description='', space=space, item_code=item_code)
+
+    def wait_for(self, job_id):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            job = LabelRenderJob.objects.get(id=job_id)
+            if job.state != LabelRenderJob.State.RUNNING:
+                return job
+            time.sleep(0.05)
+        self.fail("The label job did not finish.")
+
+    def test_section_labels_are_queued_and_prerendered(self):
+        response = self.client.post(reverse('inventory:section_queue_all_labels', args=[1]), {'item_label': 'large'})
+        job = LabelRenderJob.objects.get()
+        self.assertRedirects(response, reverse('inventory:label_render_job', args=[job.id]), fetch_redirect_response=False)
+        job = self.wait_for(job.id)
+        self.assertEqual(job.state, LabelRenderJob.State.DONE)
+        self.assertEqual((job.queued, job.total, job.rendered), (9, 9, 9))
+
+        entries = list(PrintQueueItem.objects.order_by('id'))
+        self.assertEqual([entry.name for entry in entries[:4]], [
+            'Section Label for Lab', 'Space Label for Space 1 of section Lab',
+            'Space Label for Space 2 of section Lab', 'Large Item Label for Item 1-1',
+        ])
+        self.assertTrue(all(labels.is_rendered(entry.label_kind, entry.label_object) for entry in entries))
+
+        # Queuing again bumps the quantities and has nothing left to render.
+        self.client.post(reverse('inventory:section_queue_all_labels', args=[1]), {'item_label': 'large'})
+        job = LabelRenderJob.objects.latest('id')
+        self.assertEqual((job.state, job.total), (LabelRenderJob.State.DONE, 0))
+        self.assertEqual(set(PrintQueueItem.objects.values_list('quantity', flat=True)), {2})
+
+    def test_stalled_job_is_reported_as_failed(self):
+        """A job whose process went away stops polling instead of running forever."""
+        job = LabelRenderJob.objects.create(user=self.user, description='All labels', total=10, rendered=4)
+        LabelRenderJob.objects.filter(id=job.id).update(progressed_at=timezone.now() - timedelta(minutes=10))
+        with override_settings(LABEL_RENDER_JOB_TIMEOUT=60):
+            response = self.client.get(reverse('inventory:label_render_job', args=[job.id]), {'partial': 'status'})
+        self.assertNotContains(response, 'hx-trigger')
+        self.assertContains(response, 'the server may have restarted')
+        self.assertEqual(LabelRenderJob.objects.get(id=job.id).state, LabelRenderJob.State.FAILED)
+
+    def test_job_larger_than_the_label_cache_is_reported(self):
+        with override_settings(LABEL_CACHE_MAX_BYTES=4096):
+            self.client.post(reverse('inventory:space_queue_all_labels', args=[1, 1]), {'item_label': 'small'})
+            job = self.wait_for(LabelRenderJob.objects.get().id)
+            self.assertEqual(job.state, LabelRenderJob.State.DONE)
+            self.assertIn('more than the label cache keeps', job.error)
+            self.assertLessEqual(label_cache.trim(), 4096)
+
+    def test_status_partial_polls_until_the_job_ends(self):
+        job = LabelRenderJob.objects.create(user=self.user, description='All labels', total=10, rendered=4)
+        url = reverse('inventory:label_render_job', args=[job.id])
+        response = self.client.get(url, {'partial': 'status'})
+        self.assertContains(response, 'hx-trigger="every 1s"')
+        self.assertContains(response, '4 of 10 (40%)')
+
+        LabelRenderJob.objects.filter(id=job.id).update(state=LabelRenderJob.State.DONE)
+        self.assertNotContains(self.client.get(url, {'partial': 'status'}), 'hx-trigger')
+        other = User.objects.create_user(username='other', password='password123')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(LABEL_RENDER_WORKERS=2)
+    def test_space_labels_render_in_worker_processes(self):
+        self.addCleanup(label_renderer._discard_pool)
+        self.client.post(reverse('inventory:space_queue_all_labels', args=[1, 2]))
+        job = self.wait_for(LabelRenderJob.objects.get().id)
+        self.assertEqual((job.state, job.rendered), (LabelRenderJob.State.DONE, 4))
+
+        # The workers wrote to the shared disk tier; this process renders nothing.
+        b''.join(self.client.get(reverse('inventory:print_page')).streaming_content)
+        self.assertEqual(label_cache.stats()['misses'], 0)
+        self.assertEqual(label_cache.stats()['disk_hits'], 4)
+
+# ==============================================================================
+#  SEARCH TESTS
+# ==============================================================================
+
+class SearchTests(TestCase):
+    """Tests for the full-text item search and its LIKE fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.section = Section.objects.create(name='Electronics', section_code=1)
+            cls.space = Space.objects.create(name='Drawer', section=cls.section, space_code=1)
+            cls.cable = Item.objects.create(name='USB Cable', description='Type-C charging lead', space=cls.space, item_code=1)
+            cls.hub = Item.objects.create(name='USB Hub', description='Four port', space=cls.space, item_code=2)
+            cls.charger = Item.objects.create(name='Wall Charger', description='Works with any USB cable', space=cls.space, item_code=3)
+
+    def test_fts_index_is_available(self):
+        self.assertTrue(search.fts_available())
+
+    def test_prefix_search_is_ranked_by_name(self):
+        """Word prefixes match, and a match in the name outranks one in the description."""
+        results = search.search_entries('usb cab')
+        self.assertEqual([entry.name for entry in results], ['USB Cable', 'Wall Charger'])
+
+    def test_index_follows_renames(self):
+        self.hub.name = 'Network Switch'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hub.save()
+        self.assertEqual([entry.name for entry in search.search_entries('netw')], ['Network Switch'])
+        self.assertNotIn('USB Hub', [entry.name for entry in search.search_entries('hub')])
+
+    def test_results_are_capped(self):
+        self.assertEqual(len(search.search_entries('usb', limit=1)), 1)
+
+    def test_dangling_entries_are_filtered_in_sql(self):
+        """Entries whose object is gone never reach the results."""
+        Item.objects.filter(id=self.hub.id).delete()
+        SearchEntry.objects.create(name='USB Ghost', content_type=ContentType.objects.get_for_model(Item), object_id=9999)
+        self.assertEqual([entry.name for entry in search.search_entries('usb')], ['USB Cable', 'Wall Charger'])
+
+    def test_dangling_entries_do_not_shorten_limited_results(self):
+        content_type = ContentType.objects.get_for_model(Item)
+        for object_id in (9997, 9998, 9999):
+            SearchEntry.objects.create(name='USB Ghost', content_type=content_type, object_id=object_id)
+        results = search.search_entries('usb', limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertNotIn('USB Ghost', [entry.name for entry in results])
+
+    def test_unified_search_uses_constant_queries(self):
+        """Rendering search hits must not dereference each hit's object."""
+        User.objects.create_user(username='searcher', password='password123')
+        self.client.login(username='searcher', password='password123')
+        url = reverse('inventory:live_unified_item_search')
+
+        with CaptureQueriesContext(connection) as few:
+            self.assertContains(self.client.get(url, {'item_query': 'usb'}), 'Cable')
+        with self.captureOnCommitCallbacks(execute=True):
+            for code in range(4, 54):
+                Item.objects.create(name=f'USB Stick {code}', space=self.space, item_code=code)
+        with CaptureQueriesContext(connection) as many:
+            self.assertContains(self.client.get(url, {'item_query': 'usb'}), 'Stick')
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_falls_back_to_icontains_without_fts(self):
+        with mock.patch.object(search, 'fts_available', return_value=False):
+            results = search.search_entries('SB Hu')
+        self.assertEqual([entry.name for entry in results], ['USB Hub'])
+
+    def test_sections_and_spaces_are_indexed(self):
+        self.assertEqual([entry.url for entry in search.search_entries('electronics')], [self.section.get_absolute_url()])
+        self.assertEqual([entry.url for entry in search.search_entries('drawer')], [self.space.get_absolute_url()])
+
+    def test_unchanged_saves_only_refresh_updated_at(self):
+        """A stock adjustment does not reindex, but the entry's date follows the item."""
+        item = Item.objects.get(id=self.cable.id)
+        item.quantity += 5
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                item.save()
+        writes = [query['sql'] for query in context.captured_queries if 'inventory_searchentry' in query['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+        entry = SearchEntry.objects.get(content_type=ContentType.objects.get_for_model(Item), object_id=item.id)
+        self.assertEqual(entry.updated_at, Item.objects.get(id=item.id).updated_at)
+
+    def test_rolled_back_saves_are_not_reindexed(self):
+        """Work queued in a rolled-back transaction is dropped, not flushed by the next commit."""
+        hub = Item.objects.get(id=self.hub.id)
+        hub.name = 'Abandoned Hub'
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                hub.save()
+                raise RuntimeError
+
+        cable = Item.objects.get(id=self.cable.id)
+        cable.name = 'USB-C Cable'
+        with mock.patch.object(indexing, 'upsert_entries', wraps=indexing.upsert_entries) as upsert:
+            with self.captureOnCommitCallbacks(execute=True):
+                cable.save()
+        self.assertEqual([instance.pk for instance in upsert.call_args.args[0]], [cable.pk])
+
+    def test_moving_a_space_reindexes_its_items(self):
+        new_section = Section.objects.create(name='Storage', section_code=2)
+        space = Space.objects.get(id=self.space.id)
+        space.section = new_section
+        with self.captureOnCommitCallbacks(execute=True):
+            space.save()
+        entry = SearchEntry.objects.get(content_type=ContentType.objects.get_for_model(Item), object_id=self.cable.id)
+        self.assertEqual(entry.url, reverse('inventory:item_detail', args=[2, 1, 1]))
+
+    def test_rebuild_search_index_command(self):
+        SearchEntry.objects.all().delete()
+        SearchEntry.objects.create(name='Ghost', content_type=ContentType.objects.get_for_model(Item), object_id=9999)
+        call_command('rebuild_search_index', '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(SearchEntry.objects.count(), 5)
+        self.assertEqual([entry.name for entry in search.search_entries('usb cab')], ['USB Cable', 'Wall Charger'])
+
+
+class StudentSearchTests(TestCase):
+    """Tests for the trigram-backed student lookup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = Student.objects.create(name='John Smith', admission_number='A1001', student_class='X', section='A')
+        cls.jane = Student.objects.create(name='Jane Doe', admission_number='A1002', student_class='IX', section='B')
+
+    def test_misspelled_name_finds_student(self):
+        self.assertEqual(search.find_students('jhon smth')[0], self.john)
+
+    def test_exact_admission_number_fast_path(self):
+        self.assertEqual(search.find_students('a1002'), [self.jane])
+
+    def test_renamed_student_is_reindexed(self):
+        student = Student.objects.get(id=self.jane.id)
+        student.name = 'Jane Marple'
+        student.save()
+        self.assertEqual(search.find_students('marple'), [student])
+        self.assertNotIn(student, search.find_students('doe'))
+
+    def test_checkout_find_student_redirects_on_single_match(self):
+        User.objects.create_user(username='terminal', password='password123')
+        self.client.login(username='terminal', password='password123')
+        response = self.client.post(reverse('inventory:checkout_find_student'), {'query': 'A1001'})
+        self.assertRedirects(response, reverse('inventory:checkout_session', args=[self.john.id]))
+
+    def test_checkout_find_student_lists_a_single_fuzzy_match(self):
+        """A lone fuzzy match is offered as a candidate, not selected; an exact name is."""
+        User.objects.create_user(username='terminal', password='password123')
+        self.client.login(username='terminal', password='password123')
+        response = self.client.post(reverse('inventory:checkout_find_student'), {'query': 'jhon smth'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['student_results']), [self.john])
+
+        response = self.client.post(reverse('inventory:checkout_find_student'), {'query': 'jane doe'})
+        self.assertRedirects(response, reverse('inventory:checkout_session', args=[self.jane.id]))
+
+class StudentImportTests(TestCase):
+    """Tests for the batched roster import."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.existing = Student.objects.create(name='Old Name', admission_number='R001', student_class='IX', section='A')
+
+    def test_import_upserts_normalizes_and_reports_bad_rows(self):
+        roster = [
+            'Admission Number,Name,Class,Section',
+            'r001,new name,x,b',
+            'r002,ada lovelace,x,a',
+            'r003,,x,a',
+            'r002,duplicate,x,a',
+            ',,,',
+            f'r004,{"x" * 101},x,a',
+        ]
+        report = import_students(roster, batch_size=1)
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual([error.line for error in report.errors], [4, 5, 7])
+        self.assertIn('Name: This field cannot be blank.', report.errors[0].message)
+        self.assertIn('already on line 3', report.errors[1].message)
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.student_class, self.existing.section), ('NEW NAME', 'X', 'B'))
+        self.assertEqual(Student.objects.get(admission_number='R002').name, 'ADA LOVELACE')
+        self.assertEqual(search.find_students('lovelace')[0].admission_number, 'R002')
+        self.assertEqual(search.find_students('new name')[0], self.existing)
+        self.assertNotIn(self.existing, search.find_students('old'))
+
+    def test_import_does_not_query_per_row(self):
+        def run(count, start):
+            rows = ['admission_number,name,class,section'] + [f'B{n:05d},Student {n},X,A' for n in range(start, start + count)]
+            with CaptureQueriesContext(connection) as context:
+                import_students(rows, batch_size=1000)
+            return len(context.captured_queries)
+
+        # SQLite caps the parameters per statement, so bulk inserts split
+        # into a few statements, but nothing is issued per row.
+        self.assertLess(run(900, 0), 90)
+        self.assertEqual(Student.objects.filter(admission_number__startswith='B').count(), 900)
+
+    def test_view_and_command(self):
+        User.objects.create_user(username='registrar', password='password123')
+        self.client.login(username='registrar', password='password123')
+        upload = SimpleUploadedFile('roster.csv', b'\xef\xbb\xbfadmission_number,name,class,section\r\nV001,Viewed,X,A\r\nV002,,X,A\r\n')
+        response = self.client.post(reverse('inventory:student_import'), {'roster': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Imported 1 students')
+        self.assertEqual(len(response.context['report'].errors), 1)
+        self.assertTrue(Student.objects.filter(admission_number='V001').exists())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as roster:
+            roster.write('admission_number,name\nC001,Commanded\n')
+        with self.assertRaisesMessage(CommandError, 'student_class, section'):
+            call_command('import_students', roster.name, stdout=StringIO())
+
+class InventoryImportTests(TestCase):
+    """Tests for the hierarchical section, space and item import."""
+
+    HEADER = 'section_code,section_name,section_description,space_code,space_name,space_description,item_code,item_name,item_description,quantity,buffer_quantity'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.section = Section.objects.create(name='Science', description='Labs', section_code=1)
+        cls.space = Space.objects.create(name='Shelf', description='Top', section=cls.section, space_code=1)
+        cls.beaker = Item.objects.create(name='Beaker', description='Glass', space=cls.space, item_code=1, quantity=4)
+
+    def _rows(self, *rows):
+        return [self.HEADER, *rows]
+
+    def test_dry_run_reports_without_writing(self):
+        rows = self._rows(
+            '1,,,1,,,1,Beaker,Glass,4,',
+            '1,,,1,,,2,Flask,Glass,3,',
+            '1,,,1,,,1,Beaker,Plastic,4,',
+            '2,Sport,Gear,5,Cage,Balls,1,Ball,Leather,10,2',
+        )
+        report = import_inventory(rows, dry_run=True)
+        self.assertEqual(len(report.sections), 1)
+        self.assertEqual(len(report.spaces), 1)
+        self.assertEqual([item.name for item in report.items], ['Flask', 'Ball'])
+        self.assertEqual(report.unchanged, 1)
+        self.assertEqual(report.errors[0].line, 4)  # the second Beaker row is a duplicate
+        self.assertEqual(Item.objects.count(), 1)
+        self.assertFalse(Section.objects.filter(section_code=2).exists())
+
+        report = import_inventory(self._rows('1,,,1,,,1,Beaker,Plastic,4,'), dry_run=True)
+        self.assertEqual(report.changed[0].differences, {'description': ('Glass', 'Plastic')})
+
+    def test_import_creates_hierarchy_barcodes_and_search_entries(self):
+        rows = self._rows(
+            '2,Sport,Gear,5,Cage,Balls,1,Ball,Leather,10,2',
+            '2,,,5,,,2,Bat,Willow,,',
+            '2,,,6,Rack,Bats,,,,,',
+            '1,,,2,Drawer,Bottom,7,Pipette,Plastic dropper,20,',
+        )
+        report = import_inventory(rows)
+        self.assertEqual(report.errors, [])
+
+        ball = Item.objects.get(name='Ball')
+        self.assertEqual((ball.space.section.section_code, ball.space.space_code), (2, 5))
+        self.assertEqual((ball.original_section_code, ball.original_space_code), (2, 5))
+        self.assertEqual((ball.quantity, ball.buffer_quantity, ball.on_loan_quantity), (10, 2, 0))
+        self.assertEqual(ball.barcode, barcode.get_barcode_class('ean13')('000200050001').get_fullcode())
+        self.assertEqual(Item.objects.get(name='Bat').quantity, 1)
+        self.assertTrue(Space.objects.filter(section__section_code=2, space_code=6, name='Rack').exists())
+        self.assertEqual(Space.objects.get(name='Cage').original_section_code, 2)
+
+        self.assertEqual([entry.name for entry in search.search_entries('pipette')], ['Pipette'])
+        self.assertEqual(search.search_entries('cage')[0].url, Space.objects.get(name='Cage').get_absolute_url())
+        self.assertEqual(code_index.resolve(ball.barcode).pk, ball.pk)
+
+        report = import_inventory(rows)
+        self.assertEqual((len(report.items), report.unchanged), (0, 3))
+
+    def test_rerun_indexes_items_left_unindexed(self):
+        """An import that stops while indexing is finished by running it again."""
+        rows = self._rows(*(f'1,,,1,,,{code},Tube {code},Glass,1,' for code in range(2, 7)))
+        upsert = indexing.upsert_entries
+        calls = []
+
+        def failing_upsert(objects, **kwargs):
+            calls.append(objects)
+            if len(calls) == 2:
+                raise DatabaseError('database is locked')
+            return upsert(objects, **kwargs)
+
+        with mock.patch('inventory.inventory_import.IMPORT_BATCH_SIZE', 2), \
+                mock.patch.object(indexing, 'upsert_entries', failing_upsert):
+            report = import_inventory(rows)
+        self.assertIn('Run it again to finish', report.errors[0].message)
+        self.assertEqual(Item.objects.filter(name__startswith='Tube').count(), 5)
+        self.assertEqual(len(search.search_entries('tube')), 2)
+
+        report = import_inventory(rows)
+        self.assertEqual((report.errors, report.unchanged), ([], 5))
+        self.assertEqual(len(search.search_entries('tube')), 5)
+
+    def test_invalid_rows_are_rejected(self):
+        report = import_inventory(self._rows(
+            'x,,,1,,,3,Tube,Glass,1,',
+            '3,,,1,,,1,Tube,Glass,1,',
+            '1,,,1,,,0,Tube,Glass,1,',
+            '1,,,1,,,4,,Glass,-1,',
+        ), dry_run=True)
+        self.assertEqual([error.line for error in report.errors], [2, 3, 4, 5])
+        self.assertIn('Section name: This field cannot be blank.', report.errors[1].message)
+        self.assertIn('Item name', report.errors[3].message)
+        self.assertIn('Quantity', report.errors[3].message)
+
+        with self.assertRaisesMessage(ValueError, 'space_code'):
+            import_inventory(['section_code,item_code', '1,1'])
+
+    def test_ean13_matches_python_barcode(self):
+        for base in ('000100010001', '999999999999', '123456789012', '000000000000'):
+            self.assertEqual(ean13(base), barcode.get_barcode_class('ean13')(base).get_fullcode())
+
+    def test_view_and_command(self):
+        User.objects.create_user(username='stocker', password='password123')
+        self.client.login(username='stocker', password='password123')
+        upload = SimpleUploadedFile('inventory.csv', '\r\n'.join(self._rows('1,,,1,,,9,Burner,Bunsen,2,')).encode())
+        response = self.client.post(reverse('inventory:inventory_import'), {'inventory': upload, 'dry_run': 'on'})
+        self.assertContains(response, 'Nothing was saved')
+        self.assertFalse(Item.objects.filter(name='Burner').exists())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as inventory:
+            inventory.write('\n'.join(self._rows('1,,,1,,,9,Burner,Bunsen,2,')))
+        out = StringIO()
+        call_command('import_inventory', inventory.name, '--dry-run', stdout=out)
+        self.assertIn('+ item 000100010009', out.getvalue())
+        call_command('import_inventory', inventory.name, stdout=StringIO())
+        self.assertTrue(Item.objects.filter(name='Burner').exists())
+
+# ==============================================================================
+#  CODE INDEX TESTS
+# ==============================================================================
+
+class CodeIndexTests(TestCase):
+    """Tests for resolving scanned codes from the in-memory code index."""
+
+    def setUp(self):
+        # Test rollbacks do not fire signals, so start every test from a fresh build.
+        code_index.invalidate()
+        self.section = Section.objects.create(name='Lab', section_code=12)
+        self.space = Space.objects.create(name='Cupboard', section=self.section, space_code=3)
+        self.item = Item.objects.create(name='Beaker', space=self.space, item_code=7)
+        self.space_qr = 'SHERLOCK;SECTIONCODE:0012;SPACECODE:0003;;RESTOREDATA;NAME:x;;'
+
+    def test_lookup_hit_needs_no_queries(self):
+        url = reverse('inventory:lookup')
+        self.client.get(url, {'code': self.item.barcode})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'code': self.item.barcode})
+        self.assertRedirects(response, self.item.get_absolute_url(), fetch_redirect_response=False)
+
+        response = self.client.get(url, {'code': self.space_qr})
+        self.assertRedirects(response, self.space.get_absolute_url(), fetch_redirect_response=False)
+
+    def test_stock_saves_keep_the_index_and_renames_invalidate_it(self):
+        code_index.resolve(self.item.barcode)
+        version = code_index.version
+        self.item.quantity += 3
+        self.item.save()
+        self.assertEqual(code_index.version, version)
+
+        self.section.section_code = 13
+        self.section.save()
+        self.assertEqual(code_index.resolve_section(13).url, reverse('inventory:section_detail', args=[13]))
+        self.assertIsNone(code_index.resolve_section(12))
+
+    def test_code_created_elsewhere_is_found_after_a_rebuild(self):
+        """A code missing from the build is checked in the database before it is reported as not found."""
+        code_index.resolve(self.item.barcode)
+        # bulk_create sends no post_save, like a save made by another process.
+        flask, = Item.objects.bulk_create([Item(name='Flask', space=self.space, item_code=8, barcode=item_barcode(12, 3, 8))])
+        self.assertEqual(code_index.resolve(flask.barcode).pk, flask.pk)
+        self.assertEqual(code_index.resolve_item(12, 3, 8).pk, flask.pk)
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(code_index.resolve_section(99))
+
+    def test_rows_created_during_a_build_are_skipped(self):
+        """A space whose section appeared after the sections were read does not break the build."""
+        real_values_list = QuerySet.values_list
+
+        def values_list(queryset, *fields, **kwargs):
+            if queryset.model is Space:
+                # Another process creates a section and a space between the queries.
+                section = Section.objects.create(name='Late', section_code=40)
+                Space.objects.create(name='Late Shelf', section=section, space_code=1)
+            return real_values_list(queryset, *fields, **kwargs)
+
+        with mock.patch.object(QuerySet, 'values_list', values_list):
+            snapshot = _Snapshot.build()
+        self.assertIn(self.item.pk, snapshot.items)
+        self.assertNotIn((40, 1), snapshot.by_space_code)
+
+    def test_moved_space_is_found_by_its_printed_code(self):
+        other = Section.objects.create(name='Store', section_code=20)
+        self.space.section = other
+        self.space.save()
+        self.assertEqual(code_index.resolve(self.space_qr).url, reverse('inventory:space_detail', args=[20, 3]))
+
+    def test_batch_lookup(self):
+        User.objects.create_user(username='scanner', password='password123')
+        self.client.login(username='scanner', password='password123')
+        response = self.client.post(
+            reverse('inventory:batch_lookup'),
+            data={'codes': [self.item.barcode, 'nonsense']},
+            content_type='application/json',
+        )
+        results = response.json()['results']
+        self.assertEqual(results[0]['kind'], 'item')
+        self.assertEqual(results[0]['url'], self.item.get_absolute_url())
+        self.assertFalse(results[1]['found'])
+
+
+# ==============================================================================
+#  PRESENCE TESTS
+# ==============================================================================
+
+class PresenceTests(TestCase):
+    """Tests for the write-behind last_seen tracker."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='watcher', password='password123')
+        self.other = User.objects.create_user(username='other', password='password123')
+        self.client.login(username='watcher', password='password123')
+        presence.flush()
+        # Test databases reuse user ids, so forget activity from earlier tests.
+        presence._seen.clear()
+
+    def test_requests_do_not_write_last_seen(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('inventory:dashboard'))
+        writes = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE "inventory_userprofile"')]
+        self.assertEqual(writes, [])
+        self.assertIsNotNone(presence.last_seen(self.user.id))
+        self.assertTrue(UserProfile.objects.get(user=self.user).is_online)
+
+    def test_flush_coalesces_activity_into_one_update(self):
+        tracker = PresenceTracker()
+        tracker._thread = threading.current_thread()  # keep the background thread out of the test
+        earlier = timezone.now() - timedelta(minutes=1)
+        tracker.touch(self.user.id, earlier)
+        tracker.touch(self.user.id)
+        tracker.touch(self.other.id, earlier)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(tracker.flush(), 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.other).last_seen, earlier)
+        self.assertGreater(UserProfile.objects.get(user=self.user).last_seen, earlier)
+        self.assertEqual(tracker.flush(), 0)
+
+    def test_stale_activity_is_offline(self):
+        UserProfile.objects.filter(user=self.other).update(last_seen=timezone.now() - timedelta(hours=1))
+        self.assertFalse(UserProfile.objects.get(user=self.other).is_online)
+
+
+
+# ==============================================================================
+#  SESSION TESTS
+# ==============================================================================
+
+class UserSessionTests(TestCase):
+    """Tests for the user-to-session index behind force logout and suspension."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='password123')
+        UserProfile.objects.filter(user=self.admin).update(role='ADMIN')
+        self.member = User.objects.create_user(username='member', password='password123')
+        self.member_client = Client()
+        self.member_client.login(username='member', password='password123')
+        self.client.login(username='admin', password='password123')
+
+    def _stale_sessions(self, count, expired=False):
+        expire_date = timezone.now() + (timedelta(days=-1) if expired else timedelta(days=1))
+        Session.objects.bulk_create(
+            Session(session_key=f'stale{n:035d}', session_data='', expire_date=expire_date) for n in range(count)
+        )
+
+    def test_login_and_logout_maintain_the_index(self):
+        key = self.member_client.session.session_key
+        self.assertEqual(UserSession.objects.get(session_key=key).user, self.member)
+        self.member_client.post(reverse('logout'))
+        self.assertFalse(UserSession.objects.filter(session_key=key).exists())
+
+    def test_force_logout_does_not_scan_other_sessions(self):
+        self._stale_sessions(200)
+        url = reverse('inventory:force_logout_user', args=[self.member.id])
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(url)
+        full_scans = [q['sql'] for q in context.captured_queries if 'FROM "django_session"' in q['sql'] and 'WHERE' not in q['sql']]
+        self.assertEqual(full_scans, [])
+        self.assertFalse(UserSession.objects.filter(user=self.member).exists())
+        self.assertEqual(Session.objects.count(), 201)  # the admin's own session and the stale ones remain
+        response = self.member_client.get(reverse('inventory:dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_suspension_ends_sessions(self):
+        self.client.post(reverse('inventory:toggle_user_active', args=[self.member.id]))
+        self.assertFalse(User.objects.get(id=self.member.id).is_active)
+        self.assertFalse(UserSession.objects.filter(user=self.member).exists())
+
+    def test_rotated_session_key_stays_mapped(self):
+        session = self.member_client.session
+        old_key = session.session_key
+        session.cycle_key()
+        self.assertFalse(UserSession.objects.filter(session_key=old_key).exists())
+        self.assertEqual(UserSession.objects.get(session_key=session.session_key).user, self.member)
+
+    def test_sweep_is_bounded(self):
+        self._stale_sessions(12, expired=True)
+        UserSession.objects.create(user=self.member, session_key='stale00000000000000000000000000000000000')
+        self.assertEqual(user_sessions.sweep_expired_sessions(batch_size=5, max_batches=2), 10)
+        out = StringIO()
+        call_command('sweep_sessions', batch_size=5, stdout=out)
+        self.assertIn("Deleted 2 expired sessions.", out.getvalue())
+        self.assertFalse(Session.objects.filter(expire_date__lt=timezone.now()).exists())
+        self.assertFalse(UserSession.objects.filter(session_key__startswith='stale').exists())
+
+
+# ==============================================================================
+#  WRITE QUEUE TESTS
+# ==============================================================================
+
+@override_settings(WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_MAX_PENDING=4, WRITE_QUEUE_TIMEOUT=5)
+class WriteQueueTests(TransactionTestCase):
+    """Tests for the opt-in single-writer queue (real threads, so no wrapping transaction)."""
+
+    def setUp(self):
+        self.coordinator = WriteCoordinator()
+        self.release = threading.Event()
+
+    def _block_writer(self):
+        """Occupies the writer until self.release is set; returns the caller thread."""
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            self.release.wait(5)
+
+        thread = threading.Thread(target=self.coordinator.run, args=(blocker,))
+        thread.start()
+        started.wait(5)
+        return thread
+
+    def _submit(self, function, results):
+        def call():
+            try:
+                results.append(self.coordinator.run(function))
+            except Exception as exc:
+                results.append(exc)
+            finally:
+                connection.close()
+        thread = threading.Thread(target=call)
+        thread.start()
+        return thread
+
+    def test_queued_writes_are_group_committed(self):
+        blocker = self._block_writer()
+        results = []
+        threads = [
+            self._submit(lambda code=code: Section.objects.create(name=f'Section {code}', section_code=code).section_code, results)
+            for code in range(1, 4)
+        ]
+        threads.append(self._submit(lambda: Section.objects.create(name='Duplicate', section_code=1), results))
+        while self.coordinator._queue.qsize() < 4:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in [blocker] + threads:
+            thread.join(5)
+
+        self.assertEqual(sorted(r for r in results if isinstance(r, int)), [1, 2, 3])
+        self.assertEqual(sum(isinstance(r, Exception) for r in results), 1)  # the duplicate fails alone
+        self.assertEqual(Section.objects.count(), 3)
+        metrics = self.coordinator.metrics_snapshot()
+        self.assertEqual(metrics['largest_batch'], 4)
+        self.assertEqual(metrics['failed_jobs'], 1)
+
+    def test_full_queue_pushes_back(self):
+        blocker = self._block_writer()
+        results = []
+        threads = [self._submit(lambda: None, results) for _ in range(4)]
+        while self.coordinator._queue.qsize() < 4:
+            time.sleep(0.01)
+        with self.settings(WRITE_QUEUE_TIMEOUT=0.2), self.assertRaises(WriteQueueFull):
+            self.coordinator.run(lambda: None)
+        self.release.set()
+        for thread in [blocker] + threads:
+            thread.join(5)
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(self.coordinator.metrics_snapshot()['rejected_jobs'], 1)
+
+    def test_stalled_writer_withdraws_waiting_jobs(self):
+        """A job the writer has not started in time fails as retryable and is never run."""
+        blocker = self._block_writer()
+        with self.settings(WRITE_QUEUE_TIMEOUT=0.2), self.assertRaises(WriteQueueFull):
+            self.coordinator.run(lambda: Section.objects.create(name='Late', section_code=1))
+        self.release.set()
+        blocker.join(5)
+        self.assertEqual(self.coordinator.run(Section.objects.count), 0)
+        self.assertEqual(self.coordinator.metrics_snapshot()['rejected_jobs'], 1)
+
+    def test_dead_writer_is_restarted(self):
+        failures = iter([RuntimeError('writer crashed')])
+
+        def close_old_connections():
+            for failure in failures:
+                raise failure
+
+        with mock.patch('inventory.write_queue.close_old_connections', close_old_connections):
+            with self.settings(WRITE_QUEUE_TIMEOUT=0.2), self.assertLogs('inventory.write_queue', 'ERROR'):
+                with self.assertRaises(WriteQueueFull):
+                    self.coordinator.run(lambda: None)
+            self.assertEqual(self.coordinator.run(lambda: 'written'), 'written')
+
+    def test_busy_writes_are_retryable_not_errors(self):
+        User.objects.create_user(username='busy', password='password123')
+        self.client.login(username='busy', password='password123')
+        with mock.patch('inventory.views.write_queue.run', side_effect=WriteQueueFull):
+            response = self.client.post(reverse('inventory:clear_print_queue'), HTTP_REFERER='http://testserver/print-queue/')
+        self.assertRedirects(response, 'http://testserver/print-queue/', fetch_redirect_response=False)
+        errors = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn(WriteContentionMiddleware.BUSY_MESSAGE, errors)
+
+# ==============================================================================
+#  PAGINATION TESTS
+# ==============================================================================
+
+class KeysetPaginationTests(TestCase):
+    """Tests for cursor pagination of the long tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pager', password='password123')
+        section = Section.objects.create(name='Paged Section', section_code=1)
+        space = Space.objects.create(name='Paged Space', section=section, space_code=1, original_section_code=1)
+        cls.item = Item.objects.create(name='Paged Item', space=space, item_code=1, quantity=500)
+        # Duplicate names exercise the id tie-breaker.
+        Student.objects.bulk_create([
+            Student(name=f'STUDENT {n // 2:03d}', admission_number=f'P{n:04d}', student_class='X', section='A')
+            for n in range(120)
+        ])
+        due = timezone.now() + timedelta(days=1)
+        students = list(Student.objects.all()[:60])
+        CheckoutLog.objects.bulk_create([
+            CheckoutLog(item=cls.item, student=student, quantity=1, due_date=due) for student in students
+        ])
+
+    def setUp(self):
+        self.client.login(username='pager', password='password123')
+
+    def _walk(self, url, key='page'):
+        """Follows Next links from `url`, returning the ids shown and the pages visited."""
+        seen, pages = [], []
+        query = ''
+        while True:
+            response = self.client.get(f'{url}?{query}')
+            page = response.context[key]
+            pages.append(page)
+            seen.extend(row.id for row in page)
+            if not page.has_next:
+                return seen, pages
+            query = page.next_query
+
+    def test_student_list_pages_cover_every_row_once(self):
+        seen, pages = self._walk(reverse('inventory:student_list'))
+        expected = list(Student.objects.order_by('name', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertFalse(pages[0].has_previous)
+
+        response = self.client.get(reverse('inventory:student_list') + '?' + pages[2].previous_query)
+        self.assertEqual([s.id for s in response.context['page']], expected[50:100])
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        url = reverse('inventory:on_loan_dashboard')
+        _, pages = self._walk(url)
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as later:
+            self.client.get(f'{url}?{pages[0].next_query}')
+        self.assertEqual(len(first), len(later))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in later.captured_queries))
+
+    def test_partial_returns_rows_and_loader(self):
+        response = self.client.get(reverse('inventory:student_list') + '?partial=rows')
+        self.assertTemplateUsed(response, 'inventory/partials/student_rows.html')
+        self.assertNotContains(response, '<table')
+        self.assertContains(response, 'hx-trigger="intersect once"')
+
+    def test_page_links_are_only_for_browsers_without_scripts(self):
+        """With HTMX the loader row appends pages, so the Next/Previous links would go stale."""
+        content = self.client.get(reverse('inventory:student_list')).content.decode()
+        self.assertIn('hx-trigger="intersect once"', content)
+        nav = content.index('<nav class="keyset-nav"')
+        self.assertLess(content.rindex('<noscript>', 0, nav), nav)
+        self.assertGreater(content.index('</noscript>', nav), nav)
+
+    def test_item_history_tables_paginate_independently(self):
+        url = reverse('inventory:item_detail', args=[1, 1, 1])
+        response = self.client.get(url)
+        loan_page = response.context['loan_page']
+        self.assertEqual(len(loan_page), 25)
+
+        response = self.client.get(f'{url}?{loan_page.next_query}&partial=loans')
+        self.assertTemplateUsed(response, 'inventory/partials/item_loan_history_rows.html')
+        self.assertEqual(len(response.context['loan_page']), 25)
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(reverse('inventory:student_list') + '?after=not-a-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertEqual(len(response.context['page']), 50)
+
+# ==============================================================================
+#  EXPORT TESTS
+# ==============================================================================
+
+class LedgerExportTests(TestCase):
+    """Tests for the streamed loan, return and stock ledger exports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='auditor', password='password123')
+        UserProfile.objects.filter(user=cls.admin).update(role='ADMIN')
+        cls.student = Student.objects.create(name='Ledger Student', admission_number='L001', student_class='X', section='A')
+        other = Student.objects.create(name='Other Student', admission_number='L002', student_class='X', section='A')
+        science = Section.objects.create(name='Science', section_code=1)
+        sport = Section.objects.create(name='Sport', section_code=2)
+        cls.flask = Item.objects.create(name='Flask', space=Space.objects.create(name='Shelf', section=science, space_code=1), item_code=1, quantity=10)
+        ball = Item.objects.create(name='Ball', space=Space.objects.create(name='Cage', section=sport, space_code=1), item_code=1, quantity=10)
+        due = timezone.now() + timedelta(days=7)
+        cls.loan = CheckoutLog.objects.create(item=cls.flask, student=cls.student, quantity=2, due_date=due)
+        CheckoutLog.objects.create(item=ball, student=other, quantity=1, due_date=due)
+        CheckInLog.objects.create(checkout_log=cls.loan, quantity_returned=1, condition='DAMAGED')
+        ItemLog.objects.create(item=cls.flask, user=cls.admin, action='DAMAGED', quantity_change=-1, notes='Cracked')
+
+    def setUp(self):
+        self.client.login(username='auditor', password='password123')
+
+    def _download(self, **params):
+        response = self.client.get(reverse('inventory:ledger_export_download'), params)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_applies_section_and_student_filters(self):
+        rows = list(csv.DictReader(self._download(ledger='loans', format='csv', section=1).splitlines()))
+        self.assertEqual([row['id'] for row in rows], [str(self.loan.id)])
+        self.assertEqual(rows[0]['admission_number'], 'L001')
+        self.assertEqual(rows[0]['section'], 'Science')
+        self.assertEqual(rows[0]['return_date'], '')
+
+        rows = list(csv.DictReader(self._download(ledger='loans', format='csv', student='l002').splitlines()))
+        self.assertEqual([row['item_name'] for row in rows], ['Ball'])
+
+    def test_jsonl_export_and_date_range(self):
+        today = timezone.localdate()
+        lines = self._download(ledger='returns', format='jsonl', start_date=today.isoformat(), end_date=today.isoformat()).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['condition'], 'DAMAGED')
+
+        self.assertEqual(self._download(ledger='returns', format='jsonl', end_date=(today - timedelta(days=1)).isoformat()), '')
+
+    def test_export_streams_in_chunks_with_one_query(self):
+        ItemLog.objects.create(item=self.flask, user=None, action='RECEIVED', quantity_change=5)
+        rows = exports.ledger_rows('stock')
+        with CaptureQueriesContext(connection) as context:
+            chunks = list(exports.stream_csv('stock', rows, chunk_size=1))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('Cracked', chunks[0])
+        self.assertIn('RECEIVED', chunks[1])
+
+    def test_invalid_filters_and_non_admins_are_refused(self):
+        response = self.client.get(reverse('inventory:ledger_export_download'), {'ledger': 'stock', 'format': 'csv', 'student': 'L001'})
+        self.assertEqual(response.status_code, 400)
+
+        User.objects.create_user(username='staff', password='password123')
+        self.client.login(username='staff', password='password123')
+        response = self.client.get(reverse('inventory:ledger_export_download'), {'ledger': 'loans', 'format': 'csv'})
+        self.assertRedirects(response, reverse('inventory:dashboard'))
+
+    def test_export_ledger_command(self):
+        out = StringIO()
+        call_command('export_ledger', 'stock', '--format', 'jsonl', '--section', '1', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['user'], 'auditor')
+
+        with self.assertRaises(CommandError):
+            call_command('export_ledger', 'stock', '--student', 'L001', stdout=StringIO())
@@ -0,0 +1,19 @@
+# sherlock-python/inventory/trigrams.py
+"""
+Trigram helpers for the typo-tolerant student search.
+
+Text is upper-cased and split into words; each word is padded with two
+leading spaces and one trailing space (as PostgreSQL's pg_trgm does), so
+short prefixes still produce trigrams and word starts weigh in.
+"""
+
+import re
+
+
+def trigrams(text):
+    """Returns the set of trigrams of `text`."""
+    grams = set()
+    for word in re.findall(r'\w+', text.upper()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
@@ -15,6 +15,7 @@ urlpatterns = [
     path('team-management/update-role/<int:user_id>/', views.update_user_role, name='update_user_role'),
     path('team-management/toggle-active/<int:user_id>/', views.toggle_user_active_status, name='toggle_user_active'),
     path('team-management/force-logout/<int:user_id>/', views.force_logout_user, name='force_logout_user'),
+    path('team-management/write-metrics/', views.write_metrics, name='write_metrics'),
 
     # ==========================================================================
     # Main Navigation & Dashboards
@@ -23,29 +24,35 @@ urlpatterns = [
     path('sitemap/', views.sitemap, name='sitemap'),
     path('search/', views.search_index, name='search'),
     path('lookup/', views.universal_lookup, name='lookup'),
+    path('lookup/batch/', views.batch_lookup, name='batch_lookup'),
+    path('healthz/', views.health_check, name='health_check'),
 
     # ==========================================================================
     # Inventory CRUD (Sections, Spaces, Items)
     # ==========================================================================
     path('browse/', views.inventory_browser, name='inventory_browser'),
+    path('browse/import/', views.inventory_import, name='inventory_import'),
 
     # Sections
     path('sections/new/', views.section_create, name='section_create'),
     path('sections/<int:section_code>/', views.section_detail, name='section_detail'),
     path('sections/<int:section_code>/edit/', views.section_update, name='section_update'),
     path('sections/<int:section_code>/delete/', views.section_delete, name='section_delete'),
+    path('sections/<int:section_code>/qr.svg', views.section_qr_svg, name='section_qr_svg'),
     
     # Spaces
     path('sections/<int:section_code>/spaces/new/', views.space_create, name='space_create'),
     path('sections/<int:section_code>/spaces/<int:space_code>/', views.space_detail, name='space_detail'),
     path('sections/<int:section_code>/spaces/<int:space_code>/edit/', views.space_update, name='space_update'),
     path('sections/<int:section_code>/spaces/<int:space_code>/delete/', views.space_delete, name='space_delete'),
+    path('sections/<int:section_code>/spaces/<int:space_code>/qr.svg', views.space_qr_svg, name='space_qr_svg'),
 
     # Items
     path('sections/<int:section_code>/spaces/<int:space_code>/items/new/', views.item_create, name='item_create'),
     path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/', views.item_detail, name='item_detail'),
     path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/edit/', views.item_update, name='item_update'),
     path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/delete/', views.item_delete, name='item_delete'),
+    path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/barcode.svg', views.item_barcode_svg, name='item_barcode_svg'),
 
     # ==========================================================================
     # Student & Lending Management
@@ -53,6 +60,7 @@ urlpatterns = [
     # Student CRUD
     path('students/', views.student_list, name='student_list'),
     path('students/new/', views.student_create, name='student_create'),
+    path('students/import/', views.student_import, name='student_import'),
     path('students/<int:student_id>/', views.student_detail, name='student_detail'),
     path('students/<int:student_id>/edit/', views.student_update, name='student_update'),
     path('students/<int:student_id>/delete/', views.student_delete, name='student_delete'),
@@ -67,8 +75,12 @@ urlpatterns = [
     path('on-loan/', views.on_loan_dashboard, name='on_loan_dashboard'),
     path('overdue-report/', views.overdue_items_report, name='overdue_report'),
     path('low-stock-report/', views.low_stock_report, name='low_stock_report'),
+    path('exports/', views.ledger_exports, name='ledger_exports'),
+    path('exports/download/', views.ledger_export_download, name='ledger_export_download'),
     path('check-in/<int:log_id>/', views.check_in_page, name='check_in_page'),
     path('check-in/<int:log_id>/process/', views.process_check_in, name='process_check_in'),
+    path('check-in/bulk/', views.bulk_check_in, name='bulk_check_in'),
+    path('students/<int:student_id>/return/', views.bulk_check_in, name='student_bulk_check_in'),
 
     # ==========================================================================
     # Printing & Stock Adjustments
@@ -77,11 +89,17 @@ urlpatterns = [
     path('print/clear/', views.clear_print_queue, name='clear_print_queue'),
     path('print-shop/', views.print_shop_index, name='print_shop_index'),
     path('print-page/', views.print_page, name='print_page'),
+    path('print-page/labels/', views.print_labels_download, name='print_labels_download'),
+    path('print-page/send/', views.print_labels_send, name='print_labels_send'),
+    path('print/jobs/<int:job_id>/', views.label_render_job, name='label_render_job'),
     path('print-queue-items/<int:item_id>/change-quantity/', views.change_print_item_quantity, name='print_item_change_quantity'),
     path('print-queue-items/<int:item_id>/delete/', views.delete_print_item, name='print_item_delete'),
+    path('print-queue-items/<int:item_id>/preview.svg', views.print_item_preview, name='print_item_preview'),
     
     path('sections/<int:section_code>/add-to-queue/', views.section_add_to_queue, name='section_add_to_queue'),
     path('sections/<int:section_code>/spaces/<int:space_code>/add-to-queue/', views.space_add_to_queue, name='space_add_to_queue'),
+    path('sections/<int:section_code>/queue-all-labels/', views.section_queue_all_labels, name='section_queue_all_labels'),
+    path('sections/<int:section_code>/spaces/<int:space_code>/queue-all-labels/', views.space_queue_all_labels, name='space_queue_all_labels'),
     path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/add-small-to-queue/', views.item_add_small_to_queue, name='item_add_small_to_queue'),
     path('sections/<int:section_code>/spaces/<int:space_code>/items/<int:item_code>/add-large-to-queue/', views.item_add_large_to_queue, name='item_add_large_to_queue'),
     
@@ -0,0 +1,116 @@
+# sherlock-python/inventory/user_sessions.py
+"""
+Finds and ends a user's sessions through the UserSession mapping table.
+
+Rows are added on login and removed on logout (see the signal handlers at
+the bottom), and the session engine in inventory.session_store carries a
+row over when a session key is rotated. Ending a user's sessions is then
+an indexed delete instead of a decode of every stored session.
+
+Expired sessions are swept in bounded batches, from the sweep_sessions
+command and at most once every SESSION_SWEEP_INTERVAL seconds when
+someone logs in.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+SWEEP_BATCH_SIZE = 500
+
+# Batches per sweep triggered by a login; keeps that request's cost bounded.
+LOGIN_SWEEP_MAX_BATCHES = 4
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def terminate_user_sessions(user):
+    """Deletes every session of `user` and returns how many were ended."""
+    from .models import UserSession
+
+    with transaction.atomic():
+        keys = list(UserSession.objects.filter(user=user).values_list('session_key', flat=True))
+        if not keys:
+            return 0
+        ended, _ = Session.objects.filter(session_key__in=keys).delete()
+        UserSession.objects.filter(session_key__in=keys).delete()
+    return ended
+
+
+def sweep_expired_sessions(batch_size=SWEEP_BATCH_SIZE, max_batches=None):
+    """
+    Deletes expired sessions and their mapping rows, `batch_size` at a time,
+    stopping after `max_batches` batches if given. Mapping rows whose
+    session has already gone are removed too. Returns the number of
+    sessions deleted.
+    """
+    from .models import UserSession
+
+    now = timezone.now()
+    deleted, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            break
+        with transaction.atomic():
+            UserSession.objects.filter(session_key__in=keys).delete()
+            Session.objects.filter(session_key__in=keys).delete()
+        deleted += len(keys)
+        batches += 1
+
+    while max_batches is None or batches < max_batches:
+        orphans = list(
+            UserSession.objects.exclude(session_key__in=Session.objects.values('session_key'))
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not orphans:
+            break
+        UserSession.objects.filter(id__in=orphans).delete()
+        batches += 1
+    return deleted
+
+
+def remap_session_key(old_key, new_key):
+    """Points the mapping row of a rotated session at its new key."""
+    from .models import UserSession
+
+    if old_key and new_key and old_key != new_key:
+        UserSession.objects.filter(session_key=old_key).update(session_key=new_key)
+
+
+def _maybe_sweep():
+    global _last_sweep
+    interval = getattr(settings, 'SESSION_SWEEP_INTERVAL', 3600)
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < interval:
+            return
+        _last_sweep = time.monotonic()
+    sweep_expired_sessions(max_batches=LOGIN_SWEEP_MAX_BATCHES)
+
+
+def _record_login(sender, request, user, **kwargs):
+    from .models import UserSession
+
+    if request is None or not hasattr(request, 'session'):
+        return
+    if request.session.session_key is None:
+        request.session.save()
+    UserSession.objects.update_or_create(session_key=request.session.session_key, defaults={'user': user})
+    _maybe_sweep()
+
+
+def _record_logout(sender, request, user, **kwargs):
+    from .models import UserSession
+
+    if request is not None and getattr(request, 'session', None) is not None and request.session.session_key:
+        UserSession.objects.filter(session_key=request.session.session_key).delete()
+
+
+user_logged_in.connect(_record_login, dispatch_uid='user_sessions_login')
+user_logged_out.connect(_record_logout, dispatch_uid='user_sessions_logout')
@@ -1,8 +1,8 @@
 # sherlock-python/inventory/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.template.loader import render_to_string
+from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.http import HttpResponse
 from datetime import datetime
@@ -10,20 +10,38 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Sum, Max, F, Count
+from django.db.models import Q, Sum, Max, F, Count, Case, When, Value, PositiveIntegerField
 from django.db.models.functions import TruncDay
 from django.contrib.auth.models import User
-from django.contrib.sessions.models import Session
-from django.http import HttpResponse, Http404
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.db import transaction, connection, DatabaseError
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-from .models import Section, Space, Item, PrintQueue, PrintQueueItem, SearchEntry, Student, CheckoutLog, CheckInLog, ItemLog, UserProfile
-from .forms import SectionForm, SpaceForm, ItemForm, StudentForm, StockAdjustmentForm, UserUpdateForm, UserRoleForm
+from .models import Section, Space, Item, PrintQueue, PrintQueueItem, LabelRenderJob, SearchEntry, Student, CheckoutLog, CheckInLog, ItemLog, UserProfile
+from .forms import SectionForm, SpaceForm, ItemForm, StudentForm, StockAdjustmentForm, UserUpdateForm, UserRoleForm, LedgerExportForm, StudentImportForm, InventoryImportForm, PrintSheetForm
 from .decorators import admin_required
-
-import hashlib
-import base64
+from .search import search_entries, find_students
+from .code_index import code_index
+from .user_sessions import terminate_user_sessions
+from .write_queue import write_queue
+from .pagination import paginate
+from . import exports
+from . import indexing
+from . import labels, sheets, label_printer, bulk_labels
+from .bulk_labels import label_renderer
+from .student_import import import_students, open_upload
+from .inventory_import import import_inventory
+
+import itertools
+import json
 from datetime import timedelta
 
+BATCH_LOOKUP_LIMIT = 500
+
+# Rows per page of the loan and stock history tables on the item page.
+HISTORY_PAGE_SIZE = 25
+
 def homepage(request):
     """
     Acts as a router for the root URL.
@@ -35,6 +53,18 @@ def homepage(request):
     
     return render(request, 'inventory/landing_page.html')
 
+def health_check(request):
+    """
+    Liveness probe for the reverse proxy's health checks: answers as long as
+    this worker can serve requests and reach the database.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return HttpResponse("database unavailable", status=503, content_type='text/plain')
+    return HttpResponse("ok", content_type='text/plain')
+
 def signup(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
@@ -50,6 +80,7 @@ def universal_lookup(request):
     """
     Receives a scanned code and redirects to the appropriate detail page.
     Handles multiple barcode formats and shows a user-friendly error if not found.
+    Codes are resolved from the in-memory code index, so a hit needs no query.
     """
     code = request.GET.get('code', '').strip()
     
@@ -57,37 +88,43 @@ def universal_lookup(request):
         messages.error(request, "No code was provided to look up.")
         return redirect('homepage')
 
-    try:
+    match = code_index.resolve(code)
+    if match is None:
+        messages.error(request, f"Could not find any item, section, or space matching the scanned code.")
+        return redirect('homepage')
 
-        if code.isdigit() and len(code) == 13:
-            item = Item.objects.get(barcode=code)
-            messages.success(request, f"Scan successful: Found item '{item.name}'.")
-            return redirect(item.get_absolute_url())
-            
-        if code.startswith('SHERLOCK;'):
-            parts = code.split(';')
-            section_code_str = next((p.split(':')[1] for p in parts if p.startswith('SECTIONCODE:')), None)
-            space_code_str = next((p.split(':')[1] for p in parts if p.startswith('SPACECODE:')), None)
-
-            if section_code_str:
-                section_code = int(section_code_str)
-                if space_code_str: 
-                    space_code = int(space_code_str)
-                    space = Space.objects.get(section__section_code=section_code, space_code=space_code)
-                    messages.success(request, f"Scan successful: Found space '{space.name}'.")
-                    return redirect(space.get_absolute_url())
-                else: 
-                    section = Section.objects.get(section_code=section_code)
-                    messages.success(request, f"Scan successful: Found section '{section.name}'.")
-                    return redirect(section.get_absolute_url())
-        
+    messages.success(request, f"Scan successful: Found {match.kind} '{match.name}'.")
+    return redirect(match.url)
 
-        raise Item.DoesNotExist
+@login_required
+def batch_lookup(request):
+    """
+    Resolves a list of scanned codes in one request and returns JSON.
+    Accepts a JSON body of the form {"codes": [...]} or repeated 'codes'
+    form fields.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a list of codes.'}, status=405)
 
-    except (Item.DoesNotExist, Section.DoesNotExist, Space.DoesNotExist, ValueError):
+    if request.content_type == 'application/json':
+        try:
+            codes = json.loads(request.body).get('codes', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+    else:
+        codes = request.POST.getlist('codes')
 
-        messages.error(request, f"Could not find any item, section, or space matching the scanned code.")
-        return redirect('homepage')
+    if not isinstance(codes, list) or len(codes) > BATCH_LOOKUP_LIMIT:
+        return JsonResponse({'error': f'Send a list of at most {BATCH_LOOKUP_LIMIT} codes.'}, status=400)
+
+    results = []
+    for code in codes:
+        match = code_index.resolve(str(code))
+        if match is None:
+            results.append({'code': code, 'found': False})
+        else:
+            results.append({'code': code, 'found': True, **match._asdict()})
+    return JsonResponse({'results': results})
 
 @login_required
 def sitemap(request):
@@ -110,8 +147,8 @@ def dashboard(request):
     low_stock_items_count = Item.objects.filter(quantity__lte=5).count()
     new_students_count = Student.objects.filter(created_at__gte=start_of_month).count()
 
-    recently_checked_out = CheckoutLog.objects.filter(checkout_date__gte=now.replace(hour=0, minute=0), return_date__isnull=True).select_related('item', 'student').order_by('-checkout_date')[:5]
-    items_due_soon = CheckoutLog.objects.filter(return_date__isnull=True, due_date__gte=now, due_date__lte=three_days_from_now).select_related('item', 'student').order_by('due_date')[:5]
+    recently_checked_out = CheckoutLog.objects.filter(checkout_date__gte=now.replace(hour=0, minute=0), return_date__isnull=True).select_related('item__space__section', 'student').order_by('-checkout_date')[:5]
+    items_due_soon = CheckoutLog.objects.filter(return_date__isnull=True, due_date__gte=now, due_date__lte=three_days_from_now).select_related('item__space__section', 'student').order_by('due_date')[:5]
 
     days = [(today - timedelta(days=i)) for i in range(6, -1, -1)]
     loan_activity_qs = CheckoutLog.objects.filter(checkout_date__date__gte=one_week_ago).annotate(day=TruncDay('checkout_date')).values('day').annotate(count=Count('id')).order_by('day')
@@ -155,6 +192,33 @@ def section_detail(request, section_code):
     context = {'section': section}
     return render(request, 'inventory/section_detail.html', context)
 
+@login_required
+def inventory_import(request):
+    """
+    Creates sections, spaces and items in bulk from an uploaded CSV. A dry
+    run lists what would be created or differs without saving anything.
+    """
+    report = None
+    if request.method == 'POST':
+        form = InventoryImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                report = import_inventory(open_upload(form.cleaned_data['inventory']), dry_run=form.cleaned_data['dry_run'])
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                summary = f"{len(report.sections)} sections, {len(report.spaces)} spaces and {len(report.items)} items"
+                if report.dry_run:
+                    messages.info(request, f"Dry run: the import would create {summary}. Nothing was saved.")
+                else:
+                    messages.success(request, f"Created {summary}.")
+                if report.errors:
+                    messages.warning(request, f"{len(report.errors)} rows were rejected; see the report below.")
+    else:
+        form = InventoryImportForm()
+    context = {'form': form, 'report': report}
+    return render(request, 'inventory/inventory_import.html', context)
+
 @login_required
 def section_create(request):
     if request.method == 'POST':
@@ -192,24 +256,48 @@ def section_delete(request, section_code):
         return redirect('inventory:inventory_browser')
     return redirect('inventory:section_detail', section_code=section.section_code)
 
+def _svg_symbol_response(request, key, render):
+    """
+    Serves a rendered symbol with a strong ETag derived from its content hash.
+    URLs carrying the matching '?v=' version are immutable; unversioned
+    requests must revalidate, which is answered with a 304 when unchanged.
+    """
+    etag = f'"{key}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = HttpResponse(render(), content_type='image/svg+xml')
+        response['ETag'] = etag
+    else:
+        response = not_modified
+
+    if request.GET.get('v') == key:
+        patch_cache_control(response, private=True, max_age=31536000, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def section_qr_svg(request, section_code):
+    section = get_object_or_404(Section, section_code=section_code)
+    return _svg_symbol_response(request, section.qr_code_key(), section.generate_qr_code_svg)
+
 @login_required
 def section_add_to_queue(request, section_code):
     if request.method == 'POST':
         section = get_object_or_404(Section, section_code=section_code)
-        print_queue, _ = PrintQueue.objects.get_or_create(user=request.user)
-        print_name = f"Section Label for {section.name}"
-        item_hash = hashlib.sha256(print_name.encode('utf-8')).hexdigest()
-        qr_svg = section.generate_qr_code_svg()
-        qr_base64 = base64.b64encode(qr_svg.encode('utf-8')).decode('utf-8')
-        print_content = render_to_string('inventory/section_label.svg', {'section': section, 'qr_code_base64': qr_base64})
-        queue_item, created = PrintQueueItem.objects.get_or_create(
-            print_queue=print_queue,
-            item_hash=item_hash,
-            defaults={'name': print_name, 'quantity': 1, 'print_content': print_content}
-        )
-        if not created:
-            queue_item.quantity += 1
-            queue_item.save()
+        write_queue.run(_enqueue_label, request.user, PrintQueueItem.Kind.SECTION, section)
+    return redirect('inventory:section_detail', section_code=section.section_code)
+
+def _item_label_kind(choice):
+    return PrintQueueItem.Kind.ITEM_LARGE if choice == 'large' else PrintQueueItem.Kind.ITEM_SMALL
+
+@login_required
+def section_queue_all_labels(request, section_code):
+    section = get_object_or_404(Section, section_code=section_code)
+    if request.method == 'POST':
+        targets = bulk_labels.section_labels(section, _item_label_kind(request.POST.get('item_label')))
+        job = label_renderer.queue_all(request.user, f"All labels for section {section.name}", targets)
+        return redirect('inventory:label_render_job', job_id=job.id)
     return redirect('inventory:section_detail', section_code=section.section_code)
 
 @login_required
@@ -260,61 +348,87 @@ def space_delete(request, section_code, space_code):
         return redirect('inventory:inventory_browser')
     return redirect('inventory:space_detail', section_code=section.section_code, space_code=space.space_code)
 
+@login_required
+def space_qr_svg(request, section_code, space_code):
+    space = get_object_or_404(Space, section__section_code=section_code, space_code=space_code)
+    return _svg_symbol_response(request, space.qr_code_key(), space.generate_qr_code_svg)
+
 @login_required
 def space_add_to_queue(request, section_code, space_code):
     if request.method == 'POST':
         section = get_object_or_404(Section, section_code=section_code)
         space = get_object_or_404(Space, section=section, space_code=space_code)
-        print_queue, _ = PrintQueue.objects.get_or_create(user=request.user)
-        print_name = f"Space Label for {space.name} of section {section.name}"
-        item_hash = hashlib.sha256(print_name.encode('utf-8')).hexdigest()
-        qr_svg = space.generate_qr_code_svg()
-        qr_base64 = base64.b64encode(qr_svg.encode('utf-8')).decode('utf-8')
-        print_content = render_to_string('inventory/space_label.svg', {'space': space, 'qr_code_base64': qr_base64})
-        queue_item, created = PrintQueueItem.objects.get_or_create(
-            print_queue=print_queue,
-            item_hash=item_hash,
-            defaults={'name': print_name, 'quantity': 1, 'print_content': print_content}
-        )
-        if not created:
-            queue_item.quantity += 1
-            queue_item.save()
+        write_queue.run(_enqueue_label, request.user, PrintQueueItem.Kind.SPACE, space)
     return redirect('inventory:space_detail', section_code=section.section_code, space_code=space.space_code)
 
 
+@login_required
+def space_queue_all_labels(request, section_code, space_code):
+    section = get_object_or_404(Section, section_code=section_code)
+    space = get_object_or_404(Space, section=section, space_code=space_code)
+    if request.method == 'POST':
+        targets = bulk_labels.space_labels(space, _item_label_kind(request.POST.get('item_label')))
+        job = label_renderer.queue_all(request.user, f"All labels for space {space.name} of section {section.name}", targets)
+        return redirect('inventory:label_render_job', job_id=job.id)
+    return redirect('inventory:space_detail', section_code=section.section_code, space_code=space.space_code)
+
+
+def _filter_by_period(queryset, field, period, start_date=None, end_date=None):
+    """Applies one of the history filters ('week', 'month', 'year' or 'custom') to `field`."""
+    days = {'week': 7, 'month': 30, 'year': 365}
+    if period in days:
+        return queryset.filter(**{f'{field}__gte': timezone.now() - timedelta(days=days[period])})
+    if period == 'custom' and start_date and end_date:
+        return queryset.filter(**{f'{field}__range': [start_date, end_date]})
+    return queryset
+
 @login_required
 def item_detail(request, section_code, space_code, item_code):
     section = get_object_or_404(Section, section_code=section_code)
     space = get_object_or_404(Space, section=section, space_code=space_code)
-    item = get_object_or_404(Item, space=space, item_code=item_code)
-    
-    item_logs = ItemLog.objects.filter(item=item).order_by('-timestamp')
-    
-    item_loan_history = CheckoutLog.objects.filter(item=item).select_related('student').order_by('-checkout_date')
-
-    item_logs = ItemLog.objects.filter(item=item).order_by('-timestamp')
-    inv_filter_type = request.GET.get('inv_filter', '')
-    if inv_filter_type == 'week':
-        item_logs = item_logs.filter(timestamp__gte=timezone.now() - timedelta(days=7))
-    elif inv_filter_type == 'month':
-        item_logs = item_logs.filter(timestamp__gte=timezone.now() - timedelta(days=30))
-    elif inv_filter_type == 'year':
-        item_logs = item_logs.filter(timestamp__gte=timezone.now() - timedelta(days=365))
-    elif inv_filter_type == 'custom':
-        start_date = request.GET.get('inv_start_date')
-        end_date = request.GET.get('inv_end_date')
-        if start_date and end_date:
-            item_logs = item_logs.filter(timestamp__range=[start_date, end_date])
+    item = get_object_or_404(Item.objects.with_availability(), space=space, item_code=item_code)
+
+    partial = request.GET.get('partial')
+
+    # Each history table pages independently; an HTMX request for more rows
+    # of one table only queries that table.
+    if partial != 'logs':
+        item_loan_history = _filter_by_period(
+            CheckoutLog.objects.filter(item=item).select_related('student'),
+            'checkout_date', request.GET.get('filter', ''),
+            request.GET.get('start_date'), request.GET.get('end_date'),
+        )
+        loan_page = paginate(request, item_loan_history, ['-checkout_date', '-id'], prefix='loans_', page_size=HISTORY_PAGE_SIZE)
+        if partial == 'loans':
+            return render(request, 'inventory/partials/item_loan_history_rows.html', {'loan_page': loan_page})
+
+    item_logs = _filter_by_period(
+        ItemLog.objects.filter(item=item).select_related('user'),
+        'timestamp', request.GET.get('inv_filter', ''),
+        request.GET.get('inv_start_date'), request.GET.get('inv_end_date'),
+    )
+    log_page = paginate(request, item_logs, ['-timestamp', '-id'], prefix='logs_', page_size=HISTORY_PAGE_SIZE)
+    if partial == 'logs':
+        return render(request, 'inventory/partials/item_log_rows.html', {'log_page': log_page})
 
     context = {
         'section': section,
         'space': space,
         'item': item,
-        'item_logs': item_logs,
-        'item_loan_history': item_loan_history,
+        'log_page': log_page,
+        'loan_page': loan_page,
     }
     return render(request, 'inventory/item_detail.html', context)
 
+@login_required
+def item_barcode_svg(request, section_code, space_code, item_code):
+    item = get_object_or_404(Item,
+        space__section__section_code=section_code,
+        space__space_code=space_code,
+        item_code=item_code
+    )
+    return _svg_symbol_response(request, item.barcode_key(), item.generate_barcode_svg)
+
 @login_required
 def item_create(request, section_code, space_code):
     section = get_object_or_404(Section, section_code=section_code)
@@ -364,6 +478,31 @@ def item_delete(request, section_code, space_code, item_code):
         return redirect('inventory:inventory_browser')
     return redirect('inventory:item_detail', section_code=section.section_code, space_code=space.space_code, item_code=item.item_code)
 
+def _record_stock_adjustment(item, user, action, quantity_change, notes):
+    """
+    Applies a stock adjustment with a single conditional UPDATE, so
+    concurrent adjustments cannot overwrite each other, and writes its
+    permanent log entry. Returns False, writing nothing, if a removal
+    would take the quantity below zero.
+    """
+    updated = Item.objects.filter(id=item.id, quantity__gte=-quantity_change).update(
+        quantity=F('quantity') + quantity_change,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        return False
+    indexing.touch(Item, [item.id])
+
+    # Create the permanent log entry
+    ItemLog.objects.create(
+        item=item,
+        user=user,
+        action=action,
+        quantity_change=quantity_change,
+        notes=notes
+    )
+    return True
+
 @login_required
 def adjust_stock(request, section_code, space_code, item_code, action):
     item = get_object_or_404(Item,
@@ -379,29 +518,18 @@ def adjust_stock(request, section_code, space_code, item_code, action):
             notes = form.cleaned_data['notes']
             
             if action in ['RECEIVED', 'CORR_ADD']:
-                item.quantity += quantity
                 quantity_change = quantity
             elif action in ['DAMAGED', 'LOST', 'CORR_SUB']:
-                if quantity > item.quantity:
-                    messages.error(request, f"Cannot remove {quantity} units. Only {item.quantity} are in stock.")
-                    return redirect(item.get_absolute_url())
-                item.quantity -= quantity
                 quantity_change = -quantity
             else:
                 messages.error(request, "Invalid stock adjustment action.")
                 return redirect(item.get_absolute_url())
 
-            item.save()
+            if not write_queue.run(_record_stock_adjustment, item, request.user, action, quantity_change, notes):
+                item.refresh_from_db(fields=['quantity'])
+                messages.error(request, f"Cannot remove {quantity} units. Only {item.quantity} are in stock.")
+                return redirect(item.get_absolute_url())
 
-            # Create the permanent log entry
-            ItemLog.objects.create(
-                item=item,
-                user=request.user,
-                action=action,
-                quantity_change=quantity_change,
-                notes=notes
-            )
-            
             messages.success(request, "Stock quantity has been updated successfully.")
             return redirect(item.get_absolute_url())
     else:
@@ -422,22 +550,30 @@ def adjust_stock(request, section_code, space_code, item_code, action):
     }
     return render(request, 'inventory/adjust_stock_form.html', context)
 
-def _add_item_to_queue(request, item, label_type):
-    print_queue, _ = PrintQueue.objects.get_or_create(user=request.user)
-    print_name = f"{label_type.capitalize()} Item Label for {item.name}"
-    item_hash = hashlib.sha256(print_name.encode('utf-8')).hexdigest()
-    template_name = f'inventory/item_label_{label_type}.svg'
-    barcode_svg = item.generate_barcode_svg()
-    barcode_base64 = base64.b64encode(barcode_svg.encode('utf-8')).decode('utf-8')
-    print_content = render_to_string(template_name, {'item': item, 'barcode_base64': barcode_base64})
+def _enqueue_label(user, kind, obj):
+    """
+    Adds one copy of the label of `kind` for `obj` to the user's print
+    queue, or bumps the quantity if that label is already queued. Only the
+    reference is stored; the label is rendered at print time.
+    """
+    print_queue, _ = PrintQueue.objects.get_or_create(user=user)
     queue_item, created = PrintQueueItem.objects.get_or_create(
         print_queue=print_queue,
-        item_hash=item_hash,
-        defaults={'name': print_name, 'quantity': 1, 'print_content': print_content}
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=obj.pk,
+        label_kind=kind,
+        defaults={'name': labels.label_title(kind, obj), 'quantity': 1, 'payload_hash': labels.label_key(kind, obj)}
     )
     if not created:
-        queue_item.quantity += 1
-        queue_item.save()
+        PrintQueueItem.objects.filter(id=queue_item.id).update(
+            quantity=F('quantity') + 1,
+            name=labels.label_title(kind, obj),
+            payload_hash=labels.label_key(kind, obj),
+        )
+
+def _add_item_to_queue(request, item, label_type):
+    kind = PrintQueueItem.Kind.ITEM_SMALL if label_type == 'small' else PrintQueueItem.Kind.ITEM_LARGE
+    write_queue.run(_enqueue_label, request.user, kind, item)
 
 @login_required
 def item_add_small_to_queue(request, section_code, space_code, item_code):
@@ -457,7 +593,7 @@ def item_add_large_to_queue(request, section_code, space_code, item_code):
 
 @login_required
 def student_list(request):
-    students_query = Student.objects.all().order_by('name')
+    students_query = Student.objects.all()
 
     distinct_classes = Student.objects.values_list('student_class', flat=True).distinct().order_by('student_class')
 
@@ -465,8 +601,12 @@ def student_list(request):
     if selected_class:
         students_query = students_query.filter(student_class=selected_class)
 
+    page = paginate(request, students_query, ['name', 'id'])
+    if request.GET.get('partial') == 'rows':
+        return render(request, 'inventory/partials/student_rows.html', {'page': page})
+
     context = {
-        'students': students_query,
+        'page': page,
         'distinct_classes': distinct_classes,
         'selected_class': selected_class,
     }
@@ -479,12 +619,12 @@ def student_detail(request, student_id):
     items_on_loan = CheckoutLog.objects.filter(
         student=student,
         return_date__isnull=True
-    ).select_related('item').order_by('-checkout_date')
+    ).select_related('item__space__section').order_by('-checkout_date')
 
     # This is the new query: it fetches individual return logs instead of closed loans.
     return_history = CheckInLog.objects.filter(
         checkout_log__student=student
-    ).select_related('checkout_log__item').order_by('-return_date')
+    ).select_related('checkout_log__item__space__section').order_by('-return_date')
 
     context = {
         'student': student,
@@ -505,6 +645,29 @@ def student_create(request):
     context = {'form': form}
     return render(request, 'inventory/student_form.html', context)
 
+@login_required
+def student_import(request):
+    """
+    Creates or updates students in bulk from an uploaded roster CSV and
+    shows how many were imported along with every row that was rejected.
+    """
+    report = None
+    if request.method == 'POST':
+        form = StudentImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                report = import_students(open_upload(form.cleaned_data['roster']))
+            except ValueError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(request, f"Imported {report.imported} students ({report.created} new, {report.updated} updated).")
+                if report.errors:
+                    messages.warning(request, f"{len(report.errors)} rows were rejected; see the report below.")
+    else:
+        form = StudentImportForm()
+    context = {'form': form, 'report': report}
+    return render(request, 'inventory/student_import.html', context)
+
 @login_required
 def student_update(request, student_id):
     student = get_object_or_404(Student, id=student_id)
@@ -530,14 +693,23 @@ def student_delete(request, student_id):
 @login_required
 def print_queue(request):
     queue, _ = PrintQueue.objects.get_or_create(user=request.user)
-    context = {'queue': queue}
+    context = {'queue': queue, 'items': queue.items.order_by('id')}
     return render(request, 'inventory/print_queue.html', context)
 
+@login_required
+def print_item_preview(request, item_id):
+    """The label of one queue entry as a cacheable image, used as its thumbnail."""
+    queue_item = get_object_or_404(PrintQueueItem, id=item_id, print_queue__user=request.user)
+    target = queue_item.label_object
+    if target is None:
+        raise Http404("The labelled object no longer exists.")
+    kind = queue_item.label_kind
+    return _svg_symbol_response(request, labels.label_key(kind, target), lambda: labels.render_label(kind, target))
+
 @login_required
 def clear_print_queue(request):
     if request.method == 'POST':
-        queue, _ = PrintQueue.objects.get_or_create(user=request.user)
-        queue.delete()
+        write_queue.run(lambda: PrintQueue.objects.filter(user=request.user).delete())
     return redirect('inventory:print_queue')
 
 @login_required
@@ -546,15 +718,14 @@ def change_print_item_quantity(request, item_id):
         queue_item = get_object_or_404(PrintQueueItem, id=item_id, print_queue__user=request.user)
         new_quantity = request.POST.get('quantity')
         if new_quantity and int(new_quantity) > 0:
-            queue_item.quantity = new_quantity
-            queue_item.save()
+            write_queue.run(PrintQueueItem.objects.filter(id=queue_item.id).update, quantity=int(new_quantity))
     return redirect('inventory:print_queue')
 
 @login_required
 def delete_print_item(request, item_id):
     if request.method == 'POST':
         queue_item = get_object_or_404(PrintQueueItem, id=item_id, print_queue__user=request.user)
-        queue_item.delete()
+        write_queue.run(queue_item.delete)
     return redirect('inventory:print_queue')
 
 @login_required
@@ -562,16 +733,85 @@ def print_shop_index(request):
     queue, _ = PrintQueue.objects.get_or_create(user=request.user)
     if not queue.items.exists():
         return redirect('inventory:print_queue')
-    return render(request, 'inventory/print_shop_index.html')
+    context = {
+        'form': PrintSheetForm(),
+        'printer_address': label_printer.printer_address(),
+        'printer_format': label_printer.printer_format(),
+    }
+    return render(request, 'inventory/print_shop_index.html', context)
+
+@login_required
+def label_render_job(request, job_id):
+    """Progress of a 'queue all labels' job; the status partial polls itself until the job ends."""
+    job = bulk_labels.fail_if_stalled(get_object_or_404(LabelRenderJob, id=job_id, user=request.user))
+    if request.GET.get('partial') == 'status':
+        return render(request, 'inventory/partials/label_render_job_status.html', {'job': job})
+    return render(request, 'inventory/label_render_job.html', {'job': job})
+
+def _printable_labels(queue):
+    """
+    Yields the queue's entries whose object still exists, in queue order.
+    The objects are loaded with one query per label kind's model.
+    """
+    for queue_item in queue.items.order_by('id').prefetch_related('label_object'):
+        if queue_item.label_object is not None:
+            yield queue_item
 
 @login_required
 def print_page(request):
+    """
+    Streams the print queue imposed on sheets of the chosen paper. Each
+    label is rendered (or taken from the label cache) once and defined as
+    an SVG symbol; the pages only reference it.
+    """
     queue, _ = PrintQueue.objects.get_or_create(user=request.user)
+    form = PrintSheetForm(request.GET)
+    paper_name = form.cleaned_data['paper'] if form.is_valid() else sheets.default_paper()
+    paper = sheets.paper_sizes().get(paper_name, sheets.PAPER_SIZES['a4'])
+
+    sheet = sheets.Sheet(
+        ((labels.render_label(queue_item.label_kind, queue_item.label_object), queue_item.quantity)
+         for queue_item in _printable_labels(queue)),
+        paper,
+    )
     context = {
-        'items': queue.items.all(),
+        'sheet': sheet,
+        'paper': paper,
         'generation_time': datetime.now().strftime("on %d/%m/%Y at %H:%M")
     }
-    return render(request, 'inventory/print_page.html', context)
+    head, tail = render_to_string('inventory/print_page.html', context, request).split(sheets.PAGES_MARKER)
+    return StreamingHttpResponse(itertools.chain([head], sheet.pages(), [tail]), content_type='text/html; charset=utf-8')
+
+def _printer_job(queue, fmt):
+    return label_printer.build_job(
+        ((queue_item.label_kind, queue_item.label_object, queue_item.quantity) for queue_item in _printable_labels(queue)),
+        fmt,
+    )
+
+@login_required
+def print_labels_download(request):
+    """The print queue as a ZPL (or ESC/POS) file for a label printer."""
+    fmt = request.GET.get('format', 'zpl')
+    if fmt not in label_printer.FORMATS:
+        raise Http404("Unknown printer format.")
+    queue, _ = PrintQueue.objects.get_or_create(user=request.user)
+    content_type, extension = label_printer.FORMATS[fmt]
+    response = HttpResponse(_printer_job(queue, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="sherlock-labels-{timezone.localdate():%Y%m%d}.{extension}"'
+    return response
+
+@login_required
+def print_labels_send(request):
+    """Sends the print queue straight to the configured label printer."""
+    if request.method == 'POST':
+        queue, _ = PrintQueue.objects.get_or_create(user=request.user)
+        try:
+            label_printer.send(_printer_job(queue, label_printer.printer_format()))
+        except label_printer.PrinterError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, "The labels were sent to the label printer.")
+    return redirect('inventory:print_shop_index')
 
 @login_required
 def live_unified_student_search(request):
@@ -582,9 +822,7 @@ def live_unified_student_search(request):
     student_query = request.GET.get('student_query', '').strip()
     student_results = None
     if len(student_query) >= 1: 
-        student_results = Student.objects.filter(
-            Q(name__icontains=student_query) | Q(admission_number__icontains=student_query)
-        ).order_by('student_class', 'name')
+        student_results = find_students(student_query)
 
     context = {
         'student_results': student_results,
@@ -596,15 +834,12 @@ def live_unified_student_search(request):
 def live_unified_item_search(request):
     """
     Handles HTMX requests for the item search on the unified search page.
-    This is the CORRECTED, working version.
+    Results come from the full-text index, ranked and capped.
     """
     item_query = request.GET.get('item_query', '').strip()
     item_results = None
     if len(item_query) >= 1:
-        search_entries = SearchEntry.objects.filter(
-            name__icontains=item_query
-        ).select_related('content_type')
-        item_results = search_entries
+        item_results = search_entries(item_query)
     
     context = {
         'item_results': item_results,
@@ -635,9 +870,7 @@ def live_student_search(request):
     query = request.GET.get('query', '').strip()
     student_results = None
     if len(query) >= 2: 
-        student_results = Student.objects.filter(
-            Q(name__icontains=query) | Q(admission_number__icontains=query)
-        ).order_by('name')
+        student_results = find_students(query)
     
     context = {'student_results': student_results}
     return render(request, 'inventory/partials/student_search_results.html', context)
@@ -647,13 +880,10 @@ def live_item_search(request, student_id):
     query = request.GET.get('query', '').strip()
     item_results = None
     if len(query) >= 1:
-        item_results = Item.objects.filter(
-            Q(name__icontains=query) | Q(barcode__startswith=query)
-        ).annotate(
-            on_loan_qty=Sum('checkout_logs__quantity', filter=Q(checkout_logs__return_date__isnull=True))
-        ).filter(
-            Q(on_loan_qty__isnull=True) | Q(quantity__gt=F('on_loan_qty') + F('buffer_quantity'))
-        ).distinct()[:5]
+        item_results = Item.objects.with_availability().filter(
+            Q(name__icontains=query) | Q(barcode__startswith=query),
+            available_qty__gt=0
+        ).select_related('space__section')[:5]
 
     context = {
         'item_results': item_results,
@@ -668,17 +898,21 @@ def checkout_find_student(request):
     student_results = None
 
     if request.method == 'POST' and query:
-        student_results = Student.objects.filter(
-            Q(name__icontains=query) | Q(admission_number__icontains=query)
-        ).order_by('name')
-
-        if student_results.count() == 1:
-            student = student_results.first()
+        student_results = find_students(query)
+        # Fuzzy matches are only candidates: go straight to the checkout
+        # just for a single student whose admission number or name is exact.
+        exact = [
+            student for student in student_results
+            if student.admission_number == query.upper() or student.name.casefold() == query.casefold()
+        ]
+
+        if len(exact) == 1:
+            student = exact[0]
             if 'checkout_items' in request.session:
                 del request.session['checkout_items']
             return redirect('inventory:checkout_session', student_id=student.id)
         
-        elif student_results.count() == 0:
+        elif not student_results:
             messages.error(request, f"No student found matching '{query}'.")
 
     context = {
@@ -686,6 +920,46 @@ def checkout_find_student(request):
     }
     return render(request, 'inventory/checkout_find_student.html', context)
 
+def _complete_checkout(student, checkout_items, due_date, notes):
+    """
+    Loans every line of a checkout as one atomic unit: a single conditional
+    UPDATE reserves stock for all lines, and the logs are bulk-inserted.
+    If the reservation misses any line, nothing is written and a list of
+    failure messages is returned instead: one per line found short on a
+    recheck, or a general conflict if stock moved back in the meantime.
+    """
+    requested = {int(item_id): quantity for item_id, quantity in checkout_items.items()}
+
+    with transaction.atomic():
+        has_stock = Q()
+        for item_id, quantity in requested.items():
+            has_stock |= Q(id=item_id, quantity__gte=F('on_loan_quantity') + F('buffer_quantity') + quantity)
+        reserved = Item.objects.filter(has_stock).update(
+            on_loan_quantity=Case(
+                *[When(id=item_id, then=F('on_loan_quantity') + quantity) for item_id, quantity in requested.items()],
+                default=F('on_loan_quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+
+        if reserved == len(requested):
+            CheckoutLog.objects.bulk_create([
+                CheckoutLog(item_id=item_id, student=student, due_date=due_date, quantity=quantity, notes=notes)
+                for item_id, quantity in requested.items()
+            ])
+            return []
+        transaction.set_rollback(True)
+
+    items = Item.objects.with_availability().in_bulk(requested.keys())
+    failures = []
+    for item_id, quantity in requested.items():
+        item = items.get(item_id)
+        if item is None:
+            failures.append("An item in this checkout no longer exists. Please remove it and try again.")
+        elif quantity > item.available_quantity:
+            failures.append(f"Not enough stock for '{item.name}': requested {quantity}, available to lend {max(item.available_quantity, 0)}.")
+    return failures or ["Stock changed while checking out. Please try again."]
+
 @login_required
 def checkout_session(request, student_id):
     student = get_object_or_404(Student, id=student_id)
@@ -695,7 +969,7 @@ def checkout_session(request, student_id):
     total_units_in_session = 0
     if checkout_items:
         item_ids = checkout_items.keys()
-        items = Item.objects.filter(id__in=item_ids)
+        items = Item.objects.with_availability().filter(id__in=item_ids).select_related('space__section')
         for item in items:
             quantity = checkout_items.get(str(item.id))
             total_units_in_session += quantity
@@ -713,16 +987,14 @@ def checkout_session(request, student_id):
 
         if query:
             if query.isdigit() and len(query) >= 12:
-                try:
-                    section_code = int(query[0:4])
-                    space_code = int(query[4:8])
-                    item_code = int(query[8:12])
-                    item_to_add = Item.objects.get(space__section__section_code=section_code, space__space_code=space_code, item_code=item_code)
-                except (Item.DoesNotExist, ValueError):
-                    pass
+                match = code_index.resolve_item(int(query[0:4]), int(query[4:8]), int(query[8:12]))
+                if match is None and len(query) == 13:
+                    match = code_index.resolve_barcode(query)
+                if match is not None:
+                    item_to_add = Item.objects.with_availability().filter(id=match.pk).first()
             
             if not item_to_add:
-                results = Item.objects.filter(name__icontains=query)
+                results = Item.objects.with_availability().filter(name__icontains=query)
                 if results.count() == 1:
                     item_to_add = results.first()
                 elif results.count() > 1:
@@ -770,15 +1042,11 @@ def checkout_session(request, student_id):
                     final_due_date = None 
                 
                 if final_due_date:
-                    for item_id, quantity in checkout_items.items():
-                        item = Item.objects.get(id=item_id)
-                        CheckoutLog.objects.create(
-                            item=item, 
-                            student=student, 
-                            due_date=final_due_date, 
-                            quantity=quantity,
-                            notes=notes 
-                        )
+                    failures = write_queue.run(_complete_checkout, student, checkout_items, final_due_date, notes)
+                    if failures:
+                        for failure in failures:
+                            messages.error(request, failure)
+                        return redirect('inventory:checkout_session', student_id=student.id)
                     del request.session['checkout_items']
                     messages.success(request, f"Checkout complete! {total_units_in_session} items have been loaned to {student.name}.")
                     return redirect('inventory:student_detail', student_id=student.id)
@@ -817,7 +1085,7 @@ def checkout_update_item_quantity(request, student_id, item_id):
                     del checkout_items[item_id_str]
                     messages.info(request, "Item removed from the list.")
             else:
-                item = Item.objects.get(id=item_id)
+                item = Item.objects.with_availability().get(id=item_id)
                 current_in_session = checkout_items.get(item_id_str, 0)
                 max_allowable = item.available_quantity + current_in_session
                 
@@ -842,10 +1110,14 @@ def on_loan_dashboard(request):
     """
     on_loan_logs = CheckoutLog.objects.filter(
         return_date__isnull=True
-    ).select_related('item', 'student').order_by('due_date')
+    ).select_related('item__space__section', 'student')
+
+    page = paginate(request, on_loan_logs, ['due_date', 'id'])
+    if request.GET.get('partial') == 'rows':
+        return render(request, 'inventory/partials/loan_rows.html', {'page': page})
 
     context = {
-        'on_loan_logs': on_loan_logs,
+        'page': page,
     }
     return render(request, 'inventory/on_loan_dashboard.html', context)
 
@@ -857,10 +1129,14 @@ def overdue_items_report(request):
     overdue_logs = CheckoutLog.objects.filter(
         return_date__isnull=True,
         due_date__lt=timezone.now() 
-    ).select_related('item', 'student').order_by('due_date')
+    ).select_related('item__space__section', 'student')
+
+    page = paginate(request, overdue_logs, ['due_date', 'id'])
+    if request.GET.get('partial') == 'rows':
+        return render(request, 'inventory/partials/loan_rows.html', {'page': page})
 
     context = {
-        'overdue_logs': overdue_logs,
+        'page': page,
     }
     return render(request, 'inventory/overdue_report.html', context)
 
@@ -870,15 +1146,43 @@ def low_stock_report(request):
     Displays a report of all items with a quantity of 5 or less,
     ordered by their section and space for easy location.
     """
-    low_stock_items = Item.objects.filter(
+    low_stock_items = Item.objects.with_availability().filter(
         quantity__lte=5
-    ).select_related('space__section').order_by('space__section__name', 'space__name', 'name')
+    ).select_related('space__section')
+
+    page = paginate(request, low_stock_items, ['space__section__name', 'space__name', 'name', 'id'])
+    if request.GET.get('partial') == 'rows':
+        return render(request, 'inventory/partials/low_stock_rows.html', {'page': page})
 
     context = {
-        'low_stock_items': low_stock_items,
+        'page': page,
     }
     return render(request, 'inventory/low_stock_report.html', context)
 
+@login_required
+@admin_required
+def ledger_exports(request):
+    """Shows the form for downloading the loan, return and stock ledgers."""
+    return render(request, 'inventory/ledger_exports.html', {'form': LedgerExportForm()})
+
+@login_required
+@admin_required
+def ledger_export_download(request):
+    """
+    Streams the selected ledger as CSV or JSON Lines. Rows are read and
+    sent a chunk at a time, so full-year exports do not build up in memory.
+    """
+    form = LedgerExportForm(request.GET)
+    if not form.is_valid():
+        return render(request, 'inventory/ledger_exports.html', {'form': form}, status=400)
+
+    ledger = form.cleaned_data['ledger']
+    fmt = form.cleaned_data['format']
+    rows = exports.ledger_rows(ledger, **form.filters())
+    response = StreamingHttpResponse(exports.stream(ledger, fmt, rows), content_type=exports.FORMATS[fmt][0])
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(ledger, fmt)}"'
+    return response
+
 @login_required
 def check_in_page(request, log_id):
     """
@@ -893,6 +1197,212 @@ def check_in_page(request, log_id):
     }
     return render(request, 'inventory/check_in_page.html', context)
 
+def _apply_returns(user, returns):
+    """
+    Records returns against open loans in one transaction. `returns` is a
+    list of (checkout_log, quantity, condition) tuples whose logs have their
+    item and student loaded. Produces the same CheckInLog and ItemLog rows
+    as a one-by-one check-in, but with batched inserts and one conditional
+    UPDATE per table. Returns the ids of loans that are now fully returned,
+    or None (writing nothing) if any loan no longer had that many units out.
+    """
+    now = timezone.now()
+    returned_by_log = {log.id: quantity for log, quantity, _ in returns}
+    returned_by_item, damaged_by_item = {}, {}
+    for log, quantity, condition in returns:
+        returned_by_item[log.item_id] = returned_by_item.get(log.item_id, 0) + quantity
+        if condition == CheckInLog.Condition.DAMAGED:
+            damaged_by_item[log.item_id] = damaged_by_item.get(log.item_id, 0) + quantity
+
+    with transaction.atomic():
+        still_out = Q()
+        for log_id, quantity in returned_by_log.items():
+            still_out |= Q(id=log_id, return_date__isnull=True, quantity__gte=F('returned_quantity') + quantity)
+        updated = CheckoutLog.objects.filter(still_out).update(
+            returned_quantity=Case(
+                *[When(id=log_id, then=F('returned_quantity') + quantity) for log_id, quantity in returned_by_log.items()],
+                default=F('returned_quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+        if updated != len(returned_by_log):
+            transaction.set_rollback(True)
+            return None
+
+        closed_ids = set(
+            CheckoutLog.objects.filter(id__in=returned_by_log.keys(), quantity=F('returned_quantity')).values_list('id', flat=True)
+        )
+        if closed_ids:
+            CheckoutLog.objects.filter(id__in=closed_ids).update(return_date=now)
+
+        CheckInLog.objects.bulk_create([
+            CheckInLog(checkout_log=log, quantity_returned=quantity, condition=condition)
+            for log, quantity, condition in returns
+        ])
+
+        Item.objects.filter(id__in=returned_by_item.keys()).update(
+            on_loan_quantity=Case(
+                *[When(id=item_id, then=F('on_loan_quantity') - quantity) for item_id, quantity in returned_by_item.items()],
+                default=F('on_loan_quantity'),
+                output_field=PositiveIntegerField(),
+            ),
+            quantity=Case(
+                *[When(id=item_id, then=F('quantity') - quantity) for item_id, quantity in damaged_by_item.items()],
+                default=F('quantity'),
+                output_field=PositiveIntegerField(),
+            ),
+            updated_at=Case(
+                When(id__in=damaged_by_item.keys(), then=Value(now)),
+                default=F('updated_at'),
+            ),
+        )
+        indexing.touch(Item, damaged_by_item.keys())
+
+        ItemLog.objects.bulk_create([
+            ItemLog(
+                item=log.item,
+                user=user,
+                action=ItemLog.Action.DAMAGED,
+                quantity_change=-quantity,
+                notes=f"Reported damaged during return by student {log.student.name}."
+            )
+            for log, quantity, condition in returns
+            if condition == CheckInLog.Condition.DAMAGED
+        ])
+    return closed_ids
+
+def _open_loans_for_scanned_codes(codes):
+    """
+    Resolves scanned item barcodes and returns (open_loans, prefill, unknown):
+    the open loans of the scanned items, oldest due date first, a map of
+    loan id to the quantity to prefill, and the codes that matched nothing.
+    Each scan counts as one unit, handed to the item's loans in due order.
+    """
+    scans, unknown = {}, []
+    for code in codes:
+        match = code_index.resolve_barcode(code)
+        if match is None:
+            unknown.append(code)
+        else:
+            scans[match.pk] = scans.get(match.pk, 0) + 1
+
+    open_loans = list(
+        CheckoutLog.objects.filter(item_id__in=scans.keys(), return_date__isnull=True)
+        .select_related('item__space__section', 'student')
+        .order_by('due_date', 'id')
+    )
+    prefill = {}
+    for log in open_loans:
+        remaining = scans[log.item_id]
+        take = min(remaining, log.quantity_still_on_loan)
+        if take:
+            prefill[log.id] = take
+            scans[log.item_id] = remaining - take
+    return open_loans, prefill, unknown
+
+@login_required
+def bulk_check_in(request, student_id=None):
+    """
+    Returns many loans at once: either every open loan of one student, or
+    the open loans of a batch of scanned item barcodes. Each line may be
+    returned in full, in part or not at all, and the whole batch is recorded
+    in a single transaction through the same path as a single check-in.
+    """
+    student = get_object_or_404(Student, id=student_id) if student_id else None
+    codes = [code.strip() for code in request.GET.get('codes', '').split() if code.strip()]
+    prefill, conditions = {}, {}
+
+    if request.method == 'POST':
+        requested = {}
+        for key, value in request.POST.items():
+            if key.startswith('return_') and value.strip():
+                try:
+                    requested[int(key[len('return_'):])] = int(value)
+                except ValueError:
+                    messages.error(request, "Invalid quantity entered.")
+                    requested = None
+                    break
+
+        if requested is not None:
+            loans = CheckoutLog.objects.filter(id__in=requested.keys(), return_date__isnull=True).select_related('item__space__section', 'student')
+            if student:
+                loans = loans.filter(student=student)
+            loans = {log.id: log for log in loans}
+
+            returns, errors = [], []
+            for log_id, quantity in requested.items():
+                log_entry = loans.get(log_id)
+                condition = request.POST.get(f'condition_{log_id}', CheckInLog.Condition.OK)
+                prefill[log_id], conditions[log_id] = quantity, condition
+                if quantity == 0:
+                    continue
+                if log_entry is None:
+                    errors.append("One of the selected loans is no longer open.")
+                elif condition not in CheckInLog.Condition.values:
+                    errors.append(f"Invalid return condition for '{log_entry.item.name}'.")
+                elif quantity < 0:
+                    errors.append(f"Quantity to return for '{log_entry.item.name}' must be a positive number.")
+                elif quantity > log_entry.quantity_still_on_loan:
+                    errors.append(f"Cannot return {quantity} x '{log_entry.item.name}'. Only {log_entry.quantity_still_on_loan} units are on loan to {log_entry.student.name}.")
+                else:
+                    returns.append((log_entry, quantity, condition))
+
+            if not errors and not returns:
+                messages.error(request, "Enter a quantity to return for at least one loan.")
+            for error in errors:
+                messages.error(request, error)
+
+            if returns and not errors:
+                closed_ids = write_queue.run(_apply_returns, request.user, returns)
+                if closed_ids is None:
+                    messages.error(request, "Some of these loans were updated by someone else. Please review them and try again.")
+                else:
+                    units = sum(quantity for _, quantity, _ in returns)
+                    damaged = sum(quantity for _, quantity, condition in returns if condition == CheckInLog.Condition.DAMAGED)
+                    if damaged:
+                        messages.warning(request, f"{damaged} damaged unit(s) were removed from total stock.")
+                    messages.success(request, f"Successfully processed return of {units} unit(s) across {len(returns)} loan(s).")
+                    if closed_ids:
+                        messages.info(request, f"{len(closed_ids)} loan(s) are now fully returned and closed.")
+                    if student:
+                        return redirect('inventory:student_detail', student_id=student.id)
+                    return redirect('inventory:on_loan_dashboard')
+
+    unknown_codes = []
+    if student:
+        open_loans = list(
+            CheckoutLog.objects.filter(student=student, return_date__isnull=True)
+            .select_related('item__space__section', 'student')
+            .order_by('due_date', 'id')
+        )
+        if request.method != 'POST':
+            prefill = {log.id: log.quantity_still_on_loan for log in open_loans}
+    elif request.method == 'POST':
+        open_loans = list(
+            CheckoutLog.objects.filter(id__in=prefill.keys(), return_date__isnull=True)
+            .select_related('item__space__section', 'student')
+            .order_by('due_date', 'id')
+        )
+    else:
+        open_loans, prefill, unknown_codes = _open_loans_for_scanned_codes(codes)
+
+    lines = [
+        {
+            'log': log,
+            'quantity': prefill.get(log.id, 0),
+            'condition': conditions.get(log.id, CheckInLog.Condition.OK),
+        }
+        for log in open_loans
+    ]
+    context = {
+        'student': student,
+        'lines': lines,
+        'codes': '\n'.join(codes),
+        'unknown_codes': unknown_codes,
+        'conditions': CheckInLog.Condition.choices,
+    }
+    return render(request, 'inventory/bulk_check_in.html', context)
+
 @login_required
 def process_check_in(request, log_id):
     """
@@ -901,7 +1411,7 @@ def process_check_in(request, log_id):
     inventory is permanently reduced.
     """
     if request.method == 'POST':
-        log_entry = get_object_or_404(CheckoutLog, id=log_id, return_date__isnull=True)
+        log_entry = get_object_or_404(CheckoutLog.objects.select_related('item', 'student'), id=log_id, return_date__isnull=True)
         
         try:
             quantity_to_return = int(request.POST.get('quantity_returned', 0))
@@ -915,33 +1425,18 @@ def process_check_in(request, log_id):
             elif quantity_to_return > quantity_still_on_loan:
                 messages.error(request, f"Cannot return {quantity_to_return}. Only {quantity_still_on_loan} units are on loan.")
             else:
-                CheckInLog.objects.create(
-                    checkout_log=log_entry,
-                    quantity_returned=quantity_to_return,
-                    condition=return_condition
-                )
-                
+                closed_ids = write_queue.run(_apply_returns, request.user, [(log_entry, quantity_to_return, return_condition)])
+                if closed_ids is None:
+                    messages.error(request, "This loan was updated by someone else. Please review it and try again.")
+                    return redirect('inventory:check_in_page', log_id=log_id)
+                loan_closed = log_entry.id in closed_ids
+
                 if return_condition == CheckInLog.Condition.DAMAGED:
-                    item = log_entry.item
-                    item.quantity -= quantity_to_return
-                    item.save()
-                    
-                    ItemLog.objects.create(
-                        item=item,
-                        user=request.user,
-                        action=ItemLog.Action.DAMAGED,
-                        quantity_change=-quantity_to_return,
-                        notes=f"Reported damaged during return by student {log_entry.student.name}."
-                    )
-                    messages.warning(request, f"{quantity_to_return} x '{item.name}' were marked as damaged and removed from total stock.")
-                
-                log_entry.refresh_from_db()
+                    messages.warning(request, f"{quantity_to_return} x '{log_entry.item.name}' were marked as damaged and removed from total stock.")
 
                 messages.success(request, f"Successfully processed return of {quantity_to_return} x '{log_entry.item.name}'.")
 
-                if log_entry.quantity_still_on_loan == 0:
-                    log_entry.return_date = timezone.now()
-                    log_entry.save()
+                if loan_closed:
                     messages.info(request, "This loan is now fully returned and closed.")
                     return redirect('inventory:on_loan_dashboard')
                 
@@ -962,7 +1457,7 @@ def get_spaces_for_section(request, section_id):
 @login_required
 def get_items_for_space(request, space_id):
     space = get_object_or_404(Space, id=space_id)
-    items = Item.objects.filter(space=space).order_by('name')
+    items = Item.objects.with_availability().filter(space=space).order_by('name')
     context = {'items': items}
     return render(request, 'inventory/partials/_browser_items_column.html', context)
 
@@ -1005,7 +1500,7 @@ def team_management(request):
         messages.error(request, "You do not have permission to access this page.")
         return redirect('inventory:dashboard')
     
-    users = UserProfile.objects.exclude(user=request.user).order_by('user__username')
+    users = UserProfile.objects.exclude(user=request.user).select_related('user').order_by('user__username')
     form = UserRoleForm()
     
     context = {'users': users, 'form': form}
@@ -1055,10 +1550,7 @@ def force_logout_user(request, user_id):
     if request.method == 'POST':
         user_to_logout = get_object_or_404(User, id=user_id)
         
-        # Find all session objects associated with this user
-        for session in Session.objects.all():
-            if session.get_decoded().get('_auth_user_id') == str(user_to_logout.id):
-                session.delete()
+        terminate_user_sessions(user_to_logout)
 
         messages.success(request, f"All active sessions for {user_to_logout.username} have been terminated.")
     return redirect('inventory:team_management')
@@ -1082,13 +1574,21 @@ def toggle_user_active_status(request, user_id):
 
         # If we suspend the user, also log them out for immediate effect
         if not user_to_toggle.is_active:
-            for session in Session.objects.all():
-                if session.get_decoded().get('_auth_user_id') == str(user_to_toggle.id):
-                    session.delete()
+            terminate_user_sessions(user_to_toggle)
             messages.info(request, f"Active sessions for {user_to_toggle.username} were also terminated.")
             
     return redirect('inventory:team_management')
 
+@login_required
+@admin_required
+def write_metrics(request):
+    """
+    Reports write transaction counts, group-commit batch sizes and the time
+    spent waiting for the SQLite write lock and for the write queue, for
+    this server process.
+    """
+    return JsonResponse(write_queue.metrics_snapshot())
+
 def custom_page_not_found_view(request, exception):
     """
     Custom view to render the 404.html template.
@@ -0,0 +1,259 @@
+# sherlock-python/inventory/write_queue.py
+"""
+An opt-in coordinator that funnels short write transactions through one
+writer thread per process.
+
+SQLite allows a single writer at a time. With many Waitress threads each
+opening their own write transaction, bursts pile up on the lock and the
+unlucky ones time out. With WRITE_QUEUE_ENABLED, callers hand their write
+function to write_queue.run() instead. The writer thread drains up to
+WRITE_QUEUE_MAX_BATCH waiting jobs, runs each in its own savepoint inside
+one transaction, and commits them together (group commit), so the lock is
+taken once per batch rather than once per request. Reads never go through
+the queue and stay fully concurrent.
+
+The queue is bounded by WRITE_QUEUE_MAX_PENDING. When it is full, run()
+waits up to WRITE_QUEUE_TIMEOUT seconds for room and then raises
+WriteQueueFull, which the middleware turns into a "please retry" response
+instead of a server error. A queued job the writer has not started within
+WRITE_QUEUE_TIMEOUT is withdrawn and fails the same way, so a stalled or
+dead writer cannot hang requests; a writer that died is restarted by the
+next write. A job the writer has started is always waited for, as giving
+up would report a failure for a write that may still commit.
+
+There is one writer per process. Under run.py's multi-process setup, each
+of the SHERLOCK_WORKERS processes groups its own writes, and the batches
+of different processes still take turns on the SQLite lock through its
+busy timeout.
+
+When the coordinator is disabled (the default), run() executes the
+function inline in its own transaction; timings are collected either way
+and are available from metrics_snapshot().
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueFull(Exception):
+    """Raised when a write cannot be queued because the writer is saturated."""
+
+
+class _Job:
+    __slots__ = (
+        'function', 'args', 'kwargs', 'enqueued_at', 'done', 'result', 'exception',
+        'lock', 'started', 'withdrawn',
+    )
+
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+        self.lock = threading.Lock()
+        self.started = False
+        self.withdrawn = False
+
+    def start(self):
+        """Claims the job for the writer; returns False if its caller gave up on it."""
+        with self.lock:
+            self.started = not self.withdrawn
+            return self.started
+
+    def withdraw(self):
+        """Gives up on the job unless the writer has started it; returns whether it did."""
+        with self.lock:
+            self.withdrawn = not self.started
+            return self.withdrawn
+
+
+class WriteMetrics:
+    """Running totals for write transactions; all times in seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.jobs = 0
+            self.failed_jobs = 0
+            self.rejected_jobs = 0
+            self.largest_batch = 0
+            self.lock_wait_total = 0.0
+            self.lock_wait_max = 0.0
+            self.queue_wait_total = 0.0
+            self.queue_wait_max = 0.0
+
+    def record_transaction(self, lock_wait, jobs):
+        with self._lock:
+            self.transactions += 1
+            self.jobs += jobs
+            self.largest_batch = max(self.largest_batch, jobs)
+            self.lock_wait_total += lock_wait
+            self.lock_wait_max = max(self.lock_wait_max, lock_wait)
+
+    def record_queue_wait(self, seconds):
+        with self._lock:
+            self.queue_wait_total += seconds
+            self.queue_wait_max = max(self.queue_wait_max, seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_jobs += 1
+
+    def record_rejection(self):
+        with self._lock:
+            self.rejected_jobs += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'transactions': self.transactions,
+                'jobs': self.jobs,
+                'failed_jobs': self.failed_jobs,
+                'rejected_jobs': self.rejected_jobs,
+                'largest_batch': self.largest_batch,
+                'jobs_per_transaction': self.jobs / self.transactions if self.transactions else 0.0,
+                'lock_wait_avg_ms': 1000 * self.lock_wait_total / self.transactions if self.transactions else 0.0,
+                'lock_wait_max_ms': 1000 * self.lock_wait_max,
+                'queue_wait_avg_ms': 1000 * self.queue_wait_total / self.jobs if self.jobs else 0.0,
+                'queue_wait_max_ms': 1000 * self.queue_wait_max,
+            }
+
+
+class WriteCoordinator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self.metrics = WriteMetrics()
+
+    @property
+    def enabled(self):
+        """Whether writes go through the writer thread (WRITE_QUEUE_ENABLED)."""
+        return getattr(settings, 'WRITE_QUEUE_ENABLED', False)
+
+    @property
+    def max_pending(self):
+        """How many jobs may wait for the writer (WRITE_QUEUE_MAX_PENDING)."""
+        return getattr(settings, 'WRITE_QUEUE_MAX_PENDING', 64)
+
+    @property
+    def max_batch(self):
+        """The most jobs committed in one transaction (WRITE_QUEUE_MAX_BATCH)."""
+        return getattr(settings, 'WRITE_QUEUE_MAX_BATCH', 32)
+
+    @property
+    def timeout(self):
+        """Seconds to wait for room in the queue, and for the writer (WRITE_QUEUE_TIMEOUT)."""
+        return getattr(settings, 'WRITE_QUEUE_TIMEOUT', 10)
+
+    def run(self, function, *args, **kwargs):
+        """
+        Runs `function(*args, **kwargs)` in a write transaction and returns
+        its result, re-raising anything it raised. Calls made inside an
+        open transaction, or from the writer itself, run inline so they
+        stay part of that transaction.
+        """
+        if not self.enabled or connection.in_atomic_block or threading.current_thread() is self._thread:
+            return self._run_inline(function, args, kwargs)
+
+        timeout = self.timeout
+        job = _Job(function, args, kwargs)
+        try:
+            self._ensure_started().put(job, timeout=timeout)
+        except queue.Full:
+            self.metrics.record_rejection()
+            raise WriteQueueFull("Too many writes are waiting; please try again in a moment.")
+
+        if not job.done.wait(timeout) and job.withdraw():
+            self.metrics.record_rejection()
+            raise WriteQueueFull("The writer is not keeping up; please try again in a moment.")
+        # Started jobs are waited for: they may still commit.
+        job.done.wait()
+        if job.exception is not None:
+            raise job.exception
+        return job.result
+
+    def metrics_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        snapshot['enabled'] = self.enabled
+        snapshot['pending'] = self._queue.qsize() if self._queue is not None else 0
+        return snapshot
+
+    def _run_inline(self, function, args, kwargs):
+        if connection.in_atomic_block:
+            return function(*args, **kwargs)
+        started = time.monotonic()
+        with transaction.atomic():
+            # BEGIN IMMEDIATE has returned, so the write lock is held.
+            self.metrics.record_transaction(time.monotonic() - started, 1)
+            return function(*args, **kwargs)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=self.max_pending)
+                self._thread = threading.Thread(target=self._run_writer, name='write-queue', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def _run_writer(self):
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                close_old_connections()
+                self._commit_batch(batch)
+        except Exception:
+            # Jobs taken but not started are withdrawn by their callers.
+            logger.exception("The write queue writer stopped; the next write restarts it.")
+
+    def _commit_batch(self, batch):
+        batch = [job for job in batch if job.start()]
+        if not batch:
+            return
+        started = time.monotonic()
+        for job in batch:
+            self.metrics.record_queue_wait(started - job.enqueued_at)
+        try:
+            with transaction.atomic():
+                self.metrics.record_transaction(time.monotonic() - started, len(batch))
+                for job in batch:
+                    try:
+                        # Each job gets a savepoint, so one failure does not
+                        # undo the others in the batch.
+                        with transaction.atomic():
+                            job.result = job.function(*job.args, **job.kwargs)
+                    except Exception as exc:
+                        job.exception = exc
+                        self.metrics.record_failure()
+        except Exception as exc:
+            logger.exception("Write batch of %d job(s) failed to commit.", len(batch))
+            for job in batch:
+                if job.exception is None:
+                    job.result, job.exception = None, exc
+                    self.metrics.record_failure()
+        finally:
+            for job in batch:
+                job.done.set()
+
+
+write_queue = WriteCoordinator()
@@ -1,18 +1,145 @@
 # sherlock-python/run.py
 """
-This script's ONLY job is to start the production Waitress server.
+This script's ONLY job is to start the production Waitress server(s).
 All configuration and setup is handled by the start_production.sh script.
+
+With SHERLOCK_WORKERS greater than 1, this process becomes a supervisor:
+it starts that many Waitress worker processes on consecutive ports from
+SHERLOCK_BASE_PORT (Caddy load-balances across them), restarts any worker
+that dies, and stops them all gracefully on Ctrl+C or SIGTERM. Each worker
+has its own interpreter, so Python work no longer shares a single GIL.
+
+Environment variables:
+    SHERLOCK_WORKERS            worker processes (default: number of CPUs)
+    SHERLOCK_BASE_PORT          port of the first worker (default: 8000)
+    SHERLOCK_THREADS            request threads per worker (default: 8)
+    SHERLOCK_CONNECTION_LIMIT   open connections per worker (default: 100)
+    SHERLOCK_CHANNEL_TIMEOUT    seconds before an idle connection is closed (default: 120)
 """
+import multiprocessing
 import os
-from waitress import serve
-from sherlock.wsgi import application
+import signal
+import sys
+import time
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sherlock.settings')
 
 
 HOST = '127.0.0.1'
-PORT = 8000
+BASE_PORT = int(os.environ.get('SHERLOCK_BASE_PORT', 8000))
+WORKERS = int(os.environ.get('SHERLOCK_WORKERS', os.cpu_count() or 1))
+THREADS = int(os.environ.get('SHERLOCK_THREADS', 8))
+CONNECTION_LIMIT = int(os.environ.get('SHERLOCK_CONNECTION_LIMIT', 100))
+CHANNEL_TIMEOUT = int(os.environ.get('SHERLOCK_CHANNEL_TIMEOUT', 120))
+
+# Seconds to wait for workers to finish in-flight requests on shutdown.
+SHUTDOWN_GRACE = 10
+
+# A worker that dies sooner than this after starting is restarted with an
+# increasing delay, so a broken deployment does not spin.
+MIN_UPTIME = 5
+MAX_RESTART_DELAY = 30
+
+
+def serve_worker(port):
+    """Runs one Waitress server until it receives SIGTERM or SIGINT."""
+    from waitress import create_server
+    from sherlock.wsgi import application
+
+    def stop(signum, frame):
+        # Unwinds out of the server loop so atexit hooks (such as the
+        # last_seen flush) run before the process exits.
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    server = create_server(
+        application,
+        host=HOST,
+        port=port,
+        threads=THREADS,
+        connection_limit=CONNECTION_LIMIT,
+        channel_timeout=CHANNEL_TIMEOUT,
+        ident='Sherlock',
+    )
+    try:
+        server.run()
+    finally:
+        server.close()
+
+
+class Supervisor:
+    def __init__(self, ports):
+        self.context = multiprocessing.get_context('spawn')
+        self.ports = ports
+        self.workers = {}
+        self.started_at = {}
+        self.restart_delay = {port: 1 for port in ports}
+        self.next_start = {port: 0.0 for port in ports}
+        self.stopping = False
+
+    def start(self, port):
+        process = self.context.Process(target=serve_worker, args=(port,), name=f'sherlock-{port}')
+        process.start()
+        self.workers[port] = process
+        self.started_at[port] = time.monotonic()
+        print(f"--- Worker {process.pid} serving on {HOST}:{port} ---", flush=True)
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        for port in self.ports:
+            self.start(port)
+
+        while not self.stopping:
+            time.sleep(0.5)
+            for port in self.ports:
+                process = self.workers.get(port)
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    self.reap(port, process)
+                if time.monotonic() >= self.next_start[port] and not self.stopping:
+                    self.start(port)
+
+        self.shutdown()
+
+    def reap(self, port, process):
+        """Records a dead worker and schedules its restart."""
+        uptime = time.monotonic() - self.started_at[port]
+        if uptime < MIN_UPTIME:
+            self.restart_delay[port] = min(self.restart_delay[port] * 2, MAX_RESTART_DELAY)
+        else:
+            self.restart_delay[port] = 1
+        self.next_start[port] = time.monotonic() + self.restart_delay[port]
+        print(
+            f"--- Worker {process.pid} on port {port} exited with code {process.exitcode}; "
+            f"restarting in {self.restart_delay[port]}s ---",
+            file=sys.stderr, flush=True,
+        )
+        del self.workers[port]
+
+    def shutdown(self):
+        print("--- Stopping workers... ---", flush=True)
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        for process in self.workers.values():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
 
 
-serve(application, host=HOST, port=PORT)
\ No newline at end of file
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    if WORKERS <= 1:
+        serve_worker(BASE_PORT)
+    else:
+        Supervisor([BASE_PORT + n for n in range(WORKERS)]).run()
@@ -89,6 +89,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'inventory.middleware.WriteContentionMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -120,13 +121,123 @@ WSGI_APPLICATION = 'sherlock.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite pragma profile, applied to every new connection through
+# init_command. WAL lets readers run alongside the single writer, NORMAL
+# sync is durable across application crashes in WAL mode, and busy_timeout
+# makes a writer wait for the lock instead of failing with "database is
+# locked". Sizes are in bytes (mmap_size) and KiB when negative (cache_size).
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SHERLOCK_SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.environ.get('SHERLOCK_SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SHERLOCK_SQLITE_CACHE_SIZE', -32000)),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep each server thread's connection open between requests so the
+        # pragma profile and page cache survive.
+        'CONN_MAX_AGE': int(os.environ.get('SHERLOCK_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when a transaction starts, so it waits on
+            # busy_timeout rather than failing when it tries to upgrade.
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Seconds between WAL checkpoints and PRAGMA optimize runs, triggered after
+# a request finishes. 0 disables them.
+SQLITE_MAINTENANCE_INTERVAL = int(os.environ.get('SHERLOCK_SQLITE_MAINTENANCE_INTERVAL', 600))
+
+
+# Write queue
+# When enabled, short write transactions (checkouts, returns, stock and
+# print-queue changes, last_seen) are funnelled through one writer thread
+# per process and committed in groups. Off by default. With SHERLOCK_WORKERS
+# processes (see run.py) there are that many writers, one per process.
+
+WRITE_QUEUE_ENABLED = os.environ.get('SHERLOCK_WRITE_QUEUE', 'False').lower() in ('true', '1', 't')
+
+WRITE_QUEUE_MAX_PENDING = int(os.environ.get('SHERLOCK_WRITE_QUEUE_MAX_PENDING', 64))
+
+WRITE_QUEUE_MAX_BATCH = 32
+
+# Seconds a request waits for room in a full queue, and then for the writer
+# to start its job, before being told to retry.
+WRITE_QUEUE_TIMEOUT = 10
+
+
+# Code index
+# Scanned codes are resolved from an in-memory index in each process. Saves
+# in this process invalidate it at once; changes made by other processes are
+# picked up once a build is this many seconds old.
+
+CODE_INDEX_MAX_AGE = 60
+
+
+# Label rendering cache
+# Rendered QR codes and barcodes are cached in memory and on disk, keyed by a
+# hash of the encoded data. The disk tier is trimmed to LABEL_CACHE_MAX_BYTES.
+
+LABEL_CACHE_DIR = BASE_DIR / 'label_cache'
+
+LABEL_CACHE_MAX_BYTES = int(os.environ.get('SHERLOCK_LABEL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+LABEL_CACHE_MEMORY_ITEMS = 256
+
+
+# Label sheets
+# Paper the print page lays labels out on by default. Extra sizes can be added
+# as {'name': ('Label', width_mm, height_mm, margin_mm, gap_mm)}.
+
+LABEL_SHEET_DEFAULT_PAPER = os.environ.get('SHERLOCK_LABEL_SHEET_PAPER', 'a4')
+
+LABEL_SHEET_PAPER_SIZES = {}
+
+
+# Label printer
+# Where 'Send to label printer' delivers the print queue over raw TCP, and in
+# which language ('zpl' or 'escpos'). Leave the host empty to hide the button.
+
+LABEL_PRINTER_HOST = os.environ.get('SHERLOCK_LABEL_PRINTER_HOST', '')
+
+LABEL_PRINTER_PORT = int(os.environ.get('SHERLOCK_LABEL_PRINTER_PORT', 9100))
+
+LABEL_PRINTER_FORMAT = os.environ.get('SHERLOCK_LABEL_PRINTER_FORMAT', 'zpl')
+
+LABEL_PRINTER_DPI = int(os.environ.get('SHERLOCK_LABEL_PRINTER_DPI', 203))
+
+LABEL_PRINTER_TIMEOUT = 10
+
+
+# Bulk label rendering
+# 'Queue all labels' pre-renders labels in a pool of this many worker
+# processes, run at a lower priority than requests. 0 renders them in a
+# background thread instead.
+
+LABEL_RENDER_WORKERS = int(os.environ.get('SHERLOCK_LABEL_RENDER_WORKERS', os.cpu_count() or 1))
+
+LABEL_RENDER_NICENESS = 10
+
+# Seconds a running job may go without progress before it is reported as
+# failed (its process was restarted or crashed).
+LABEL_RENDER_JOB_TIMEOUT = 300
+
+
+# Presence tracking
+# Each process keeps users' last activity in memory and writes it to
+# UserProfile.last_seen in one batch every PRESENCE_FLUSH_INTERVAL seconds.
+
+PRESENCE_FLUSH_INTERVAL = int(os.environ.get('SHERLOCK_PRESENCE_FLUSH_INTERVAL', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -185,6 +296,12 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
 SESSION_COOKIE_AGE = 1800
 
+# The database engine, plus upkeep of the user-to-session mapping table.
+SESSION_ENGINE = 'inventory.session_store'
+
+# Minimum seconds between the bounded expired-session sweeps run at login.
+SESSION_SWEEP_INTERVAL = 3600
+
 if not DEBUG:
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'httpss')
     SESSION_COOKIE_SECURE = True
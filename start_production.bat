@@ -7,13 +7,28 @@ set IP_ADDRESS=%IP_ADDRESS:~1%
 set SHERLOCK_ALLOWED_IP=%IP_ADDRESS%
 echo --- Detected IP: %IP_ADDRESS% ---
 
+if not defined SHERLOCK_WORKERS set SHERLOCK_WORKERS=%NUMBER_OF_PROCESSORS%
+if not defined SHERLOCK_BASE_PORT set SHERLOCK_BASE_PORT=8000
+setlocal enabledelayedexpansion
+set UPSTREAMS=
+set /a LAST_PORT=%SHERLOCK_BASE_PORT% + %SHERLOCK_WORKERS% - 1
+for /l %%p in (%SHERLOCK_BASE_PORT%,1,!LAST_PORT!) do set UPSTREAMS=!UPSTREAMS! 127.0.0.1:%%p
+echo --- Workers: %SHERLOCK_WORKERS% (ports from %SHERLOCK_BASE_PORT%) ---
+
 echo --- Generating Caddyfile... ---
 (
     echo # Caddyfile for Sherlock (auto-generated)
-    echo 
+    echo.
     echo :8443 {
     echo     tls internal
-    echo     reverse_proxy 127.0.0.1:8000
+    echo     reverse_proxy!UPSTREAMS! {
+    echo         lb_policy least_conn
+    echo         lb_try_duration 5s
+    echo         health_uri /healthz/
+    echo         health_interval 5s
+    echo         health_timeout 2s
+    echo         fail_duration 10s
+    echo     }
     echo }
 ) > Caddyfile
 
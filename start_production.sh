@@ -14,6 +14,18 @@ echo "--- Detected IP: $IP_ADDRESS ---"
 echo "--- Detected Hostname: $HOSTNAME ---"
 
 
+# run.py reads the same variables, so Caddy and the workers agree on ports.
+export SHERLOCK_WORKERS=${SHERLOCK_WORKERS:-$(python -c "import os;print(os.cpu_count() or 1)")}
+export SHERLOCK_BASE_PORT=${SHERLOCK_BASE_PORT:-8000}
+
+UPSTREAMS=""
+for ((i = 0; i < SHERLOCK_WORKERS; i++)); do
+    UPSTREAMS="$UPSTREAMS 127.0.0.1:$((SHERLOCK_BASE_PORT + i))"
+done
+
+echo "--- Workers: $SHERLOCK_WORKERS (ports from $SHERLOCK_BASE_PORT) ---"
+
+
 echo "--- Generating Caddyfile... ---"
 
 cat > Caddyfile <<- EOM
@@ -23,8 +35,16 @@ $IP_ADDRESS:8443, $HOSTNAME:8443, localhost:8443, 127.0.0.1:8443 {
     # 'tls internal' goes INSIDE the site block to apply a self-signed certificate.
     tls internal
 
-    # Forward all traffic to our Waitress server.
-    reverse_proxy 127.0.0.1:8000
+    # Spread traffic across the Waitress workers started by run.py, skipping
+    # any worker that fails its health check or is restarting.
+    reverse_proxy$UPSTREAMS {
+        lb_policy least_conn
+        lb_try_duration 5s
+        health_uri /healthz/
+        health_interval 5s
+        health_timeout 2s
+        fail_duration 10s
+    }
 }
 EOM
 
@@ -45,7 +65,7 @@ trap cleanup SIGINT SIGTERM
 echo "--- Starting Caddy in the background... ---"
 caddy start
 
-echo "--- Starting Sherlock application server (Waitress)... ---"
+echo "--- Starting Sherlock application servers (Waitress)... ---"
 echo
 echo "====================================================================="
 echo "  Sherlock is now running securely!"
@@ -53,7 +73,7 @@ echo "  Access it from any device at: https://$IP_ADDRESS:8443"
 echo "  Or on this machine at:         https://localhost:8443"
 echo "====================================================================="
 echo
-echo "Waitress is running in the foreground. Press Ctrl+C to stop everything."
+echo "Waitress workers are running in the foreground. Press Ctrl+C to stop everything."
 
 
 python run.py
\ No newline at end of file